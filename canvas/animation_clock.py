@@ -0,0 +1,57 @@
+import time
+
+
+class AnimationClock:
+    def __init__(self, widget, callback, interval: int = 50):
+        """
+        A single timer driving every animation on the canvas. Animations don't get timers of their own, they read
+        the time of the clock and pick their frame from it, so they all stay in sync no matter how many there are.
+
+        :param widget: The widget whose event loop runs the clock
+        :param callback: Called on every tick. The clock stops when it returns False.
+        :param interval: The time between ticks, in ms
+        """
+        self._widget = widget
+        self._callback = callback
+        self.interval = interval
+        self._start = time.perf_counter()
+        self._job = None
+
+    def time(self) -> float:
+        """
+        Get the time of the clock
+
+        :return: The time since the clock was created, in ms
+        """
+        return (time.perf_counter() - self._start) * 1000
+
+    def start(self):
+        """
+        Starts ticking, does nothing if the clock is already running
+        """
+        if self._job is None:
+            self._job = self._widget.after(self.interval, self._tick)
+
+    def stop(self):
+        """
+        Stops ticking
+        """
+        if self._job is not None:
+            self._widget.after_cancel(self._job)
+            self._job = None
+
+    def is_running(self):
+        """
+        Checks whether the clock is ticking
+
+        :return: True if running, False otherwise
+        """
+        return self._job is not None
+
+    def _tick(self):
+        """
+        Runs the callback and schedules the next tick
+        """
+        self._job = None
+        if self._callback() is not False:
+            self.start()
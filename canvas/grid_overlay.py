@@ -0,0 +1,95 @@
+import tkinter as tk
+import math
+
+
+class GridOverlay:
+    def __init__(self, canvas: tk.Canvas, color: str = "#4d4d4d", tag: str = "grid_line"):
+        """
+        Draws the grid lines over the canvas. Only the lines crossing the visible part of the canvas are drawn,
+        and the line items are pooled: panning and zooming move the existing lines instead of recreating them,
+        so the cost of the grid depends on the size of the screen and not on the size of the map.
+
+        :param canvas: The canvas to draw on
+        :param color: The color of the lines
+        :param tag: The tag given to every line item
+        """
+        self._canvas = canvas
+        self._color = color
+        self.tag = tag
+
+        self._vertical = []     # Line ids, pooled
+        self._horizontal = []
+        self._visible = True
+        self._last_state = None
+
+    def update(self, grid_size: int, csize):
+        """
+        Repositions the pooled lines so that they cover the visible part of the canvas
+
+        :param grid_size: The current grid size
+        :param csize: The size of the canvas (width, height)
+        """
+        if not self._visible:
+            return
+
+        # Visible area, clipped to the canvas
+        x0 = max(0, self._canvas.canvasx(0))
+        y0 = max(0, self._canvas.canvasy(0))
+        x1 = min(csize[0], self._canvas.canvasx(self._canvas.winfo_width()))
+        y1 = min(csize[1], self._canvas.canvasy(self._canvas.winfo_height()))
+
+        state = grid_size, x0, y0, x1, y1
+        if state == self._last_state:
+            return
+        self._last_state = state
+
+        xs = range(math.ceil(x0 / grid_size) * grid_size, int(x1) + 1, grid_size)
+        ys = range(math.ceil(y0 / grid_size) * grid_size, int(y1) + 1, grid_size)
+
+        self._place_lines(self._vertical, [(x, y0, x, y1) for x in xs])
+        self._place_lines(self._horizontal, [(x0, y, x1, y) for y in ys])
+
+    def _place_lines(self, pool, coords):
+        """
+        Moves the lines of the pool to the given coordinates, growing the pool if needed and hiding unused lines
+
+        :param pool: The list of pooled line ids
+        :param coords: A list of (x0, y0, x1, y1)
+        """
+        for i, line in enumerate(coords):
+            if i < len(pool):
+                self._canvas.coords(pool[i], *line)
+            else:
+                # Disabled so that the lines never take clicks meant for the tiles below
+                pool.append(self._canvas.create_line(*line, fill=self._color, state=tk.DISABLED, tags=(self.tag,)))
+
+        # Lines that aren't needed are kept for later
+        for i in range(len(coords), len(pool)):
+            self._canvas.coords(pool[i], -1, -1, -1, -1)
+
+    def lower_below(self, iid):
+        """
+        Puts an item below the grid lines, so that the grid is drawn over it
+
+        :param iid: The id of the item
+        """
+        if self._vertical or self._horizontal:
+            self._canvas.tag_lower(iid, self.tag)
+
+    def set_visible(self, visible: bool):
+        """
+        Shows or hides the grid
+
+        :param visible: Whether the grid should be visible
+        """
+        self._visible = visible
+        self._last_state = None
+        self._canvas.itemconfigure(self.tag, state=tk.DISABLED if visible else tk.HIDDEN)
+
+    def is_visible(self):
+        """
+        Checks whether the grid is shown
+
+        :return: True if visible, False otherwise
+        """
+        return self._visible
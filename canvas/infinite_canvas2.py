@@ -1,18 +1,27 @@
 import tkinter as tk
 from typing import MutableSequence, Union, Tuple
 import math
+from collections import deque
 from mode import Modes
 from copy import deepcopy
-from queue import Queue
-from threading import Thread
+from canvas.grid_overlay import GridOverlay
+from tilemap.tile_map import TileMap
+from tilemap.layer import chunk_of
+from tilemap.chunk import CHUNK_SIZE
+from tilemap.stamp import Stamp
+from tilemap.history import History
+from tilemap.transaction import Transaction
+from tilemap.transform import FLIP_X, FLIP_Y, ROTATE_90, compose, transform_size
 
 
 class InfiniteCanvas2(tk.Frame):
-    def __init__(self, master=None, mode=None, **kwargs):
+    def __init__(self, master=None, mode=None, tile_map=None, **kwargs):
         """
         Initializes an infinite canvas that can be drag scrolled.
 
         :param master: The master holding the frame.
+        :param mode: The mode object
+        :param tile_map: The tile map shown on the canvas. A map with a single layer is created if None.
         :param width: The width of the frame.
         :param height: The height of the frame.
         """
@@ -22,6 +31,12 @@ class InfiniteCanvas2(tk.Frame):
         # Canvas
         self.__canvas = None
         self.__cscrollbars: MutableSequence[Union[tk.Scrollbar, None]] = [None, None]   # Scrollbars (x, y)
+        self.__grid_overlay = None
+        self.__view_update_scheduled = False
+        self.__reference = None     # Reference image drawn under the map, see set_reference_image
+        self.__reference_job = None
+        self.__view_listeners = []  # Called with no arguments after the visible area changed
+        self.__recorder = None      # Records the input events, see start_recording
 
         # Grid size
         self.__grid_size_old = 50
@@ -30,8 +45,26 @@ class InfiniteCanvas2(tk.Frame):
         self.__grid_size_bounds = [25, 100]
         self.__csize = self.__round_to_gridsize((self.winfo_screenwidth() * 2, self.winfo_screenheight() * 2))
 
+        # Progressive zoom. Every wheel step shows a cheap preview right away, and once the wheel settles the
+        # previews are replaced with the final images, visible ones first.
+        self.__preview_resample = "nearest"     # Sets how fast zooming feels
+        self.__final_resample = "lanczos"       # Sets how good the tiles look once zooming stops
+        self.__settle_delay = 150               # ms without wheel events before the final images are drawn
+        self.__refine_batch = 8                 # Final images drawn per event loop turn
+        self.__settle_job = None
+        self.__refine_job = None
+        self.__refine_queue = deque()
+
         # Resize boxes
         self.__resize_box_size = 10
+        self.__resize_boxes_shown = False
+
+        # Redraw scheduler. Handlers mark what is out of date and a single idle callback brings the canvas up to
+        # date, so the canvas work of a frame doesn't grow with the number of events that arrived in it.
+        self.__redraw_job = None
+        self.__dirty_cells = {}             # layer id -> grid squares whose tiles changed in the map
+        self.__dirty_resize_boxes = False
+        self.__pending_motion = {}          # handler -> latest event, see __defer_motion
 
         # Modes
         self.__mode = mode
@@ -65,6 +98,40 @@ class InfiniteCanvas2(tk.Frame):
         }
         # Canvas tiles
         self.__canvas_tiles = {}
+        self.__pressed_tile = None      # iid of the tile the left button went down on, gets the motion and release
+        self.__pressed_box = None       # Side of the resize box the left button went down on, see __find_resize_box
+
+        # Tile map
+        self.__tile_map = tile_map if tile_map is not None else TileMap()
+        if not self.__tile_map.layers:
+            self.__tile_map.add_layer("Layer 1")
+        self.__tile_items = {}      # (layer id, rowcol) -> iid, for layers drawn tile by tile
+        self.__chunk_items = {}     # (layer id, chunk position) -> iid, for layers drawn from chunk bitmaps
+        self.__layer_markers = {}   # layer id -> iid of a hidden item that the layer's items are stacked under
+        self.__layer_grid = {}      # layer id -> grid size the tile items of the layer are positioned for
+        # (asset, ratio, transform) -> {layer id: number of tile items of the layer showing it}
+        self.__asset_groups = {}
+        # (asset, ratio, transform) -> (grid size, is final, photo image shared by the tile items)
+        self.__group_photos = {}
+        self.__compositor = None
+        self.__autotiler = None
+        self.__asset_index = None   # Asset id -> chunks using it, see find_asset
+        self.__history = History(self.__tile_map)   # Undo entries of the transactions, see transaction
+
+        # Animations, all driven by one clock
+        self.__animation_clock = None
+        # (asset, ratio, transform) -> [grid size, {frame: photo image}, frame shown]
+        self.__animation_photos = {}
+        self.__visible_animations = None    # Animated groups on screen, None when out of date
+        self.__last_painted = None
+
+        # Selection
+        self.__selection = set()    # iids of the selected tiles, which are also tagged "selected"
+        self.__selection_box = None
+        self.__marquee = None
+        self.__group_drag = None
+        self.__clipboard = []
+        self.__pointer = (0, 0)
 
         # Create Canvas
         self.__create_canvas()
@@ -90,10 +157,638 @@ class InfiniteCanvas2(tk.Frame):
         self.__cscrollbars[1].pack(side=tk.RIGHT, fill=tk.Y)
 
         # Pack Canvas
-        self.__canvas.config(xscrollcommand=self.__cscrollbars[0].set, yscrollcommand=self.__cscrollbars[1].set)
+        self.__canvas.config(xscrollcommand=self.__handle_xscroll, yscrollcommand=self.__handle_yscroll)
         self.__canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         self.__canvas.focus_set()
 
+        # Grid
+        self.__grid_overlay = GridOverlay(self.__canvas)
+
+        # Layers
+        for layer in self.__tile_map.layers:
+            self.__create_layer_marker(layer)
+            self.__rebuild_layer(layer)
+
+    def __handle_xscroll(self, first, last):
+        """
+        Updates the horizontal scrollbar, the grid and the reference image when the view changes
+        """
+        self.__cscrollbars[0].set(first, last)
+        self.__visible_animations = None
+        self.__schedule_view_update()
+
+    def __handle_yscroll(self, first, last):
+        """
+        Updates the vertical scrollbar, the grid and the reference image when the view changes
+        """
+        self.__cscrollbars[1].set(first, last)
+        self.__visible_animations = None
+        self.__schedule_view_update()
+
+    def __schedule_view_update(self):
+        """
+        Updates the grid lines and the reference image once the event loop is idle. Multiple calls in the same
+        frame are merged.
+        """
+        if not self.__view_update_scheduled:
+            self.__view_update_scheduled = True
+            self.after_idle(self.__update_view)
+
+    def __update_view(self):
+        """
+        Moves the grid lines and the reference image tiles to cover the visible area
+        """
+        self.__view_update_scheduled = False
+        self.__grid_overlay.update(self.__grid_size, self.__csize)
+        if self.__reference is not None:
+            self.__reference.update(self.__grid_size)
+        for listener in self.__view_listeners:
+            listener()
+
+    def add_view_listener(self, listener):
+        """
+        Registers a function called with no arguments once the visible area changed, after scrolling, zooming or
+        resizing the window. Calls are merged, at most one per frame.
+        :param listener: The function
+        """
+        self.__view_listeners.append(listener)
+
+    def get_view(self):
+        """
+        Get the visible area of the map
+        :return: (x0, y0, x1, y1) in grid squares, not rounded
+        """
+        return (self.__canvas.canvasx(0) / self.__grid_size, self.__canvas.canvasy(0) / self.__grid_size,
+                self.__canvas.canvasx(self.__canvas.winfo_width()) / self.__grid_size,
+                self.__canvas.canvasy(self.__canvas.winfo_height()) / self.__grid_size)
+
+    def center_on(self, cell):
+        """
+        Scrolls the canvas so that a grid square is in the middle of the visible area
+        :param cell: The grid square (x, y), can be fractional
+        """
+        x = cell[0] * self.__grid_size - self.__canvas.winfo_width() / 2
+        y = cell[1] * self.__grid_size - self.__canvas.winfo_height() / 2
+        self.__canvas.xview_moveto(max(0.0, x / self.__csize[0]))
+        self.__canvas.yview_moveto(max(0.0, y / self.__csize[1]))
+
+    def get_view_state(self):
+        """
+        Get the zoom and the scroll position, to put the view back with set_view_state
+        :return: {"grid_size": grid size, "scroll": (x, y) fractions of the scroll region at the top left corner}
+        """
+        return {"grid_size": self.__grid_size, "scroll": (self.__canvas.xview()[0], self.__canvas.yview()[0])}
+
+    def set_view_state(self, state):
+        """
+        Zooms and scrolls to a state given by get_view_state
+        :param state: The view state
+        """
+        self.__zoom_to(state["grid_size"], preview=False)
+        self.__canvas.xview_moveto(state["scroll"][0])
+        self.__canvas.yview_moveto(state["scroll"][1])
+        self.__schedule_view_update()
+
+    def toggle_grid(self, event=None):
+        """
+        Shows or hides the grid lines
+        :param event: The tkinter event
+        """
+        self.__grid_overlay.set_visible(not self.__grid_overlay.is_visible())
+        self.__schedule_view_update()
+
+    # INPUT RECORDING #
+    def start_recording(self, filename):
+        """
+        Records the input events reaching the canvas to a session file, which can be replayed with replay.py to
+        reproduce what happened, and time it
+        :param filename: The session file
+        """
+        # Imported here so that it isn't imported at startup
+        from canvas.input_session import InputRecorder
+
+        self.stop_recording()
+        self.__recorder = InputRecorder(self, self.__canvas, self.__mode, filename)
+
+    def stop_recording(self):
+        """
+        Stops recording input events, and closes the session file
+        :return: The number of records written, 0 if nothing was being recorded
+        """
+        if self.__recorder is None:
+            return 0
+        self.__recorder.stop()
+        count, self.__recorder = self.__recorder.count, None
+        return count
+
+    # REFERENCE IMAGE #
+    def set_reference_image(self, filename, cell_pixels=32, position=(0, 0)):
+        """
+        Shows a large image under the map to trace over. The image is split into a tiled pyramid the first time
+        it is shown, in the background, and only the tiles on screen are drawn.
+        :param filename: The image file
+        :param cell_pixels: The number of image pixels covered by one grid square
+        :param position: The grid square the top left corner of the image is on (x, y)
+        """
+        # Imported here so that PIL isn't imported at startup
+        from sprite.image_pyramid import ImagePyramid
+        from canvas.reference_layer import ReferenceLayer
+
+        self.clear_reference_image()
+        pyramid = ImagePyramid(filename)
+        self.__reference = ReferenceLayer(self.__canvas, pyramid, cell_pixels, position)
+        if pyramid.is_built():
+            self.__schedule_view_update()
+        else:
+            pyramid.build_in_background()
+            self.__reference_job = self.after(200, self.__wait_for_reference)
+
+    def __wait_for_reference(self):
+        """
+        Polls the pyramid being built, and shows the reference image once it is ready
+        """
+        self.__reference_job = None
+        pyramid = self.__reference.pyramid
+        if pyramid.is_built():
+            self.__schedule_view_update()
+        elif pyramid.last_error is None:
+            self.__reference_job = self.after(200, self.__wait_for_reference)
+
+    def clear_reference_image(self):
+        """
+        Removes the reference image
+        """
+        if self.__reference_job is not None:
+            self.after_cancel(self.__reference_job)
+            self.__reference_job = None
+        if self.__reference is not None:
+            self.__reference.clear()
+            self.__reference = None
+
+    def get_reference_image(self):
+        """
+        Get the reference image layer
+        :return: The ReferenceLayer, None if there is no reference image
+        """
+        return self.__reference
+
+    # LAYERS #
+    def get_tile_map(self):
+        """
+        Get the tile map shown on the canvas
+        :return: The tile map
+        """
+        return self.__tile_map
+
+    def add_layer(self, name):
+        """
+        Adds a layer on top of the others
+        :param name: The name of the layer
+        :return: The new layer
+        """
+        layer = self.__tile_map.add_layer(name)
+        self.__create_layer_marker(layer)
+        return layer
+
+    def remove_layer(self, layer):
+        """
+        Removes a layer and its tiles
+        :param layer: The layer to remove
+        """
+        self.__delete_layer_items(layer)
+        self.__canvas.delete(self.__layer_markers.pop(layer.lid))
+        if self.__compositor is not None:
+            self.__compositor.invalidate_layer(layer)
+        self.__tile_map.remove_layer(layer)
+
+    def move_layer(self, layer, index):
+        """
+        Moves a layer in the draw order
+        :param layer: The layer to move
+        :param index: The new index, 0 being the bottom
+        """
+        self.__tile_map.move_layer(layer, index)
+
+        # Restack every layer from the bottom up, then put the grid back on top
+        for current in self.__tile_map.layers:
+            self.__canvas.tag_raise("layer{}".format(current.lid))
+            self.__canvas.tag_raise(self.__layer_markers[current.lid])
+        self.__canvas.tag_raise(self.__grid_overlay.tag)
+        self.__mark_resize_boxes()
+
+    def set_active_layer(self, layer):
+        """
+        Sets the layer new tiles are added to
+        :param layer: The layer
+        """
+        self.__tile_map.set_active_layer(layer)
+
+    def set_layer_visible(self, layer, visible):
+        """
+        Shows or hides a layer. Hidden layers aren't drawn or updated while zooming.
+        :param layer: The layer
+        :param visible: Whether the layer should be shown
+        """
+        layer.visible = visible
+        self.__tile_map.layer_changed(layer)
+        self.__visible_animations = None
+        self.__canvas.itemconfigure("layer{}".format(layer.lid), state=tk.NORMAL if visible else tk.HIDDEN)
+
+        # Catch up with zooming that happened while the layer was hidden
+        if visible:
+            self.__refresh_layer(layer)
+            self.__rasterize_groups(layers=[layer])
+
+    def set_layer_locked(self, layer, locked):
+        """
+        Locks or unlocks a layer. Locked layers can't be edited and are drawn from cached chunk bitmaps.
+        :param layer: The layer
+        :param locked: Whether the layer should be locked
+        """
+        composited = layer.is_composited()
+        layer.locked = locked
+        self.__tile_map.layer_changed(layer)
+        if composited != layer.is_composited():
+            self.__rebuild_layer(layer)
+
+    def set_layer_static(self, layer, static):
+        """
+        Marks a layer as static. Static layers can still be edited but are drawn from cached chunk bitmaps, so
+        their tiles can't be moved or resized.
+        :param layer: The layer
+        :param static: Whether the layer should be static
+        """
+        composited = layer.is_composited()
+        layer.static = static
+        self.__tile_map.layer_changed(layer)
+        if composited != layer.is_composited():
+            self.__rebuild_layer(layer)
+
+    def __create_layer_marker(self, layer):
+        """
+        Creates the hidden item that marks the top of a layer in the stacking order.
+        Items of the layer are always put right below it.
+        :param layer: The layer
+        """
+        marker = self.__canvas.create_line(0, 0, 0, 0, state=tk.HIDDEN, tags=("layer_marker",))
+        self.__grid_overlay.lower_below(marker)
+        self.__layer_markers[layer.lid] = marker
+        self.__layer_grid[layer.lid] = self.__grid_size
+
+    def __stack_item(self, iid, layer):
+        """
+        Puts an item at the top of its layer
+        :param iid: The id of the item
+        :param layer: The layer of the item
+        """
+        self.__canvas.tag_lower(iid, self.__layer_markers[layer.lid])
+        if not layer.visible:
+            self.__canvas.itemconfigure(iid, state=tk.HIDDEN)
+
+    def __rebuild_layer(self, layer):
+        """
+        Recreates the items of a layer, either one per tile or one per chunk depending on the layer
+        :param layer: The layer
+        """
+        self.__delete_layer_items(layer)
+        self.__layer_grid[layer.lid] = self.__grid_size
+        self.__visible_animations = None
+
+        if layer.is_composited():
+            self.__refresh_layer(layer)
+        else:
+            for rowcol, asset, span in layer.tiles():
+                self.__create_tile_item(layer, rowcol, asset, span, layer.get_transform(rowcol))
+
+    def __delete_layer_items(self, layer):
+        """
+        Deletes every canvas item of a layer
+        :param layer: The layer
+        """
+        for key in [key for key in self.__tile_items if key[0] == layer.lid]:
+            self.__delete_tile_item(self.__tile_items[key])
+
+        for key in [key for key in self.__chunk_items if key[0] == layer.lid]:
+            iid = self.__chunk_items.pop(key)
+            self.__canvas.delete(iid)
+            del self.__canvas.images[iid]
+
+    def __refresh_layer(self, layer, preview=False):
+        """
+        Brings the items of a layer up to date with the current grid size
+        :param layer: The layer
+        :param preview: If True, the chunk bitmaps of a composited layer are only repositioned, and the visible
+        ones get a quick preview. The final bitmaps are drawn once zooming settles.
+        """
+        if not layer.is_composited():
+            self.__scale_layer(layer)
+        elif not preview:
+            for position in list(layer.chunks):
+                self.__refresh_chunk(layer, position)
+            self.__layer_grid[layer.lid] = self.__grid_size
+        else:
+            self.__scale_layer(layer)
+            visible = self.__get_visible_chunks()
+            for position in [position for position in layer.chunks if position in visible]:
+                self.__refresh_chunk(layer, position, preview=True)
+
+    def __scale_layer(self, layer):
+        """
+        Moves the tile items of a layer to match the current grid size. Every chunk of tiles is scaled from the
+        canvas origin with one canvas call, so this costs one call per chunk instead of one per tile.
+        :param layer: The layer
+        """
+        old_grid_size = self.__layer_grid[layer.lid]
+        if old_grid_size == self.__grid_size:
+            return
+
+        factor = self.__grid_size / old_grid_size
+        if layer.is_composited():
+            # The chunk bitmaps of the layer, whose images are brought up to date separately
+            self.__canvas.scale("layer{}".format(layer.lid), 0, 0, factor, factor)
+        else:
+            for position in layer.chunks:
+                self.__canvas.scale(self.__chunk_tag(layer, position), 0, 0, factor, factor)
+        self.__layer_grid[layer.lid] = self.__grid_size
+
+    @staticmethod
+    def __chunk_tag(layer, position):
+        """
+        The tag shared by the tile items anchored in a chunk
+        :param layer: The layer
+        :param position: The chunk position
+        :return: The tag
+        """
+        return "tiles{}_{}_{}".format(layer.lid, *position)
+
+    @staticmethod
+    def __group_tag(asset, ratio, transform=0):
+        """
+        The tag shared by the tile items showing the same asset at the same size, flipped and rotated the same way
+        :param asset: The asset id
+        :param ratio: The size in grid squares
+        :param transform: The transform of the tiles, see tilemap.transform
+        :return: The tag
+        """
+        return "asset{}_{}x{}_t{}".format(asset, ratio[0], ratio[1], transform)
+
+    def __get_group_photo(self, asset, ratio, transform=0, preview=False):
+        """
+        Get the photo image shared by the tiles showing an asset at a size, for the current grid size. When the
+        image changes, every tile of the group is switched to the new one with a single canvas call.
+        :param asset: The asset id
+        :param ratio: The size in grid squares
+        :param transform: The transform of the tiles, see tilemap.transform
+        :param preview: If True, a quick preview is enough
+        :return: The photo image
+        """
+        sprite = self.__tile_map.get_asset(asset)
+        if sprite.is_animated():
+            return self.__get_animation_photo(asset, ratio, transform)
+
+        key = asset, tuple(ratio), transform
+        cached = self.__group_photos.get(key)
+        if cached is not None and cached[0] == self.__grid_size and (preview or cached[1]):
+            return cached[2]
+
+        size = self.__grid_size * ratio[0], self.__grid_size * ratio[1]
+        if preview:
+            photo_image, final = sprite.get_preview_photo_image(size, self.__final_resample, self.__preview_resample,
+                                                                transform)
+        else:
+            photo_image, final = sprite.get_scaled_photo_image(size, self.__final_resample, transform), True
+        self.__group_photos[key] = self.__grid_size, final, photo_image
+        self.__canvas.itemconfigure(self.__group_tag(asset, ratio, transform), image=photo_image)
+        return photo_image
+
+    def __rasterize_groups(self, preview=False, layers=None):
+        """
+        Updates the image of every tile for the current grid size, with one canvas call per asset, size and transform.
+        Groups only shown by hidden layers are left as they are until a layer showing them is shown again.
+        :param preview: If True, quick previews are drawn instead of the final images
+        :param layers: The layers whose groups are updated, None for every layer
+        """
+        for group in self.__get_shown_groups(layers):
+            self.__get_group_photo(*group, preview=preview)
+
+    def __get_shown_groups(self, layers=None):
+        """
+        Get the asset groups with tile items on visible layers
+        :param layers: The layers to look at, None for every layer
+        :return: A list of (asset, ratio, transform)
+        """
+        shown = {layer.lid for layer in (self.__tile_map.layers if layers is None else layers)
+                 if layer.visible and not layer.is_composited()}
+        return [group for group, counts in self.__asset_groups.items() if not shown.isdisjoint(counts)]
+
+    def __get_animation_photo(self, asset, ratio, transform=0):
+        """
+        Get the photo image of the frame an animated asset shows right now, for the current grid size. Frames are
+        scaled once per grid size. When the frame changes, every tile of the group is switched to it with a single
+        canvas call.
+        :param asset: The asset id of an animated sprite
+        :param ratio: The size in grid squares
+        :param transform: The transform of the tiles, see tilemap.transform
+        :return: The photo image
+        """
+        key = asset, tuple(ratio), transform
+        frames = self.__animation_photos.get(key)
+        if frames is None or frames[0] != self.__grid_size:
+            frames = self.__animation_photos[key] = [self.__grid_size, {}, None]
+
+        sprite = self.__tile_map.get_asset(asset)
+        clock = self.__get_animation_clock()
+        index = sprite.get_frame_index(clock.time())
+        photo_image = frames[1].get(index)
+        if photo_image is None:
+            size = self.__grid_size * ratio[0], self.__grid_size * ratio[1]
+            photo_image = sprite.get_frame(index).get_scaled_photo_image(size, self.__final_resample, transform)
+            frames[1][index] = photo_image
+
+        if frames[2] != index:
+            frames[2] = index
+            self.__canvas.itemconfigure(self.__group_tag(asset, ratio, transform), image=photo_image)
+        clock.start()
+        return photo_image
+
+    def __get_animation_clock(self):
+        """
+        Get the clock driving the animations, creating it on first use
+        :return: The animation clock
+        """
+        if self.__animation_clock is None:
+            from canvas.animation_clock import AnimationClock
+            self.__animation_clock = AnimationClock(self, self.__animate)
+        return self.__animation_clock
+
+    def __animate(self):
+        """
+        Clock tick. Moves the animated groups on screen to their current frame, which costs at most one canvas
+        call per animated asset and size no matter how many tiles show it.
+        :return: False once no tile is animated anymore, which stops the clock
+        """
+        if self.__visible_animations is None:
+            self.__visible_animations = self.__find_visible_animations()
+        for group in self.__visible_animations:
+            if group in self.__asset_groups:
+                self.__get_animation_photo(*group)
+        return bool(self.__animation_photos)
+
+    def __find_visible_animations(self):
+        """
+        Finds the animated groups with tiles on screen. Tiles of composited layers show their first frame.
+        :return: A list of (asset, ratio, transform)
+        """
+        visible = self.__get_visible_chunks()
+        groups = set()
+        for layer in self.__tile_map.layers:
+            if not layer.visible or layer.is_composited():
+                continue
+            for position in visible.intersection(layer.chunks):
+                chunk = layer.chunks[position]
+                for local, asset, span in chunk.tiles():
+                    if self.__tile_map.get_asset(asset).is_animated():
+                        groups.add((asset, tuple(span), chunk.get_transform(local)))
+        return list(groups)
+
+    def set_zoom_quality(self, preview_resample=None, final_resample=None, settle_delay=None):
+        """
+        Tunes progressive zoom. The preview filter sets how fast zooming feels, the final filter sets how the tiles
+        look once zooming stops.
+        :param preview_resample: The name of the filter used while zooming, e.g. "nearest"
+        :param final_resample: The name of the filter used once zooming stops, e.g. "lanczos" or "box"
+        :param settle_delay: How long the wheel has to be idle before the final images are drawn, in ms
+        """
+        if preview_resample is not None:
+            self.__preview_resample = preview_resample
+            if self.__compositor is not None:
+                self.__compositor.preview_resample = preview_resample
+        if settle_delay is not None:
+            self.__settle_delay = settle_delay
+        if final_resample is not None and final_resample != self.__final_resample:
+            self.__final_resample = final_resample
+            if self.__compositor is not None:
+                self.__compositor.set_resample(final_resample)
+            self.__group_photos.clear()
+            self.__rasterize_groups()
+            for layer in self.__tile_map.layers:
+                if layer.visible and layer.is_composited():
+                    self.__refresh_layer(layer)
+
+    def __get_visible_chunks(self):
+        """
+        Get the positions of the chunks that can have tiles on screen. Tiles can stick out of their chunk to the
+        right and bottom, so one more chunk is included to the left and top.
+        :return: A set of chunk positions
+        """
+        chunk_size = CHUNK_SIZE * self.__grid_size
+        x0 = math.floor(self.__canvas.canvasx(0) / chunk_size) - 1
+        y0 = math.floor(self.__canvas.canvasy(0) / chunk_size) - 1
+        x1 = math.floor(self.__canvas.canvasx(self.__canvas.winfo_width()) / chunk_size)
+        y1 = math.floor(self.__canvas.canvasy(self.__canvas.winfo_height()) / chunk_size)
+        return {(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)}
+
+    def __schedule_refine(self):
+        """
+        Draws the final images once the wheel has been idle for the settle delay. Every wheel event pushes the
+        refinement back, and stops a refinement that is already running.
+        """
+        if self.__settle_job is not None:
+            self.after_cancel(self.__settle_job)
+        if self.__refine_job is not None:
+            self.after_cancel(self.__refine_job)
+            self.__refine_job = None
+        self.__refine_queue.clear()
+        self.__settle_job = self.after(self.__settle_delay, self.__start_refine)
+
+    def __start_refine(self):
+        """
+        Queues the previews to be replaced with final images, starting with what is on screen
+        """
+        self.__settle_job = None
+        visible = self.__get_visible_chunks()
+        visible_groups = set()
+        chunks, hidden_chunks = [], []
+        for layer in self.__tile_map.layers:
+            if not layer.visible:
+                continue
+            for position, chunk in layer.chunks.items():
+                if layer.is_composited():
+                    (chunks if position in visible else hidden_chunks).append((layer, position))
+                elif position in visible:
+                    visible_groups.update((asset, span, chunk.get_transform(local))
+                                          for local, asset, span in chunk.tiles())
+
+        shown_groups = self.__get_shown_groups()
+        groups = [group for group in shown_groups if group in visible_groups]
+        hidden_groups = [group for group in shown_groups if group not in visible_groups]
+        self.__refine_queue.extend([(None, group) for group in groups] + chunks +
+                                   [(None, group) for group in hidden_groups] + hidden_chunks)
+        self.__refine_step()
+
+    def __refine_step(self):
+        """
+        Draws a batch of final images, and lets the event loop run before the next batch
+        """
+        self.__refine_job = None
+        for _ in range(min(self.__refine_batch, len(self.__refine_queue))):
+            layer, item = self.__refine_queue.popleft()
+            if layer is None:
+                if item in self.__asset_groups:
+                    self.__get_group_photo(*item)
+            elif layer in self.__tile_map.layers and layer.visible and layer.is_composited():
+                self.__refresh_chunk(layer, item)
+
+        if self.__refine_queue:
+            self.__refine_job = self.after(1, self.__refine_step)
+
+    def __get_compositor(self):
+        """
+        Get the chunk compositor, creating it on first use
+        :return: The compositor
+        """
+        if self.__compositor is None:
+            # Imported here so that PIL isn't imported at startup
+            from canvas.layer_compositor import LayerCompositor
+            self.__compositor = LayerCompositor(self.__tile_map, resample=self.__final_resample,
+                                                preview_resample=self.__preview_resample)
+        return self.__compositor
+
+    def __refresh_chunk(self, layer, position, preview=False):
+        """
+        Redraws the bitmap of a chunk of a composited layer. Nothing is rendered again if the chunk didn't change
+        since it was last drawn at the current grid size.
+        :param layer: The layer
+        :param position: The position of the chunk
+        :param preview: If True, a quick preview is drawn if the chunk isn't rendered at the current grid size yet
+        """
+        key = layer.lid, position
+        iid = self.__chunk_items.get(key)
+        chunk = layer.chunks.get(position)
+        photo_image = None
+        if chunk is not None and preview:
+            photo_image = self.__get_compositor().get_preview_photo_image(layer, chunk, self.__grid_size)[0]
+        elif chunk is not None:
+            photo_image = self.__get_compositor().get_photo_image(layer, chunk, self.__grid_size)
+
+        if photo_image is None:
+            if iid is not None:
+                self.__canvas.delete(iid)
+                del self.__canvas.images[iid]
+                del self.__chunk_items[key]
+            return
+
+        coords = position[0] * CHUNK_SIZE * self.__grid_size, position[1] * CHUNK_SIZE * self.__grid_size
+        if iid is None:
+            iid = self.__canvas.create_image(*coords, image=photo_image, anchor=tk.NW,
+                                             tags=("chunk", "layer{}".format(layer.lid)))
+            self.__stack_item(iid, layer)
+            self.__chunk_items[key] = iid
+        else:
+            self.__canvas.itemconfigure(iid, image=photo_image)
+            self.__canvas.coords(iid, *coords)
+        self.__canvas.images[iid] = photo_image
+
     def __create_canvas_events(self):
         """
         Create canvas events. Used to bind events to the canvas widget.
@@ -120,6 +815,23 @@ class InfiniteCanvas2(tk.Frame):
         # Mouse Wheel Events
         self.__canvas.bind("<MouseWheel>", self.handle_scroll, add="+")
 
+        # Grid
+        self.__canvas.bind("<Configure>", lambda _: self.__schedule_view_update(), add="+")
+        self.__canvas.bind("<KeyPress-g>", self.toggle_grid, add="+")
+
+        # Selection
+        self.__canvas.bind("<Control-c>", self.copy_selection, add="+")
+        self.__canvas.bind("<Control-v>", self.paste, add="+")
+        self.__canvas.bind("<Delete>", self.delete_selection, add="+")
+        self.__canvas.bind("<Escape>", self.clear_selection, add="+")
+        self.__canvas.bind("<Control-z>", self.undo, add="+")
+        self.__canvas.bind("<Control-y>", self.redo, add="+")
+
+        # Flipping and rotating the selection
+        self.__canvas.bind("<KeyPress-r>", self.rotate_selection, add="+")
+        self.__canvas.bind("<KeyPress-f>", self.flip_selection_x, add="+")
+        self.__canvas.bind("<KeyPress-v>", self.flip_selection_y, add="+")
+
     def __map_to_grid(self, coords: Tuple[int, int]) -> Tuple[int, int]:
         """
         Maps a given set of coordinates (x, y) onto grid squares mathematically
@@ -181,62 +893,929 @@ class InfiniteCanvas2(tk.Frame):
 
     def handle_button_motion(self, event):
         """
-        Handles Left Mouse Button "held and drag" events
+        Handles Left Mouse Button "held and drag" events. Every square dragged over is painted, but what follows the
+        pointer only moves once per frame, see __defer_motion.
         :param event: The tkinter event
         """
+        if self.__mode == Modes.TERRAIN and self.__mode.has_related_item():
+            self.__paint_terrain(event)
+        self.__defer_motion(self.__apply_button_motion, event)
+
+    def __apply_button_motion(self, event):
+        """
+        Moves what follows the pointer while the left button is held
+        :param event: The latest motion event
+        """
+        if self.__pressed_box is not None:
+            self.drag_resize_tile(event, self.__pressed_box)
+            return
+        if self.__pressed_tile in self.__canvas_tiles:
+            self.move_tile(event, self.__pressed_tile, self.__get_tile_sprite(self.__pressed_tile))
+
         if self.__mode == Modes.DRAG:
             self.__canvas.scan_dragto(event.x, event.y, gain=1)
+        elif self.__mode == Modes.EDIT and self.__marquee is not None:
+            start = self.__marquee["start"]
+            coords = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
+            self.__canvas.coords(self.__marquee["iid"], *start, *coords)
 
     def handle_button_release(self, event):
-        pass
+        """
+        Handles Left Mouse Button release events
+        :param event: The tkinter event
+        """
+        # The drag ends where the pointer was last seen
+        self.__flush_redraw()
+        pressed_box, self.__pressed_box = self.__pressed_box, None
+        if pressed_box is not None:
+            self.drag_resize_complete(event)
+            return
+        pressed, self.__pressed_tile = self.__pressed_tile, None
+        if pressed in self.__canvas_tiles:
+            self.move_tile_complete(event, pressed, self.__get_tile_sprite(pressed))
+
+        if self.__marquee is not None:
+            self.__select_marquee()
 
     def handle_button_click(self, event):
         """
-        Handles Left Mouse Button Click events
+        Handles Left Mouse Button Click events. Clicks on tiles are dispatched from here too, the tile being found
+        from the grid instead of from bindings on every tile item.
         :param event: The tkinter event
         """
+        # Clicks find tiles through the tile items, which have to be up to date
+        self.__flush_redraw()
+
+        # Resize boxes are found from their position, like tiles, so that replayed clicks reach them too
+        self.__pressed_box = self.__find_resize_box(event) if self.__mode == Modes.EDIT else None
+        if self.__pressed_box is not None:
+            self.__pressed_tile = None
+            return
+
+        # Only edit mode does anything with a tile that is clicked, dragged and released
+        self.__pressed_tile = self.__find_tile(event) if self.__mode == Modes.EDIT else None
+        if self.__pressed_tile is not None:
+            self.select_tile(event, self.__pressed_tile, self.__get_tile_sprite(self.__pressed_tile))
+
         if self.__mode == Modes.DRAG:
             self.__canvas.scan_mark(event.x, event.y)
-        elif self.__mode == Modes.ADD:
-            sprite = deepcopy(self.__motion_item["sprite"])
-
-            self.__resize_to_grid(sprite)
+        elif self.__mode == Modes.ADD and self.__mode.has_related_item():
+            layer = self.__tile_map.get_active_layer()
+            if layer.locked:
+                return
 
             # Get the proper coordinates
             coords = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
             coords = self.__map_to_grid(coords)
+            rowcol = coords[0] // self.__grid_size, coords[1] // self.__grid_size
+
+            asset = self.__tile_map.register_asset(self.__mode.get_related_item())
+            self.__place_tile(layer, rowcol, asset, (1, 1))
+        elif self.__mode == Modes.STAMP and self.__mode.has_related_item():
+            coords = self.__map_to_grid((self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)))
+            self.place_stamp(self.__mode.get_related_item(), (coords[0] // self.__grid_size,
+                                                              coords[1] // self.__grid_size))
+        elif self.__mode == Modes.TERRAIN and self.__mode.has_related_item():
+            self.__last_painted = None
+            self.__paint_terrain(event)
+        elif self.__mode == Modes.EDIT:
+            # Clicking a tile is handled above, anywhere else starts a marquee selection
+            if self.__pressed_tile is None:
+                self.__set_selection([])
+                start = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
+                self.__marquee = {
+                    "iid": self.__canvas.create_rectangle(*start, *start, outline="white", dash=(4, 2)),
+                    "start": start
+                }
 
-            # Draw the image
-            photoimage = sprite.get_photo_image()
-            iid = self.__canvas.create_image(*coords, image=photoimage, anchor=tk.NW)
-            self.__canvas.images[iid] = photoimage
+    # -- Selection -- #
+    def __set_selection(self, iids):
+        """
+        Replaces the selection. Selected tiles are tagged so that they can be moved with a single canvas call.
+        :param iids: The iids of the tiles to select
+        """
+        self.__canvas.dtag("selected", "selected")
+        for iid in iids:
+            self.__canvas.addtag_withtag("selected", iid)
+        self.__selection = set(iids)
+        self.__update_selection_box()
 
-            self.__canvas_tiles[iid] = {
-                "sprite": sprite,
-                "rowcol": (coords[0] // self.__grid_size, coords[1] // self.__grid_size)
-            }
+    def __update_selection_box(self):
+        """
+        Draws a box around the selection when more than one tile is selected
+        """
+        if self.__selection_box is not None:
+            self.__canvas.delete(self.__selection_box)
+            self.__selection_box = None
+
+        if len(self.__selection) > 1:
+            self.__selected_item = None
+            self.__mark_resize_boxes()
+
+            bbox = self.__canvas.bbox("selected")
+            self.__selection_box = self.__canvas.create_rectangle(*bbox, outline="white", dash=(4, 2),
+                                                                  state=tk.DISABLED, tags=("selected",))
+
+    def __select_marquee(self):
+        """
+        Selects every tile touching the marquee, then removes the marquee
+        """
+        x0, y0, x1, y1 = self.__canvas.coords(self.__marquee["iid"])
+        self.__canvas.delete(self.__marquee["iid"])
+        self.__marquee = None
+
+        # Tag everything under the marquee in one call, then untag what can't be selected
+        self.__canvas.dtag("selected", "selected")
+        self.__canvas.addtag_overlapping("selected", min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self.__canvas.dtag("!tile", "selected")
+        for layer in self.__tile_map.layers:
+            if not layer.visible:
+                self.__canvas.dtag("layer{}".format(layer.lid), "selected")
+
+        self.__selection = set(self.__canvas.find_withtag("selected"))
+        self.__update_selection_box()
+
+    def __start_group_drag(self, event):
+        """
+        Starts moving the selected tiles together
+        :param event: The tkinter event
+        """
+        rowcols = [self.__canvas_tiles[iid]["rowcol"] for iid in self.__selection]
+        self.__group_drag = {
+            "start": (self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)),
+            "last": (self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)),
+            "min": (min(rowcol[0] for rowcol in rowcols), min(rowcol[1] for rowcol in rowcols))
+        }
 
-            self.__create_tile_events(iid, sprite)
+    def __drag_selection(self, event):
+        """
+        Moves the selected tiles with the mouse. Snapping is left for the release.
+        :param event: The tkinter event
+        """
+        coords = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
+        last = self.__group_drag["last"]
+        self.__canvas.move("selected", coords[0] - last[0], coords[1] - last[1])
+        self.__group_drag["last"] = coords
 
-    def __create_tile_events(self, iid, sprite):
+    def __drop_selection(self):
+        """
+        Snaps the moved selection to the grid and writes the new positions into the map
+        """
+        drag, self.__group_drag = self.__group_drag, None
+        moved = drag["last"][0] - drag["start"][0], drag["last"][1] - drag["start"][1]
+
+        # Keep the selection inside the canvas
+        offset = [round(moved[0] / self.__grid_size), round(moved[1] / self.__grid_size)]
+        offset[0] = max(offset[0], -drag["min"][0])
+        offset[1] = max(offset[1], -drag["min"][1])
+
+        self.__canvas.move("selected", offset[0] * self.__grid_size - moved[0],
+                           offset[1] * self.__grid_size - moved[1])
+        if offset != [0, 0]:
+            self.__commit_selection(offset)
+
+    def __commit_selection(self, offset):
+        """
+        Moves the selected tiles in the map
+        :param offset: The number of grid squares moved (x, y)
         """
-        Creates the necessary events for tiles on the canvas
+        # Take every selected tile out first, so that selected tiles never replace each other
+        moved = []
+        for iid in self.__selection:
+            tile = self.__canvas_tiles[iid]
+            layer = tile["layer"]
+            del self.__tile_items[(layer.lid, tile["rowcol"])]
+            layer.remove_tile(tile["rowcol"])
+            moved.append((iid, tile))
+
+        for iid, tile in moved:
+            layer = tile["layer"]
+            rowcol = tile["rowcol"][0] + offset[0], tile["rowcol"][1] + offset[1]
+
+            # Selected tiles moved onto other tiles replace them
+            other = self.__tile_items.get((layer.lid, rowcol))
+            if other is not None:
+                self.__delete_tile_item(other)
+
+            layer.set_terrain(rowcol, 0)
+            layer.set_tile(rowcol, tile["asset"], tile["ratio"], tile["transform"])
+            self.__move_chunk_tag(iid, layer, tile["rowcol"], rowcol)
+            tile["rowcol"] = rowcol
+            self.__tile_items[(layer.lid, rowcol)] = iid
+
+    def copy_selection(self, event=None):
+        """
+        Copies the selected tiles
+        :param event: The tkinter event
+        """
+        if not self.__selection:
+            return
+
+        tiles = [self.__canvas_tiles[iid] for iid in self.__selection]
+        origin = min(tile["rowcol"][0] for tile in tiles), min(tile["rowcol"][1] for tile in tiles)
+        self.__clipboard = [(tile["layer"].lid, (tile["rowcol"][0] - origin[0], tile["rowcol"][1] - origin[1]),
+                             tile["asset"], tile["ratio"], tile["transform"]) for tile in tiles]
+
+    def paste(self, event=None):
+        """
+        Pastes the copied tiles with their top left corner at the mouse, and selects them
+        :param event: The tkinter event
+        """
+        if not self.__clipboard:
+            return
+
+        coords = self.__map_to_grid((self.__canvas.canvasx(self.__pointer[0]),
+                                     self.__canvas.canvasy(self.__pointer[1])))
+        origin = coords[0] // self.__grid_size, coords[1] // self.__grid_size
+
+        pasted = []
+        for lid, relative, asset, ratio, transform in self.__clipboard:
+            # Tiles go back to the layer they were copied from, unless it is gone or locked
+            layer = self.__tile_map.get_layer(lid)
+            if layer is None or layer.locked:
+                layer = self.__tile_map.get_active_layer()
+                if layer.locked:
+                    continue
+
+            rowcol = origin[0] + relative[0], origin[1] + relative[1]
+            self.__place_tile(layer, rowcol, asset, ratio, transform)
+            iid = self.__tile_items.get((layer.lid, rowcol))
+            if iid is not None:
+                pasted.append(iid)
+
+        self.__set_selection(pasted)
+
+    def create_stamp(self, name):
+        """
+        Creates a stamp from the selected tiles and adds it to the map
+        :param name: The name of the stamp
+        :return: The stamp, None if nothing is selected
+        """
+        if not self.__selection:
+            return None
+
+        tiles = [self.__canvas_tiles[iid] for iid in self.__selection]
+        stamp = Stamp.from_tiles(name, [(tile["layer"].lid, tile["rowcol"], tile["asset"], tile["ratio"],
+                                         tile["transform"]) for tile in tiles])
+        self.__tile_map.add_stamp(stamp)
+        return stamp
+
+    def place_stamp(self, stamp, origin):
+        """
+        Places a stamp with its top left corner at a grid square. The tiles of each layer are written into the map
+        with one call and drawn in one pass, instead of being placed one by one.
+        :param stamp: The stamp
+        :param origin: The grid square (x, y)
+        """
+        layers = {}
+        for lid, tiles in stamp.get_layer_tiles(origin).items():
+            # Like pasting, tiles go to the layer they were captured from, unless it is gone or locked
+            layer = self.__tile_map.get_layer(lid)
+            if layer is None or layer.locked:
+                layer = self.__tile_map.get_active_layer()
+                if layer.locked:
+                    continue
+            layers.setdefault(layer, []).extend(tiles)
+
+        for layer, tiles in layers.items():
+            cells = [tile[0] for tile in tiles]
+            # A tile placed by hand replaces the terrain of the square
+            for rowcol in cells:
+                layer.set_terrain(rowcol, 0)
+            layer.set_tiles(tiles)
+            self.__mark_cells(layer, cells)
+
+    def clear_selection(self, event=None):
+        """
+        Deselects every tile
+        :param event: The tkinter event
+        """
+        self.__set_selection([])
+
+    def delete_selection(self, event=None):
+        """
+        Deletes the selected tiles
+        :param event: The tkinter event
+        """
+        for iid in list(self.__selection):
+            tile = self.__canvas_tiles[iid]
+            tile["layer"].remove_tile(tile["rowcol"])
+            self.__delete_tile_item(iid)
+        self.__set_selection([])
+
+    def transform_selection(self, transform):
+        """
+        Flips or rotates the selected tiles, each around its own anchor square. Tiles bigger than a square swap
+        their width and height when rotated.
+        :param transform: The transform to apply on top of the current one of each tile, see tilemap.transform
+        """
+        for iid in self.__selection:
+            tile = self.__canvas_tiles[iid]
+            ratio = transform_size(tile["ratio"], transform)
+            tile_transform = compose(tile["transform"], transform)
+            tile["layer"].set_tile(tile["rowcol"], tile["asset"], ratio, tile_transform)
+            self.__set_tile_group(iid, ratio, tile_transform)
+
+        if self.__selected_item is not None and self.__selected_item["iid"] in self.__selection:
+            self.__selected_item["sprite"] = self.__get_tile_sprite(self.__selected_item["iid"])
+            self.__mark_resize_boxes()
+        self.__update_selection_box()
+
+    def rotate_selection(self, event=None):
+        """
+        Rotates the selected tiles a quarter turn clockwise
+        :param event: The tkinter event
+        """
+        self.transform_selection(ROTATE_90)
+
+    def flip_selection_x(self, event=None):
+        """
+        Flips the selected tiles left to right
+        :param event: The tkinter event
+        """
+        self.transform_selection(FLIP_X)
+
+    def flip_selection_y(self, event=None):
+        """
+        Flips the selected tiles top to bottom
+        :param event: The tkinter event
+        """
+        self.transform_selection(FLIP_Y)
+
+    # -- Terrain -- #
+    def __get_autotiler(self):
+        """
+        Get the autotiler, creating it on first use
+        :return: The autotiler
+        """
+        if self.__autotiler is None:
+            # Imported here so that PIL isn't imported at startup
+            from tilemap.autotile import Autotiler
+            self.__autotiler = Autotiler(self.__tile_map)
+        return self.__autotiler
+
+    def __paint_terrain(self, event):
+        """
+        Paints the selected terrain on the square under the mouse. Only the square and its neighbors are updated.
+        :param event: The tkinter event
+        """
+        layer = self.__tile_map.get_active_layer()
+        if layer.locked:
+            return
+
+        coords = self.__map_to_grid((self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)))
+        rowcol = coords[0] // self.__grid_size, coords[1] // self.__grid_size
+
+        # Dragging over the same square again doesn't change anything
+        if rowcol == self.__last_painted:
+            return
+        self.__last_painted = rowcol
+
+        changed = self.__get_autotiler().paint(layer, [rowcol], self.__mode.get_related_item())
+        self.__mark_cells(layer, changed)
+
+    def recompute_terrain(self, layer=None):
+        """
+        Reapplies the terrain rules to a whole layer, for example after the rules of a terrain changed
+        :param layer: The layer, every layer if None
+        """
+        autotiler = self.__get_autotiler()
+        autotiler.invalidate()
+        for current in ([layer] if layer is not None else self.__tile_map.layers):
+            self.__mark_cells(current, autotiler.recompute_layer(current))
+
+    def deduplicate_assets(self, store=None):
+        """
+        Merges the assets of the map that have the same pixels and redraws the layers
+        :param store: The sprite store, the shared store if None
+        :return: A dict of duplicate asset id -> merged asset id
+        """
+        if store is None:
+            from sprite.sprite_store import default_store
+            store = default_store()
+
+        remap = self.__tile_map.deduplicate_assets(store)
+        if remap:
+            self.__history.remap(remap)
+            if self.__autotiler is not None:
+                self.__autotiler.invalidate()
+            for layer in self.__tile_map.layers:
+                if layer.is_composited():
+                    self.__get_compositor().invalidate_layer(layer)
+                self.__rebuild_layer(layer)
+        return remap
+
+    # -- Assets -- #
+    def __get_asset_index(self):
+        """
+        Get the index of the tiles of each asset, creating it on first use
+        :return: The asset index
+        """
+        if self.__asset_index is None:
+            from tilemap.asset_index import AssetIndex
+            self.__asset_index = AssetIndex(self.__tile_map)
+        return self.__asset_index
+
+    def find_asset(self, asset):
+        """
+        Finds the tiles of an asset, and selects the ones drawn as their own item in visible layers
+        :param asset: The asset id
+        :return: A list of (layer, grid square)
+        """
+        self.__flush_redraw()
+        found = self.__get_asset_index().find(asset)
+        self.__set_selection([self.__tile_items[(layer.lid, rowcol)] for layer, rowcol in found
+                              if layer.visible and (layer.lid, rowcol) in self.__tile_items])
+        return found
+
+    def count_asset(self, asset):
+        """
+        Counts the tiles of an asset
+        :param asset: The asset id
+        :return: The number of tiles
+        """
+        return self.__get_asset_index().count(asset)
+
+    def get_selected_assets(self):
+        """
+        Get the assets of the selected tiles
+        :return: A set of asset ids
+        """
+        return {self.__canvas_tiles[iid]["asset"] for iid in self.__selection}
+
+    def replace_asset(self, old, new):
+        """
+        Replaces the tiles of an asset with another asset, keeping their size and transform. Locked layers are left
+        alone. Each layer is written with one call, the tile items are switched over with one canvas call per size
+        and transform, and the chunk bitmaps are redrawn once each.
+        :param old: The asset id to replace
+        :param new: The asset id to replace it with
+        :return: The number of tiles replaced
+        """
+        if old == new:
+            return 0
+
+        # The tile items are switched over by group, so the pending ones are created first
+        self.__flush_redraw()
+        layers = {}
+        for layer, rowcol in self.__get_asset_index().find(old):
+            if not layer.locked:
+                span = layer.get_tile(rowcol)[1]
+                layers.setdefault(layer, []).append((rowcol, new, span, layer.get_transform(rowcol)))
+        for layer, tiles in layers.items():
+            changed = layer.set_tiles(tiles)
+            if layer.is_composited():
+                for position in changed:
+                    self.__refresh_chunk(layer, position)
+
+        # Only layers that aren't locked have tile items, so every item of the asset was replaced
+        for group in [group for group in self.__asset_groups if group[0] == old]:
+            self.__move_group(group, (new,) + group[1:])
+        if self.__selected_item is not None:
+            self.__selected_item["sprite"] = self.__get_tile_sprite(self.__selected_item["iid"])
+            self.__mark_resize_boxes()
+        return sum(len(tiles) for tiles in layers.values())
+
+    def __move_group(self, old, new):
+        """
+        Moves the tile items of an asset group to another group, and shows its image with one canvas call
+        :param old: The (asset, ratio, transform) of the items
+        :param new: The (asset, ratio, transform) they now show
+        """
+        old_tag, new_tag = self.__group_tag(*old), self.__group_tag(*new)
+        for iid in self.__canvas.find_withtag(old_tag):
+            tile = self.__canvas_tiles[iid]
+            tile["asset"], tile["sprite"] = new[0], None
+            self.__canvas.images.pop(iid, None)
+        self.__canvas.addtag_withtag(new_tag, old_tag)
+        self.__canvas.dtag(old_tag, old_tag)
+
+        counts = self.__asset_groups.setdefault(new, {})
+        for lid, count in self.__asset_groups.pop(old).items():
+            counts[lid] = counts.get(lid, 0) + count
+        self.__group_photos.pop(old, None)
+        self.__animation_photos.pop(old, None)
+        self.__canvas.itemconfigure(new_tag, image=self.__get_group_photo(*new))
+        self.__visible_animations = None
+
+    def reload_assets(self, aids):
+        """
+        Redraws the tiles of assets whose pixels changed, see SpriteWatcher. Tile items switch to the new images
+        with one canvas call per size and transform. Chunk bitmaps holding the assets are redrawn on screen first,
+        and the others once the event loop is idle.
+        :param aids: The ids of the changed assets
+        """
+        aids = set(aids)
+        for group in [group for group in self.__asset_groups if group[0] in aids]:
+            self.__group_photos.pop(group, None)
+            self.__animation_photos.pop(group, None)
+            for iid in self.__canvas.find_withtag(self.__group_tag(*group)):
+                self.__canvas_tiles[iid]["sprite"] = None
+                self.__canvas.images.pop(iid, None)
+            self.__get_group_photo(*group)
+
+        index = self.__get_asset_index()
+        chunks = {(layer, chunk.position) for aid in aids for layer, chunk in index.get_chunks(aid)
+                  if layer.is_composited()}
+        visible = self.__get_visible_chunks()
+        for layer, position in chunks:
+            self.__get_compositor().invalidate_chunk(layer, position)
+            if layer.visible and position in visible:
+                self.__refresh_chunk(layer, position)
+            elif layer.visible:
+                self.__refine_queue.append((layer, position))
+        if self.__refine_queue and self.__refine_job is None and self.__settle_job is None:
+            self.__refine_job = self.after(1, self.__refine_step)
+
+        for stamp in self.__tile_map.stamps:
+            if any(tile[2] in aids for tile in stamp.tiles):
+                stamp.clear_images()
+        # The ghost is made from a copy of the sprite, or from the image of a stamp
+        self.__delete_motion_item()
+        if self.__selected_item is not None and self.__canvas_tiles[self.__selected_item["iid"]]["asset"] in aids:
+            self.__selected_item["sprite"] = self.__get_tile_sprite(self.__selected_item["iid"])
+            self.__mark_resize_boxes()
+
+    def remove_unused_assets(self):
+        """
+        Removes the assets that no tile or stamp uses from the map. The ids of the assets after them shift, so
+        their tile items move to the groups of the new ids, and the chunk bitmaps holding them are redrawn.
+        :return: The number of assets removed
+        """
+        used = self.__get_asset_index().get_used()
+        for stamp in self.__tile_map.stamps:
+            used.update(tile[2] for tile in stamp.tiles)
+        used.update(self.__history.get_assets())
+        unused = [aid for aid in range(len(self.__tile_map.assets)) if aid not in used]
+        if not unused:
+            return 0
+
+        remap = self.__tile_map.remove_assets(unused)
+        self.__history.remap(remap)
+        self.__clipboard = [(lid, relative, remap.get(asset, asset), ratio, transform)
+                            for lid, relative, asset, ratio, transform in self.__clipboard]
+        if self.__autotiler is not None:
+            self.__autotiler.invalidate()
+
+        # Ids only shift down, so in order, a group never moves onto a group that still has to move. The sprites
+        # didn't change, so their images move along.
+        for group in sorted(group for group in self.__asset_groups if group[0] in remap):
+            new = (remap[group[0]],) + group[1:]
+            for photos in (self.__group_photos, self.__animation_photos):
+                if group in photos:
+                    photos[new] = photos.pop(group)
+            self.__move_group(group, new)
+
+        # The index already lists the chunks under the new ids. Hidden layers catch up when shown.
+        index = self.__get_asset_index()
+        for aid in set(remap.values()):
+            for layer, chunk in index.get_chunks(aid):
+                if layer.visible and layer.is_composited():
+                    self.__refresh_chunk(layer, chunk.position)
+        return len(unused)
+
+    # -- Scripting -- #
+    def transaction(self, name="Script"):
+        """
+        Starts a batch of edits for a script. The edits only change the map until the batch is committed, then the
+        changed squares are redrawn in one pass and the batch becomes one undo entry.
+        :param name: What the batch does, shown in the undo history
+        :return: The transaction, to be used as a context manager
+        """
+        return Transaction(self.__tile_map, name, on_commit=self.__commit_transaction)
+
+    def __commit_transaction(self, transaction):
+        """
+        Marks the edits of a committed transaction for redraw and records them for undo
+        :param transaction: The transaction
+        """
+        changes = transaction.get_changes()
+        self.__history.record(transaction.name, changes)
+        for lid, rowcol, _, _ in changes:
+            self.__dirty_cells.setdefault(lid, set()).add(rowcol)
+        self.__schedule_redraw()
+
+    def undo(self, event=None):
+        """
+        Undoes the last transaction
+        :param event: The tkinter event
+        :return: The name of the transaction, None if there was nothing to undo
+        """
+        return self.__redraw_history(self.__history.undo())
+
+    def redo(self, event=None):
+        """
+        Redoes the last undone transaction
+        :param event: The tkinter event
+        :return: The name of the transaction, None if there was nothing to redo
+        """
+        return self.__redraw_history(self.__history.redo())
+
+    def __redraw_history(self, result):
+        """
+        Marks the squares an undo or a redo changed for redraw
+        :param result: What History.undo or History.redo returned
+        :return: The name of the entry, None if there was none
+        """
+        if result is None:
+            return None
+        name, touched = result
+        for lid, cells in touched.items():
+            self.__dirty_cells.setdefault(lid, set()).update(cells)
+        self.__schedule_redraw()
+        return name
+
+    # -- Redraw -- #
+    def __schedule_redraw(self):
+        """
+        Flushes what was marked once the event loop is idle. Multiple calls in the same frame are merged.
+        """
+        if self.__redraw_job is None:
+            self.__redraw_job = self.after_idle(self.__flush_redraw)
+
+    def __mark_cells(self, layer, cells):
+        """
+        Marks squares whose tiles changed in the map. They are redrawn on the next flush, once each however many
+        times they were marked, and chunk bitmaps once per chunk.
+        :param layer: The layer
+        :param cells: The grid squares (x, y)
+        """
+        self.__dirty_cells.setdefault(layer.lid, set()).update(cells)
+        self.__schedule_redraw()
+
+    def __mark_resize_boxes(self):
+        """
+        Marks the resize boxes to be moved to the selected tile, or hidden, on the next flush
+        """
+        self.__dirty_resize_boxes = True
+        self.__schedule_redraw()
+
+    def __defer_motion(self, handler, event):
+        """
+        Runs a motion handler on the next flush with the latest of the events it got until then. The intermediate
+        positions of what follows the pointer are never seen, so they are skipped.
+        :param handler: The handler, called with the event
+        :param event: The tkinter event
+        """
+        self.__pending_motion[handler] = event
+        self.__schedule_redraw()
+
+    def __flush_redraw(self):
+        """
+        Brings the canvas up to date with everything marked since the last flush. Runs when the event loop is idle,
+        or right away before handlers that need the items to be current, like clicks.
+        """
+        if self.__redraw_job is None:
+            return
+        self.after_cancel(self.__redraw_job)
+
+        try:
+            # Pointer handlers first, they can mark squares and the resize boxes
+            pending, self.__pending_motion = self.__pending_motion, {}
+            for handler, event in pending.items():
+                handler(event)
+
+            dirty, self.__dirty_cells = self.__dirty_cells, {}
+            for lid, cells in dirty.items():
+                layer = self.__tile_map.get_layer(lid)
+                if layer is not None:
+                    self.__redraw_cells(layer, cells)
+            if dirty:
+                # Redrawn tiles left the selection
+                self.__update_selection_box()
+
+            if self.__dirty_resize_boxes:
+                self.__dirty_resize_boxes = False
+                self.__layout_resize_boxes()
+        finally:
+            # Cleared last so that what the flush marks itself doesn't schedule another one. If a handler raised,
+            # what it didn't get to is flushed on the next idle turn instead of blocking every later flush.
+            self.__redraw_job = None
+            if self.__pending_motion or self.__dirty_cells or self.__dirty_resize_boxes:
+                self.__schedule_redraw()
+
+    # -- Tile Items -- #
+    def __place_tile(self, layer, rowcol, asset, ratio, transform=0):
+        """
+        Places a tile in the map and draws it, replacing the tile anchored at the same square of the layer
+        :param layer: The layer
+        :param rowcol: The grid square (x, y)
+        :param asset: The asset id
+        :param ratio: The size of the tile in grid squares
+        :param transform: The transform of the tile, see tilemap.transform
+        """
+        old_iid = self.__tile_items.get((layer.lid, rowcol))
+        if old_iid is not None:
+            self.__delete_tile_item(old_iid)
+
+        # A tile placed by hand replaces the terrain of the square
+        layer.set_terrain(rowcol, 0)
+        layer.set_tile(rowcol, asset, ratio, transform)
+        if layer.is_composited():
+            self.__refresh_chunk(layer, chunk_of(rowcol)[0])
+        else:
+            self.__create_tile_item(layer, rowcol, asset, ratio, transform)
+
+    def __redraw_cells(self, layer, cells):
+        """
+        Redraws the tiles anchored at the given squares after the map changed
+        :param layer: The layer
+        :param cells: The grid squares (x, y)
+        """
+        if layer.is_composited():
+            for position in {chunk_of(rowcol)[0] for rowcol in cells}:
+                self.__refresh_chunk(layer, position)
+            return
+
+        for rowcol in cells:
+            iid = self.__tile_items.get((layer.lid, rowcol))
+            if iid is not None:
+                self.__delete_tile_item(iid)
+
+            tile = layer.get_tile(rowcol)
+            if tile is not None:
+                self.__create_tile_item(layer, rowcol, *tile, layer.get_transform(rowcol))
+
+    def __create_tile_item(self, layer, rowcol, asset, ratio, transform=0):
+        """
+        Draws a tile as its own canvas item
+        :param layer: The layer of the tile
+        :param rowcol: The grid square (x, y)
+        :param asset: The asset id
+        :param ratio: The size of the tile in grid squares
+        :param transform: The transform of the tile, see tilemap.transform
+        :return: The iid of the item
+        """
+        ratio = tuple(ratio)
+        # The new item has to be positioned like the other items of the layer
+        self.__scale_layer(layer)
+
+        # Draw the image, shared with every tile showing the same asset at the same size and transform
+        coords = rowcol[0] * self.__grid_size, rowcol[1] * self.__grid_size
+        iid = self.__canvas.create_image(*coords, image=self.__get_group_photo(asset, ratio, transform),
+                                         anchor=tk.NW, tags=("tile", "layer{}".format(layer.lid),
+                                                             self.__chunk_tag(layer, chunk_of(rowcol)[0]),
+                                                             self.__group_tag(asset, ratio, transform)))
+        self.__stack_item(iid, layer)
+        self.__join_group(layer, (asset, ratio, transform))
+        self.__visible_animations = None
+
+        self.__canvas_tiles[iid] = {
+            "sprite": None,     # Only created when the tile is edited, see __get_tile_sprite
+            "rowcol": rowcol,
+            "layer": layer,
+            "asset": asset,
+            "ratio": ratio,
+            "transform": transform
+        }
+        self.__tile_items[(layer.lid, rowcol)] = iid
+        return iid
+
+    def __get_tile_sprite(self, iid):
+        """
+        Get the sprite used to edit a tile, sized for the current grid size. Tiles are drawn from shared images,
+        so a tile only gets its own sprite once it is edited.
         :param iid: The iid of the tile
-        :param sprite: The sprite associated with the tile
+        :return: The sprite
         """
-        # Create tile specific events
-        def move_tile(event, iid=iid, sprite=sprite):
-            self.move_tile(event, iid, sprite)
+        tile = self.__canvas_tiles[iid]
+        sprite = tile["sprite"]
+        size = self.__grid_size * tile["ratio"][0], self.__grid_size * tile["ratio"][1]
+        if sprite is None:
+            sprite = tile["sprite"] = deepcopy(self.__tile_map.get_asset(tile["asset"]))
+        if sprite.get_ratio() != tile["ratio"] or sprite.get_size() != size or sprite.transform != tile["transform"]:
+            sprite.transform = tile["transform"]
+            sprite.set_ratio(tile["ratio"])
+            sprite.resize((self.__grid_size, self.__grid_size))
+            sprite.snap_to_ratio()
+        return sprite
 
-        def move_tile_complete(event, iid=iid, sprite=sprite):
-            self.move_tile_complete(event, iid, sprite)
+    def __set_tile_group(self, iid, ratio, transform=None):
+        """
+        Changes the size or the transform of a tile and shows the shared image for them again
+        :param iid: The iid of the tile
+        :param ratio: The new size in grid squares
+        :param transform: The new transform, None to keep the current one
+        """
+        tile = self.__canvas_tiles[iid]
+        ratio = tuple(ratio)
+        if transform is None:
+            transform = tile["transform"]
+        self.__leave_group(tile["layer"], tile["asset"], tile["ratio"], tile["transform"])
+        self.__canvas.dtag(iid, self.__group_tag(tile["asset"], tile["ratio"], tile["transform"]))
+
+        tile["ratio"], tile["transform"] = ratio, transform
+        group = tile["asset"], ratio, transform
+        self.__join_group(tile["layer"], group)
+        self.__canvas.addtag_withtag(self.__group_tag(*group), iid)
+        self.__canvas.itemconfigure(iid, image=self.__get_group_photo(*group))
+        self.__canvas.images.pop(iid, None)
+        self.__visible_animations = None
+
+    def __join_group(self, layer, group):
+        """
+        Adds a tile to the count of its asset group
+        :param layer: The layer of the tile
+        :param group: The (asset, ratio, transform) of the tile
+        """
+        counts = self.__asset_groups.setdefault(group, {})
+        counts[layer.lid] = counts.get(layer.lid, 0) + 1
 
-        def select_tile(event, iid=iid, sprite=sprite):
-            self.select_tile(event, iid, sprite)
+    def __leave_group(self, layer, asset, ratio, transform=0):
+        """
+        Removes a tile from the count of its asset group, dropping the shared image of empty groups
+        :param layer: The layer of the tile
+        :param asset: The asset id
+        :param ratio: The size in grid squares
+        :param transform: The transform of the tile, see tilemap.transform
+        """
+        key = asset, tuple(ratio), transform
+        counts = self.__asset_groups[key]
+        counts[layer.lid] -= 1
+        if counts[layer.lid] == 0:
+            del counts[layer.lid]
+        if not counts:
+            del self.__asset_groups[key]
+            self.__group_photos.pop(key, None)
+            self.__animation_photos.pop(key, None)
+
+    def __move_chunk_tag(self, iid, layer, old_rowcol, rowcol):
+        """
+        Updates the chunk tag of a tile that moved
+        :param iid: The iid of the tile
+        :param layer: The layer of the tile
+        :param old_rowcol: The previous grid square
+        :param rowcol: The new grid square
+        """
+        old_position, position = chunk_of(old_rowcol)[0], chunk_of(rowcol)[0]
+        if old_position != position:
+            self.__canvas.dtag(iid, self.__chunk_tag(layer, old_position))
+            self.__canvas.addtag_withtag(self.__chunk_tag(layer, position), iid)
 
-        self.__canvas.tag_bind(iid, "<B1-Motion>", move_tile, add="+")
-        self.__canvas.tag_bind(iid, "<ButtonRelease-1>", move_tile_complete, add="+")
-        self.__canvas.tag_bind(iid, "<Button-1>", select_tile, add="+")
+    def __delete_tile_item(self, iid):
+        """
+        Deletes the canvas item of a tile. The map itself is not changed.
+        :param iid: The iid of the item
+        """
+        tile = self.__canvas_tiles.pop(iid)
+        key = tile["layer"].lid, tile["rowcol"]
+        if self.__tile_items.get(key) == iid:
+            del self.__tile_items[key]
+        self.__leave_group(tile["layer"], tile["asset"], tile["ratio"], tile["transform"])
+        self.__visible_animations = None
+
+        if self.__selected_item is not None and self.__selected_item["iid"] == iid:
+            self.__selected_item = None
+            self.__mark_resize_boxes()
+        self.__selection.discard(iid)
+
+        self.__canvas.delete(iid)
+        self.__canvas.images.pop(iid, None)
+
+    def __commit_tile(self, iid, rowcol, ratio):
+        """
+        Writes the new position and size of an edited tile into the map
+        :param iid: The iid of the tile
+        :param rowcol: The new grid square (x, y)
+        :param ratio: The new size in grid squares
+        """
+        tile = self.__canvas_tiles[iid]
+        layer = tile["layer"]
+
+        if self.__tile_items.get((layer.lid, tile["rowcol"])) == iid:
+            del self.__tile_items[(layer.lid, tile["rowcol"])]
+            layer.remove_tile(tile["rowcol"])
+
+        # A tile moved onto another one replaces it
+        other = self.__tile_items.get((layer.lid, rowcol))
+        if other is not None:
+            self.__delete_tile_item(other)
+
+        layer.set_tile(rowcol, tile["asset"], ratio, tile["transform"])
+        self.__move_chunk_tag(iid, layer, tile["rowcol"], rowcol)
+        tile["rowcol"] = rowcol
+        self.__tile_items[(layer.lid, rowcol)] = iid
+        self.__set_tile_group(iid, ratio)
+        self.__visible_animations = None
+
+    def __find_tile(self, event):
+        """
+        Finds the tile under the pointer from the map: the tile anchored at the square under the pointer, or a
+        bigger tile covering it, in the topmost visible layer that has one.
+        :param event: The tkinter event
+        :return: The iid of the tile, None if there is none or if something else is on top of it
+        """
+        rowcol = (math.floor(self.__canvas.canvasx(event.x) / self.__grid_size),
+                  math.floor(self.__canvas.canvasy(event.y) / self.__grid_size))
+        for layer in reversed(self.__tile_map.layers):
+            if not layer.visible:
+                continue
+            anchor = layer.find_tile(rowcol)
+            if anchor is None:
+                continue
+            # Chunk bitmaps aren't tiles, but they cover the layers below
+            return None if layer.is_composited() else self.__tile_items.get((layer.lid, anchor))
+        return None
 
     def handle_enter_exit(self, event):
         """
@@ -255,64 +1834,73 @@ class InfiniteCanvas2(tk.Frame):
         :param event: The tkinter event
         """
         if self.__mode == Modes.ZOOM:
-            # This is to determine the final size of the canvas
-            # Currently the way is to get this value and then multiply the final grid size.
-            # This is to avoid accidentally changing the number of squares that should exist in the canvas.
-            # This extra calculation can be removed if this size is put at class definition.
-            # Temporarily keeping this here until I make sure this is the only good way of doing this.
-            row_squares = self.__csize[0] / self.__grid_size
-            col_squares = self.__csize[1] / self.__grid_size
-
-            self.__grid_size_old = self.__grid_size
-
             # Check whether to shrink the canvas or to grow the canvas
             if event.delta < 0:
-                self.__grid_size = round(self.__grid_size * (1 / self.__growth_rate))
-                if self.__grid_size < self.__grid_size_bounds[0]:
-                    self.__grid_size = self.__grid_size_bounds[0]
+                grid_size = round(self.__grid_size * (1 / self.__growth_rate))
             else:
-                self.__grid_size = round(self.__grid_size * self.__growth_rate)
-                if self.__grid_size > self.__grid_size_bounds[1]:
-                    self.__grid_size = self.__grid_size_bounds[1]
-
-            # If it actually resized then do all the necessary processing
-            if self.__grid_size != self.__grid_size_old:
-                self.__delete_resize_boxes()
-
-                self.__csize = self.__grid_size * row_squares, self.__grid_size * col_squares
-
-                self.__canvas.configure(width=self.__csize[0], height=self.__csize[1])
-                self.__canvas.configure(scrollregion=(0, 0, self.__csize[0], self.__csize[1]))
-
-                # Resize tiles in threads
-                iids = list(self.__canvas_tiles.keys())
-                length = len(iids)
-                num_groups = 10
-                portion = length//num_groups
-
-                for i in range(1, num_groups + 1):
-                    start = (i - 1) * portion
-                    end = i * portion if i < num_groups else length
-                    group = iids[start:end]
+                grid_size = round(self.__grid_size * self.__growth_rate)
+            self.__zoom_to(grid_size)
 
-                    tt = ThreadedTask(self.__zoom_tiles, event, group)
-                    tt.start()
-
-    def __zoom_tiles(self, event, group):
+    def __zoom_to(self, grid_size, preview=True):
         """
-        Zooms a certain number of tiles (specified by group)
-        :param event: The tkinter event
-        :param group: The group of tile iids
+        Changes the grid size, within its bounds, and redraws the tiles for it
+        :param grid_size: The new grid size
+        :param preview: If True, quick previews are drawn until the wheel settles, otherwise the final images
         """
-        for iid in group:
-            self.__move_and_resize_image(event, iid)
+        # This is to determine the final size of the canvas
+        # Currently the way is to get this value and then multiply the final grid size.
+        # This is to avoid accidentally changing the number of squares that should exist in the canvas.
+        # This extra calculation can be removed if this size is put at class definition.
+        # Temporarily keeping this here until I make sure this is the only good way of doing this.
+        row_squares = self.__csize[0] / self.__grid_size
+        col_squares = self.__csize[1] / self.__grid_size
+
+        self.__grid_size_old = self.__grid_size
+        self.__grid_size = min(max(grid_size, self.__grid_size_bounds[0]), self.__grid_size_bounds[1])
+
+        # If it actually resized then do all the necessary processing
+        if self.__grid_size != self.__grid_size_old:
+            self.__mark_resize_boxes()
+
+            self.__csize = self.__grid_size * row_squares, self.__grid_size * col_squares
+            self.__visible_animations = None
+
+            self.__canvas.configure(width=self.__csize[0], height=self.__csize[1])
+            self.__canvas.configure(scrollregion=(0, 0, self.__csize[0], self.__csize[1]))
+            self.__schedule_view_update()
+
+            # Reposition the visible layers chunk by chunk, hidden layers are caught up when shown
+            for layer in self.__tile_map.layers:
+                if layer.visible:
+                    self.__refresh_layer(layer, preview=preview)
+
+            if preview:
+                # Re-rasterize once per asset and size, with quick previews until the wheel settles
+                self.__rasterize_groups(preview=True)
+                self.__schedule_refine()
+            else:
+                self.__rasterize_groups()
 
     def handle_motion(self, event):
         """
         Handles events for when the mouse is moved in the canvas
         :param event: The tkinter event
         """
-        if self.__mode == Modes.ADD:
+        self.__pointer = event.x, event.y
+        self.__defer_motion(self.__apply_motion, event)
+
+    def __apply_motion(self, event):
+        """
+        Moves the ghost of what would be placed to the pointer
+        :param event: The latest motion event
+        """
+        if self.__mode == Modes.STAMP and self.__mode.has_related_item():
+            self.__move_stamp_ghost(event)
+        elif self.__mode == Modes.ADD:
+            # The ghost of a stamp is left over when switching from stamp mode
+            if self.__motion_item is not None and "stamp" in self.__motion_item:
+                self.__delete_motion_item()
+
             # In ADD mode, this is going to be used to create a ghosting effect for the item to show the user
             # where the object will be placed when they place the sprite
             # The motion item is used to keep track of the selected sprite
@@ -335,7 +1923,7 @@ class InfiniteCanvas2(tk.Frame):
                     "sprite": sprite
                 }
 
-            else:
+            elif self.__motion_item is not None:
                 iid = self.__motion_item["iid"]
                 sprite = self.__motion_item["sprite"]
 
@@ -362,36 +1950,31 @@ class InfiniteCanvas2(tk.Frame):
         else:
             self.__delete_motion_item()
 
-    # -- Canvas Tile Events -- #
-    def __resize_image(self, event, iid):
-        """
-        Resize image in the canvas to match that of the gridsize of the canvas
-        :param event: The event
-        :param iid: The id of the image
+    def __move_stamp_ghost(self, event):
         """
-        # Get sprite
-        sprite = self.__canvas_tiles[iid]["sprite"]
-        # Resize the sprite only if it needs resizing
-        size = sprite.get_size()
-        if size[0] != self.__grid_size or size[1] != self.__grid_size:
-            sprite.resize((self.__grid_size, self.__grid_size))
-            sprite.snap_to_ratio()
-
-            photoimage = sprite.get_photo_image()
-            self.__canvas.itemconfigure(iid, image=photoimage)
-            self.__canvas.images[iid] = photoimage
-
-    def __move_and_resize_image(self, event, iid):
-        """
-        Moves and Resizes an image. For zoom purposes.
+        Shows where the stamp of stamp mode would be placed, with one image for the whole stamp
         :param event: The tkinter event
-        :param iid: The iid of the sprite to move and resize
         """
-        rowcol = self.__canvas_tiles[iid]["rowcol"]
-        new_coords = rowcol[0] * self.__grid_size, rowcol[1] * self.__grid_size
-        self.__canvas.coords(iid, *new_coords)
-        self.__resize_image(event, iid)
+        stamp = self.__mode.get_related_item()
+        coords = self.__map_to_grid((self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)))
+        item = self.__motion_item
+        if item is not None and item.get("stamp") is stamp and item["grid_size"] == self.__grid_size:
+            self.__canvas.coords(item["iid"], *coords)
+            return
+
+        # Imported here so that PIL isn't imported at startup
+        from PIL import ImageTk
+        self.__delete_motion_item()
+        ghost = ImageTk.PhotoImage(stamp.get_ghost_image(self.__tile_map, self.__grid_size))
+        iid = self.__canvas.create_image(*coords, image=ghost, anchor=tk.NW)
+        self.__canvas.images[iid] = ghost
+        self.__motion_item = {
+            "iid": iid,
+            "stamp": stamp,
+            "grid_size": self.__grid_size
+        }
 
+    # -- Canvas Tile Events -- #
     def __delete_motion_item(self):
         """
         Deletes ghost image from the canvas.
@@ -421,7 +2004,9 @@ class InfiniteCanvas2(tk.Frame):
         :param iid: id of the item in the canvas
         :param sprite: The related sprite
         """
-        if self.__mode == Modes.EDIT:
+        if self.__mode == Modes.EDIT and self.__group_drag is not None:
+            self.__drag_selection(event)
+        elif self.__mode == Modes.EDIT:
             self.__canvas.itemconfigure(iid, anchor=tk.CENTER)
 
             coords = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
@@ -445,9 +2030,6 @@ class InfiniteCanvas2(tk.Frame):
                 gid = self.__candidate_item["iid"]
                 self.__canvas.coords(gid, candidate_coords)
 
-            rowcol = candidate_coords[0] // self.__grid_size, candidate_coords[1] // self.__grid_size
-            self.__canvas_tiles[iid]["rowcol"] = rowcol
-
     def move_tile_complete(self, event, iid, sprite):
         """
         Called after a tile has been moved
@@ -455,13 +2037,22 @@ class InfiniteCanvas2(tk.Frame):
         :param iid: The id of the canvas
         :param sprite: The sprite object of the tile
         """
+        if self.__group_drag is not None:
+            self.__drop_selection()
+            return
+
+        if self.__candidate_item is None:
+            return
+
         final_coords = self.__canvas.coords(self.__candidate_item["iid"])
         self.__canvas.itemconfigure(iid, anchor=tk.NW)
         self.__canvas.coords(iid, final_coords)
 
+        rowcol = round(final_coords[0] / self.__grid_size), round(final_coords[1] / self.__grid_size)
+        self.__commit_tile(iid, rowcol, sprite.get_ratio())
+
         self.__delete_candidate_item()
-        self.__delete_resize_boxes()
-        self.__create_resize_boxes(iid, sprite)
+        self.__mark_resize_boxes()
 
     def __get_candidate_coords(self, bbox, ratio):
         """
@@ -516,60 +2107,73 @@ class InfiniteCanvas2(tk.Frame):
         :param sprite: The related sprite
         """
         if self.__mode == Modes.EDIT:
+            # Dragging a tile of a multi tile selection moves the whole selection
+            if iid in self.__selection and len(self.__selection) > 1:
+                self.__start_group_drag(event)
+                return
+
+            self.__set_selection([iid])
             self.__selected_item = {
                 "iid": iid,
                 "sprite": sprite
             }
+            self.__mark_resize_boxes()
 
-            self.__create_resize_boxes(iid, sprite)
-
-    def __create_resize_boxes(self, iid, sprite):
+    def __layout_resize_boxes(self):
         """
-        Creates the resize boxes around a tile
-        :param iid: The id of the tile
-        :param sprite: The sprite object
+        Puts the resize boxes around the selected tile, or hides them when no single tile is selected. The boxes
+        are created once and only moved after that. They have no bindings, see __find_resize_box.
         """
-        # Delete resize boxes
-        self.__delete_resize_boxes()
+        item = self.__selected_item
+        if item is None or item["iid"] not in self.__canvas_tiles:
+            if self.__resize_boxes_shown:
+                self.__canvas.itemconfigure("resize_box", state=tk.HIDDEN)
+                self.__resize_boxes_shown = False
+            return
 
         # Set the for corner coordinates
-        bbox = self.__canvas.bbox(iid)
-        size = sprite.get_size()
+        bbox = self.__canvas.bbox(item["iid"])
+        middle = (bbox[0] + bbox[2]) // 2, (bbox[1] + bbox[3]) // 2
         half_rb_size = self.__resize_box_size // 2
         coords = {
-            "left": (bbox[0] - self.__resize_box_size, bbox[1] + (size[1] // 2) - half_rb_size),
-            "top": (bbox[0] + (size[0] // 2) - half_rb_size, bbox[1] - self.__resize_box_size),
-            "right": (bbox[2], bbox[1] + (size[1] // 2) - half_rb_size),
-            "bottom": (bbox[0] + (size[0] // 2) - half_rb_size, bbox[3])
+            "left": (bbox[0] - self.__resize_box_size, middle[1] - half_rb_size),
+            "top": (middle[0] - half_rb_size, bbox[1] - self.__resize_box_size),
+            "right": (bbox[2], middle[1] - half_rb_size),
+            "bottom": (middle[0] - half_rb_size, bbox[3])
         }
 
         for key in coords:
             # x0, y0, x1, y1
             final = coords[key][0], coords[key][1],\
                     coords[key][0] + self.__resize_box_size, coords[key][1] + self.__resize_box_size
-            rid = self.__canvas.create_rectangle(*final, fill="white")
-
-            self.__resize_boxes[key]["iid"] = rid
-
-            # Resize events
-            def drag_resize_tile(event, side=key):
-                self.drag_resize_tile(event, side)
-
-            def drag_resize_complete(event):
-                self.drag_resize_complete(event)
+            rid = self.__resize_boxes[key]["iid"]
+            if rid is None:
+                self.__resize_boxes[key]["iid"] = self.__canvas.create_rectangle(*final, fill="white",
+                                                                                 tags=("resize_box",))
+            else:
+                self.__canvas.coords(rid, *final)
 
-            self.__canvas.tag_bind(rid, "<B1-Motion>", drag_resize_tile, add="+")
-            self.__canvas.tag_bind(rid, "<ButtonRelease-1>", drag_resize_complete, add="+")
+        if not self.__resize_boxes_shown:
+            self.__canvas.itemconfigure("resize_box", state=tk.NORMAL)
+            self.__resize_boxes_shown = True
+        # Tiles created since the boxes were may be stacked above them
+        self.__canvas.tag_raise("resize_box")
 
-    def __delete_resize_boxes(self):
+    def __find_resize_box(self, event):
         """
-        Destroys resize boxes
+        Finds the resize box under the pointer
+        :param event: The tkinter event
+        :return: The side of the box, None if the pointer isn't on one
         """
-        for key in self.__resize_boxes:
-            # Only need to delete if they actually exist
-            if self.__resize_boxes[key]["iid"] is not None:
-                self.__canvas.delete(self.__resize_boxes[key]["iid"])
-                self.__resize_boxes[key]["iid"] = None
+        if not self.__resize_boxes_shown:
+            return None
+
+        x, y = self.__canvas.canvasx(event.x), self.__canvas.canvasy(event.y)
+        for side, box in self.__resize_boxes.items():
+            x0, y0, x1, y1 = self.__canvas.coords(box["iid"])
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return side
+        return None
 
     def drag_resize_tile(self, event, side):
         """
@@ -577,6 +2181,9 @@ class InfiniteCanvas2(tk.Frame):
         :param event: The tkinter event
         :param side: The side
         """
+        # The selection may have changed before the deferred drag ran
+        if self.__selected_item is None:
+            return
         tid = self.__selected_item["iid"]
         sprite = self.__selected_item["sprite"]
 
@@ -660,14 +2267,14 @@ class InfiniteCanvas2(tk.Frame):
             self.__canvas.coords(rcid, *nw)
             self.__canvas.images[rcid] = photo_image
 
-        rowcol = self.__canvas.coords(rcid)[0] // self.__grid_size, self.__canvas.coords(rcid)[1] // self.__grid_size
-        self.__canvas_tiles[rcid]["rowcol"] = rowcol
-
     def drag_resize_complete(self, event):
         """
         Called after the drag resizing is done
         :param event: The tkinter event
         """
+        if self.__resize_candidate_item is None:
+            return
+
         tid = self.__selected_item["iid"]
         sprite = self.__selected_item["sprite"]
 
@@ -681,15 +2288,13 @@ class InfiniteCanvas2(tk.Frame):
         sprite.resize((self.__grid_size, self.__grid_size))
         sprite.snap_to_ratio()
 
-        photo_image = sprite.get_photo_image()
-        self.__canvas.itemconfigure(tid, image=photo_image)
-        self.__canvas.images[tid] = photo_image
+        # Committing puts the tile back on the shared image for its new size
+        rowcol = round(clocation[0] / self.__grid_size), round(clocation[1] / self.__grid_size)
+        self.__commit_tile(tid, rowcol, csprite_ratio)
 
         self.__delete_resize_candidate_item()
 
-        # Temporary, might change to just moving the alternate boxes later
-        self.__delete_resize_boxes()
-        self.__create_resize_boxes(tid, sprite)
+        self.__mark_resize_boxes()
 
     def __delete_resize_candidate_item(self):
         """
@@ -702,12 +2307,3 @@ class InfiniteCanvas2(tk.Frame):
             del self.__canvas.images[iid]
             self.__resize_candidate_item = None
 
-
-class ThreadedTask(Thread):
-    def __init__(self, action, *args):
-        super().__init__()
-        self.action = action
-        self.args = args
-
-    def run(self):
-        self.action(*self.args)
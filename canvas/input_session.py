@@ -0,0 +1,338 @@
+import json
+import struct
+import time
+from mode import Modes
+
+# Input sessions are files holding a header followed by fixed size records:
+#   header  magic, format version, length of the json state that follows (view, window size and mode at the start)
+#   record  ms since the start, kind, x, y, value
+SESSION_MAGIC = b"TMIS"
+SESSION_VERSION = 1
+_HEADER = struct.Struct("<4sBI")
+_RECORD = struct.Struct("<IBiii")
+
+# The mode and the related item (asset id, terrain id in terrain mode, stamp index in stamp mode) were changed
+# from outside the canvas, by the menus. x is the Modes value, y the id or -1.
+KIND_MODE = 0
+# Kind -> (sequence, handler of InfiniteCanvas2, event type). Kinds are stored in the files, only append to this.
+EVENTS = {
+    1: ("<KeyPress-Control_L>", "set_zoom_mode", "KeyPress"),
+    2: ("<KeyRelease-Control_L>", "set_zoom_mode", "KeyRelease"),
+    3: ("<KeyPress-space>", "set_drag_mode", "KeyPress"),
+    4: ("<KeyRelease-space>", "set_drag_mode", "KeyRelease"),
+    5: ("<Button-1>", "handle_button_click", "ButtonPress"),
+    6: ("<B1-Motion>", "handle_button_motion", "Motion"),
+    7: ("<ButtonRelease-1>", "handle_button_release", "ButtonRelease"),
+    8: ("<Motion>", "handle_motion", "Motion"),
+    9: ("<MouseWheel>", "handle_scroll", "MouseWheel"),
+    10: ("<Enter>", "handle_enter_exit", "Enter"),
+    11: ("<Leave>", "handle_enter_exit", "Leave"),
+    12: ("<Control-c>", "copy_selection", "KeyPress"),
+    13: ("<Control-v>", "paste", "KeyPress"),
+    14: ("<Delete>", "delete_selection", "KeyPress"),
+    15: ("<Escape>", "clear_selection", "KeyPress"),
+    16: ("<KeyPress-r>", "rotate_selection", "KeyPress"),
+    17: ("<KeyPress-f>", "flip_selection_x", "KeyPress"),
+    18: ("<KeyPress-v>", "flip_selection_y", "KeyPress"),
+    19: ("<KeyPress-g>", "toggle_grid", "KeyPress"),
+    20: ("<Control-z>", "undo", "KeyPress"),
+    21: ("<Control-y>", "redo", "KeyPress"),
+}
+
+
+def read_session(filename: str):
+    """
+    Reads an input session
+
+    :param filename: The session file
+    :return: (state at the start, list of (ms, kind, x, y, value))
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+
+    magic, version, length = _HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC or version > SESSION_VERSION:
+        raise ValueError("Not an input session, or recorded by a newer version")
+    state = json.loads(data[_HEADER.size:_HEADER.size + length].decode())
+    offset = _HEADER.size + length
+    # A session cut short by a crash ends with a partial record, which is dropped
+    end = offset + (len(data) - offset) // _RECORD.size * _RECORD.size
+    return state, list(_RECORD.iter_unpack(data[offset:end]))
+
+
+class InputRecorder:
+    def __init__(self, canvas, widget, mode, filename: str, tag: str = "InputRecorder"):
+        """
+        Records the input events reaching a canvas to a session file, so that they can be replayed later with
+        InputReplayer. The events are caught by a bind tag put in front of the widget's own tags, so they are
+        stamped before the canvas handles them, and the handlers themselves are left as they are. A second tag
+        after the others notes the mode once the handlers ran, so that mode changes made by the menus between
+        two events can be told apart from the ones made by the events.
+
+        Every binding of the canvas is in EVENTS, resize boxes included since the canvas finds them itself.
+        Recording doesn't change the map: the related sprite of the add mode is written as -1 until the map has it,
+        which is after the first tile of it is placed, so the replay can't place that first tile.
+
+        :param canvas: The InfiniteCanvas2
+        :param widget: The tkinter canvas the events are bound to
+        :param mode: The mode object
+        :param filename: The session file, overwritten
+        :param tag: The bind tag
+        """
+        self.canvas = canvas
+        self.filename = filename
+        self._widget = widget
+        self._mode = mode
+        self._tag = tag
+        self._after_tag = tag + "After"
+        self._start = time.perf_counter()
+        self.count = 0
+
+        state = {
+            "view": canvas.get_view_state(),
+            "size": (canvas.winfo_width(), canvas.winfo_height()),
+            "mode": self._get_mode(),
+        }
+        self._last_mode = state["mode"]
+        header = json.dumps(state).encode()
+        self._file = open(filename, "wb")
+        self._file.write(_HEADER.pack(SESSION_MAGIC, SESSION_VERSION, len(header)) + header)
+
+        for kind, (sequence, _, _) in EVENTS.items():
+            widget.bind_class(self._tag, sequence, lambda event, kind=kind: self._record(kind, event))
+            widget.bind_class(self._after_tag, sequence, self._note_mode)
+        widget.bindtags((self._tag,) + tuple(widget.bindtags()) + (self._after_tag,))
+
+    def _get_mode(self):
+        """
+        Get the mode, and the id of its related item
+
+        :return: [Modes value, asset id, terrain id or stamp index, -1 if there is none]
+        """
+        item = self._mode.get_related_item()
+        tile_map = self.canvas.get_tile_map()
+        related = -1
+        if item is not None:
+            if self._mode == Modes.TERRAIN:
+                related = tile_map.terrains.index(item) + 1 if item in tile_map.terrains else -1
+            elif self._mode == Modes.STAMP:
+                related = tile_map.stamps.index(item) if item in tile_map.stamps else -1
+            else:
+                aid = tile_map.get_asset_id(item)
+                related = aid if aid is not None else -1
+        return [self._mode.get_mode_value().value, related]
+
+    def _write(self, kind: int, x: int, y: int, value: int):
+        """
+        Writes a record
+
+        :param kind: The kind of record
+        :param x: The x coordinate, or the mode
+        :param y: The y coordinate, or the related item
+        :param value: The wheel delta
+        """
+        ms = round((time.perf_counter() - self._start) * 1000)
+        self._file.write(_RECORD.pack(ms, kind, x, y, value))
+        self.count += 1
+
+    def _record(self, kind: int, event):
+        """
+        Records an event, before the canvas handles it
+
+        :param kind: The kind of event
+        :param event: The tkinter event
+        """
+        if self._file is None:
+            return
+        mode = self._get_mode()
+        if mode != self._last_mode:
+            self._write(KIND_MODE, mode[0], mode[1], 0)
+            self._last_mode = mode
+        self._write(kind, event.x, event.y, getattr(event, "delta", 0) or 0)
+
+    def _note_mode(self, event):
+        """
+        Notes the mode after the canvas handled an event
+
+        :param event: The tkinter event
+        """
+        if self._file is None:
+            return
+        mode = self._get_mode()
+        if self._last_mode[1] == -1 and mode[1] != -1 and mode[0] == self._last_mode[0]:
+            # The handler added the sprite of the add mode to the map, which the replay can't do. The id is
+            # written before the next event.
+            return
+        self._last_mode = mode
+
+    def stop(self):
+        """
+        Stops recording and closes the file
+        """
+        if self._file is None:
+            return
+        tags = self._widget.bindtags()
+        self._widget.bindtags(tuple(tag for tag in tags if tag not in (self._tag, self._after_tag)))
+        self._file.close()
+        self._file = None
+
+
+class _ReplayEvent:
+    __slots__ = ("type", "x", "y", "delta", "widget", "time")
+
+    def __init__(self, event_type, x, y, delta, widget, ms):
+        """
+        The part of a tkinter event the handlers read
+        """
+        self.type = event_type
+        self.x = x
+        self.y = y
+        self.delta = delta
+        self.widget = widget
+        self.time = ms
+
+
+class ReplayReport:
+    def __init__(self):
+        """
+        The time spent in each handler during a replay
+        """
+        self.timings = {}       # Handler name -> list of durations in seconds
+        self.elapsed = 0.0      # Wall time of the whole replay in seconds
+        self.events = 0
+        self.warnings = []
+
+    def add(self, name: str, duration: float):
+        """
+        Adds a handler call
+
+        :param name: The handler name
+        :param duration: The time it took in seconds
+        """
+        self.timings.setdefault(name, []).append(duration)
+
+    def get_report(self) -> dict:
+        """
+        Get the timings
+
+        :return: A dict of handler name -> {"calls", "total_ms", "mean_ms", "p95_ms", "max_ms"}
+        """
+        report = {}
+        for name, durations in self.timings.items():
+            ordered = sorted(durations)
+            report[name] = {
+                "calls": len(ordered),
+                "total_ms": round(sum(ordered) * 1000, 3),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return report
+
+    def print_report(self, file=None):
+        """
+        Prints the timings in a readable format, slowest handlers first
+
+        :param file: The file to print to, stdout by default
+        """
+        for warning in self.warnings:
+            print("warning: " + warning, file=file)
+        print("{} events replayed in {:.1f} ms".format(self.events, self.elapsed * 1000), file=file)
+        print("  {:<22} {:>6} {:>11} {:>9} {:>9} {:>9}".format("handler", "calls", "total ms", "mean", "p95", "max"),
+              file=file)
+        for name, entry in sorted(self.get_report().items(), key=lambda item: -item[1]["total_ms"]):
+            print("  {:<22} {:>6} {:>11.2f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                name, entry["calls"], entry["total_ms"], entry["mean_ms"], entry["p95_ms"], entry["max_ms"]),
+                file=file)
+
+
+class InputReplayer:
+    def __init__(self, canvas, mode, filename: str):
+        """
+        Replays a session recorded by InputRecorder by calling the same canvas handlers with the same events.
+        Replaying over the map the session was recorded on, from the same view, gives the same edits every time,
+        which turns a session into a benchmark.
+
+        :param canvas: The InfiniteCanvas2
+        :param mode: The mode object given to the canvas
+        :param filename: The session file
+        """
+        self.canvas = canvas
+        self.mode = mode
+        self.state, self.records = read_session(filename)
+
+    def restore(self, report: ReplayReport = None):
+        """
+        Puts the view and the mode back to how they were when recording started
+
+        :param report: Gets a warning if the window isn't the size it was recorded at
+        """
+        self.canvas.set_view_state(self.state["view"])
+        self._set_mode(*self.state["mode"])
+        self.canvas.update_idletasks()
+
+        size = tuple(self.state["size"])
+        current = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if report is not None and current != size:
+            report.warnings.append("the canvas is {}x{}, the session was recorded at {}x{}".format(*current, *size))
+
+    def _set_mode(self, value: int, related: int):
+        """
+        Switches the mode
+
+        :param value: The Modes value
+        :param related: The id of the related asset or terrain, or the index of the stamp, -1 if there is none
+        """
+        mode = Modes(value)
+        tile_map = self.canvas.get_tile_map()
+        item = None
+        if mode == Modes.TERRAIN:
+            if 0 < related <= len(tile_map.terrains):
+                item = tile_map.terrains[related - 1]
+        elif mode == Modes.STAMP:
+            if 0 <= related < len(tile_map.stamps):
+                item = tile_map.stamps[related]
+        elif 0 <= related < len(tile_map.assets):
+            item = tile_map.get_asset(related)
+        self.mode.set_mode(mode)
+        self.mode.set_related_item(item)
+
+    def replay(self, real_time: bool = False) -> ReplayReport:
+        """
+        Replays the session. The idle callbacks queued by each event, redraws included, run right after it and
+        are timed as "idle".
+
+        :param real_time: If True, events are spaced like they were recorded and timers run in between, otherwise
+        they are replayed as fast as possible
+        :return: The timings
+        """
+        report = ReplayReport()
+        self.restore(report)
+
+        start = time.perf_counter()
+        for ms, kind, x, y, value in self.records:
+            if real_time:
+                # Keeps the event loop running while waiting, so that timers like the zoom refinement fire
+                while (time.perf_counter() - start) * 1000 < ms:
+                    self.canvas.update()
+                    time.sleep(0.001)
+
+            if kind == KIND_MODE:
+                self._set_mode(x, y)
+                continue
+            entry = EVENTS.get(kind)
+            if entry is None:
+                continue
+            _, name, event_type = entry
+            event = _ReplayEvent(event_type, x, y, value, self.canvas, ms)
+
+            begin = time.perf_counter()
+            getattr(self.canvas, name)(event)
+            handled = time.perf_counter()
+            self.canvas.update_idletasks()
+            report.add(name, handled - begin)
+            report.add("idle", time.perf_counter() - handled)
+            report.events += 1
+
+        report.elapsed = time.perf_counter() - start
+        return report
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from PIL import Image, ImageTk
+from sprite.sprite import DEFAULT_RESAMPLE, PREVIEW_RESAMPLE, get_resample_filter
+from tilemap.chunk import CHUNK_SIZE
+
+
+class LayerCompositor:
+    def __init__(self, tile_map, max_items: int = 1024, resample=DEFAULT_RESAMPLE, preview_resample=PREVIEW_RESAMPLE):
+        """
+        Renders the chunks of a layer into single bitmaps, so that layers that aren't being edited can be drawn with
+        one canvas item per chunk instead of one per tile. Renders are cached by layer, chunk and grid size, and are
+        reused as long as the chunk hasn't changed.
+
+        :param tile_map: The tile map
+        :param max_items: The number of chunk bitmaps to keep
+        :param resample: The resampling filter the tiles are scaled with
+        :param preview_resample: The resampling filter of the quick previews shown while zooming
+        """
+        self._tile_map = tile_map
+        self._max_items = max_items
+        self._resample = resample
+        self.preview_resample = preview_resample
+        # (lid, chunk position, grid size) -> [chunk version, Image or None, PhotoImage or None]
+        self._cache = OrderedDict()
+        self._latest = {}   # (lid, chunk position) -> grid size of the last render, used for previews
+
+    def set_resample(self, resample):
+        """
+        Changes the filter the tiles are scaled with. The cached bitmaps are dropped if it changed.
+
+        :param resample: The resampling filter
+        """
+        if get_resample_filter(resample) != get_resample_filter(self._resample):
+            self._cache.clear()
+            self._latest.clear()
+        self._resample = resample
+
+    def render_chunk(self, layer, chunk, grid_size: int):
+        """
+        Get the bitmap of a chunk. The bitmap starts at the top left corner of the chunk and is big enough to hold
+        the tiles anchored in the chunk, including those that stick out of it.
+
+        :param layer: The layer of the chunk
+        :param chunk: The chunk
+        :param grid_size: The current grid size
+        :return: The image, None if the chunk has no tiles
+        """
+        return self._get_entry(layer, chunk, grid_size)[1]
+
+    def get_photo_image(self, layer, chunk, grid_size: int):
+        """
+        Get the bitmap of a chunk as a photo image, see render_chunk
+
+        :param layer: The layer of the chunk
+        :param chunk: The chunk
+        :param grid_size: The current grid size
+        :return: The photo image, None if the chunk has no tiles
+        """
+        entry = self._get_entry(layer, chunk, grid_size)
+        if entry[2] is None and entry[1] is not None:
+            entry[2] = ImageTk.PhotoImage(entry[1])
+        return entry[2]
+
+    def get_preview_photo_image(self, layer, chunk, grid_size: int):
+        """
+        Get a quick preview of the bitmap of a chunk. If the chunk is already rendered at the grid size the render
+        is returned, otherwise the last render at another grid size is scaled with the preview filter. The preview
+        isn't cached. Chunks that were never rendered are rendered normally.
+
+        :param layer: The layer of the chunk
+        :param chunk: The chunk
+        :param grid_size: The current grid size
+        :return: (photo image or None if the chunk has no tiles, True if it is the final render)
+        """
+        entry = self._cache.get((layer.lid, chunk.position, grid_size))
+        latest = self._latest.get((layer.lid, chunk.position))
+        source = None if latest is None else self._cache.get((layer.lid, chunk.position, latest))
+        if (entry is not None and entry[0] == chunk.version) or source is None or source[0] != chunk.version:
+            return self.get_photo_image(layer, chunk, grid_size), True
+        if source[1] is None:
+            return None, False
+
+        factor = grid_size / latest
+        size = max(1, round(source[1].width * factor)), max(1, round(source[1].height * factor))
+        preview = source[1].resize(size, get_resample_filter(self.preview_resample))
+        return ImageTk.PhotoImage(preview), False
+
+    def _get_entry(self, layer, chunk, grid_size):
+        """
+        Get the cache entry of a chunk, rendering the chunk if the entry is missing or out of date
+
+        :param layer: The layer of the chunk
+        :param chunk: The chunk
+        :param grid_size: The current grid size
+        :return: The cache entry
+        """
+        key = layer.lid, chunk.position, grid_size
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != chunk.version:
+            entry = [chunk.version, self._render(chunk, grid_size), None]
+            self._cache[key] = entry
+            self._latest[key[:2]] = grid_size
+
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_items:
+            self._cache.popitem(last=False)
+        return entry
+
+    def _render(self, chunk, grid_size):
+        """
+        Pastes the tiles of a chunk onto a transparent bitmap
+
+        :param chunk: The chunk
+        :param grid_size: The current grid size
+        :return: The image, None if the chunk has no tiles
+        """
+        tiles = list(chunk.tiles())
+        if not tiles:
+            return None
+
+        width = max(local[0] + span[0] for local, _, span in tiles) * grid_size
+        height = max(local[1] + span[1] for local, _, span in tiles) * grid_size
+        width, height = max(width, CHUNK_SIZE * grid_size), max(height, CHUNK_SIZE * grid_size)
+
+        image = Image.new("RGBA", (width, height))
+        for local, asset, span in tiles:
+            sprite = self._tile_map.get_asset(asset)
+            scaled = sprite.get_scaled((span[0] * grid_size, span[1] * grid_size), self._resample,
+                                       chunk.get_transform(local))
+            if scaled.mode != "RGBA":
+                scaled = scaled.convert("RGBA")
+            image.alpha_composite(scaled, (local[0] * grid_size, local[1] * grid_size))
+        return image
+
+    def invalidate_chunk(self, layer, position):
+        """
+        Drops the cached bitmaps of a chunk, for when a sprite it shows changed without the chunk changing
+
+        :param layer: The layer
+        :param position: The chunk position
+        """
+        for key in [key for key in self._cache if key[:2] == (layer.lid, position)]:
+            del self._cache[key]
+        self._latest.pop((layer.lid, position), None)
+
+    def invalidate_layer(self, layer):
+        """
+        Drops the cached bitmaps of a layer
+
+        :param layer: The layer
+        """
+        for key in [key for key in self._cache if key[0] == layer.lid]:
+            del self._cache[key]
+        for key in [key for key in self._latest if key[0] == layer.lid]:
+            del self._latest[key]
@@ -0,0 +1,120 @@
+import math
+import tkinter as tk
+from collections import OrderedDict
+from PIL import Image, ImageTk
+
+
+class ReferenceLayer:
+    def __init__(self, canvas: tk.Canvas, pyramid, cell_pixels: int = 32, position=(0, 0), max_photos: int = 128,
+                 tag: str = "reference"):
+        """
+        Draws a large reference image under the map from an image pyramid. Only the tiles crossing the visible
+        area are on the canvas, taken from the level that matches the zoom, so memory and redraw time depend on the
+        size of the screen and not on the size of the image.
+
+        :param canvas: The canvas to draw on
+        :param pyramid: The image pyramid
+        :param cell_pixels: The number of image pixels covered by one grid square
+        :param position: The grid square the top left corner of the image is on (x, y)
+        :param max_photos: The number of scaled tiles kept, so scrolling back and forth doesn't scale them again
+        :param tag: The tag given to every tile item
+        """
+        self._canvas = canvas
+        self.pyramid = pyramid
+        self.cell_pixels = cell_pixels
+        self.position = position
+        self.max_photos = max_photos
+        self.tag = tag
+
+        self._items = {}                # (level, x, y) -> iid of the tiles on the canvas
+        self._photos = OrderedDict()    # (level, x, y, width, height) -> PhotoImage, least recently used first
+        self._shown = {}                # iid -> PhotoImage, keeps the images of the items alive
+        self._last_state = None
+
+    def update(self, grid_size: int):
+        """
+        Shows the tiles crossing the visible area at the current zoom, and drops the others
+
+        :param grid_size: The current grid size
+        """
+        if not self.pyramid.is_built():
+            return
+
+        view = (self._canvas.canvasx(0), self._canvas.canvasy(0),
+                self._canvas.canvasx(self._canvas.winfo_width()), self._canvas.canvasy(self._canvas.winfo_height()))
+        state = grid_size, view
+        if state == self._last_state:
+            return
+        self._last_state = state
+
+        scale = grid_size / self.cell_pixels
+        level = self.pyramid.get_level(scale)
+        # Screen pixels per pixel of the level, between 0.5 and 1 unless zoomed in past the full image
+        factor = scale * 2 ** level
+        span = self.pyramid.tile_size * factor
+        width, height = self.pyramid.sizes[level]
+        columns, rows = self.pyramid.get_tile_count(level)
+        left, top = self.position[0] * grid_size, self.position[1] * grid_size
+
+        x0, y0 = max(0, math.floor((view[0] - left) / span)), max(0, math.floor((view[1] - top) / span))
+        x1 = min(columns - 1, math.floor((view[2] - left) / span))
+        y1 = min(rows - 1, math.floor((view[3] - top) / span))
+
+        wanted = set()
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                # Both edges are rounded the same way so neighboring tiles meet without gaps
+                box = (round(left + x * span), round(top + y * span),
+                       round(left + min(width, (x + 1) * self.pyramid.tile_size) * factor),
+                       round(top + min(height, (y + 1) * self.pyramid.tile_size) * factor))
+                if box[2] <= box[0] or box[3] <= box[1]:
+                    continue
+                key = level, x, y
+                wanted.add(key)
+                self._show_tile(key, box)
+
+        for key in [key for key in self._items if key not in wanted]:
+            iid = self._items.pop(key)
+            self._canvas.delete(iid)
+            del self._shown[iid]
+        self._canvas.tag_lower(self.tag)
+
+    def _show_tile(self, key, box):
+        """
+        Puts a tile on the canvas, or moves it
+
+        :param key: (level, x, y)
+        :param box: The canvas box the tile covers (x0, y0, x1, y1)
+        """
+        size = box[2] - box[0], box[3] - box[1]
+        photo_key = key + size
+        photo = self._photos.get(photo_key)
+        if photo is None:
+            tile = self.pyramid.get_tile(*key)
+            if tile.size != size:
+                tile = tile.resize(size, Image.BILINEAR)
+            photo = self._photos[photo_key] = ImageTk.PhotoImage(tile)
+            while len(self._photos) > self.max_photos:
+                self._photos.popitem(last=False)
+        else:
+            self._photos.move_to_end(photo_key)
+
+        iid = self._items.get(key)
+        if iid is None:
+            # Disabled so that clicks go to the tiles of the map
+            iid = self._items[key] = self._canvas.create_image(box[0], box[1], image=photo, anchor=tk.NW,
+                                                               state=tk.DISABLED, tags=(self.tag,))
+        elif self._shown[iid] is not photo:
+            self._canvas.itemconfigure(iid, image=photo)
+        self._canvas.coords(iid, box[0], box[1])
+        self._shown[iid] = photo
+
+    def clear(self):
+        """
+        Removes the tiles from the canvas
+        """
+        self._canvas.delete(self.tag)
+        self._items.clear()
+        self._shown.clear()
+        self._photos.clear()
+        self._last_state = None
@@ -0,0 +1,28 @@
+def run_script(canvas, filename):
+    """
+    Runs a python script against the map open in a canvas, for generators, validators and migrations. The script
+    gets these globals:
+
+        canvas       the canvas
+        tile_map     the tile map
+        transaction  starts a batch of edits, see InfiniteCanvas2.transaction
+
+    Edits made in a transaction are drawn once and undone as one when the transaction ends. Edits made to the map
+    directly aren't drawn until the layers are.
+
+    :param canvas: The canvas
+    :param filename: The path of the script
+    :return: The globals of the script once it ran
+    """
+    with open(filename, encoding="utf-8") as file:
+        source = file.read()
+
+    namespace = {
+        "__name__": "__main__",
+        "__file__": filename,
+        "canvas": canvas,
+        "tile_map": canvas.get_tile_map(),
+        "transaction": canvas.transaction,
+    }
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace
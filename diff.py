@@ -0,0 +1,83 @@
+import argparse
+import sys
+import time
+
+
+def _format_tile(tile) -> str:
+    """
+    Formats a tile of a diff
+
+    :param tile: (asset key, span, transform) or None
+    :return: The text
+    """
+    if tile is None:
+        return "empty"
+    key, span, transform = tile
+    text = str(key)[:12]
+    if tuple(span) != (1, 1):
+        text = "{} ({}x{})".format(text, *span)
+    return text if not transform else "{} t{}".format(text, transform)
+
+
+def main():
+    """
+    Compares saved maps, or merges them.
+
+    python diff.py BEFORE AFTER                       Prints the cells that differ
+    python diff.py OURS THEIRS --base BASE -o OUT     Merges the changes made in THEIRS since BASE into OURS,
+                                                      writes the result to OUT and prints the conflicts
+    """
+    parser = argparse.ArgumentParser(description="Compares or merges saved maps")
+    parser.add_argument("before", help="the first map, or ours when merging")
+    parser.add_argument("after", help="the second map, or theirs when merging")
+    parser.add_argument("--base", help="the common ancestor, to merge the two maps")
+    parser.add_argument("-o", "--output", help="where to write the merged map")
+    parser.add_argument("--limit", type=int, default=50, help="the number of cells to print")
+    args = parser.parse_args()
+
+    from tilemap import map_file
+    from tilemap.map_diff import diff_maps, merge_maps
+
+    if args.base is not None and args.output is None:
+        parser.error("merging needs an output directory (-o)")
+    if args.output is not None and map_file.exists(args.output):
+        parser.error("{} already holds a map".format(args.output))
+
+    maps = [map_file.load_map(directory) for directory in (args.before, args.after)]
+    if args.base is None:
+        start = time.perf_counter()
+        diff = diff_maps(*maps)
+        elapsed = time.perf_counter() - start
+        for (lid, cell), (before, after) in list(diff.changes.items())[:args.limit]:
+            print("layer {} {}: {} -> {}".format(lid, cell, _format_tile(before), _format_tile(after)))
+        for lid in diff.removed_layers:
+            print("layer {} removed".format(lid))
+        for lid in diff.added_layers:
+            print("layer {} added".format(lid))
+        print("{} cells differ, {} chunks compared, {} skipped, {:.1f} ms".format(
+            len(diff.changes), diff.chunks_compared, diff.chunks_skipped, elapsed * 1000))
+        return 1 if len(diff) else 0
+
+    from tilemap.autosave import Autosaver
+    ours, theirs = maps
+    start = time.perf_counter()
+    result = merge_maps(map_file.load_map(args.base), ours, theirs)
+    elapsed = time.perf_counter() - start
+    for lid, cell, base, mine, their in result.conflicts[:args.limit]:
+        print("conflict layer {} {}: base {}, ours {}, theirs {}".format(
+            lid, cell, _format_tile(base), _format_tile(mine), _format_tile(their)))
+    for lid in result.layer_conflicts:
+        print("conflict layer {}: changed on both sides, kept ours".format(lid))
+
+    autosaver = Autosaver(ours, args.output)
+    autosaver.close()
+    if autosaver.last_error is not None:
+        print("Could not write {}: {}".format(args.output, autosaver.last_error), file=sys.stderr)
+        return 2
+    print("{} cells merged, {} conflicts, {:.1f} ms".format(
+        result.applied, len(result.conflicts) + len(result.layer_conflicts), elapsed * 1000))
+    return 1 if result.conflicts or result.layer_conflicts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
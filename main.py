@@ -1,16 +1,69 @@
+import time
+_START = time.perf_counter()
+
+import os
+import shutil
+import sys
 import tkinter as tk
 from mode import Mode
-from canvas import infinite_canvas as ic
-from canvas import infinite_canvas2 as ic2
-from menu import tile_menu as tm
-from menu.main_menu import MainMenu
+from startup_timer import StartupTimer
 
 
 def main():
     """
     Main function. Creates the window and the canvas.
+
+    Run with --startup-report [file] to print how long startup took and quit after the first interactive frame.
+    If a file is given, the report is also appended to it.
+
+    Run with --map <directory> to open a map. The map is autosaved to that directory, which defaults to
+    $TILEMAP_EDITOR_AUTOSAVE or ~/.local/share/tilemap_editor/autosave.
+
+    Run with --record <file> to record the input events of the canvas to a session file, and the map as it was
+    at the start to <file>.map. Replay it with python replay.py <file>.
     """
+    report = "--startup-report" in sys.argv
+    map_directory = os.environ.get("TILEMAP_EDITOR_AUTOSAVE", os.path.join(os.path.expanduser("~"), ".local",
+                                                                           "share", "tilemap_editor", "autosave"))
+    if "--map" in sys.argv and sys.argv.index("--map") + 1 < len(sys.argv):
+        map_directory = sys.argv[sys.argv.index("--map") + 1]
+    session = None
+    if "--record" in sys.argv and sys.argv.index("--record") + 1 < len(sys.argv):
+        session = sys.argv[sys.argv.index("--record") + 1]
+    timer = StartupTimer(_START)
+    timer.mark("imports")
+
     window = tk.Tk()
+    timer.mark("window creation")
+
+    # Imported here so that the window shows up as early as possible.
+    # The legacy canvas (canvas.infinite_canvas.InfiniteCanvas) is never imported.
+    from canvas.infinite_canvas2 import InfiniteCanvas2
+    from menu.tile_menu import TileMenu
+    from menu.main_menu import MainMenu
+    from menu.layer_menu import LayerMenu
+    from menu.minimap import Minimap
+    from tilemap import map_file
+    from tilemap.tile_map import TileMap
+    from tilemap.autosave import Autosaver
+    from tilemap.journal import Journal, recover
+    from sprite.sprite_watcher import SpriteWatcher
+    timer.mark("deferred imports")
+
+    loaded = map_file.exists(map_directory)
+    tile_map = map_file.load_map(map_directory) if loaded else TileMap()
+
+    # Saving happens on worker threads: snapshots of the changed chunks, plus a journal of every edit in between
+    autosaver = Autosaver(tile_map, map_directory)
+    recovered = 0
+    if loaded:
+        autosaver.mark_saved()
+        # Edits left in the journal mean the last session didn't shut down cleanly
+        recovered = recover(map_directory, tile_map)
+    journal = Journal(tile_map, map_directory, generation=autosaver.generation)
+    journal.request_snapshot = autosaver.request_save
+    autosaver.journal = journal
+    timer.mark("map loading")
 
     #####################################################################
     # PACKAGE THIS SECTION INTO A NEW FUNCTION OR CLASS                 #
@@ -18,18 +71,67 @@ def main():
     left_frame = tk.Frame(master=window)
 
     mode = Mode()
-    # canvas = ic.InfiniteCanvas(master=window, mode=mode)
-    canvas = ic2.InfiniteCanvas2(master=window, mode=mode)
-    tile_menu = tm.TileMenu(master=left_frame, mode=mode)
-    menu = MainMenu(master=left_frame, mode=mode, tile_menu=tile_menu)
+    canvas = InfiniteCanvas2(master=window, mode=mode, tile_map=tile_map)
+    tile_menu = TileMenu(master=left_frame, mode=mode)
+    tile_menu.add_tile_map(tile_map)
+    menu = MainMenu(master=left_frame, mode=mode, tile_menu=tile_menu, canvas=canvas)
+    layer_menu = LayerMenu(master=left_frame, canvas=canvas)
+    minimap = Minimap(master=left_frame, canvas=canvas)
 
     left_frame.pack(side=tk.LEFT, fill=tk.Y)
     menu.pack()
+    layer_menu.pack()
+    minimap.pack()
     tile_menu.pack(fill=tk.Y)
     canvas.pack(side=tk.RIGHT)
     #####################################################################
 
+    # Sprites whose source file is saved again are reloaded in place
+    watcher = SpriteWatcher(tile_map)
+    watcher.listeners.append(canvas.reload_assets)
+    watcher.listeners.append(lambda aids: tile_menu.refresh_sprites([tile_map.get_asset(aid) for aid in aids]))
+
     window.geometry("500x500")
+    timer.mark("widgets")
+
+    if not report:
+        autosaver.start(window)
+        journal.start(window)
+        watcher.start(window)
+        if recovered:
+            # Folds the recovered edits into the map files
+            autosaver.request_save()
+
+    def close():
+        canvas.stop_recording()
+        watcher.stop()
+        autosaver.close()
+        journal.close()
+        window.destroy()
+
+    def first_paint():
+        # Idle callbacks run in order, so this runs after the redraws queued while creating the widgets
+        timer.mark("first paint")
+        window.after(1, first_interactive)
+
+    def first_interactive():
+        timer.mark("first interactive")
+        if report:
+            timer.print_report()
+            index = sys.argv.index("--startup-report") + 1
+            if index < len(sys.argv):
+                timer.save_report(sys.argv[index])
+            window.destroy()
+        elif session is not None:
+            # The replay needs the map as it was when recording started
+            start_map = session + ".map"
+            if map_file.exists(start_map):
+                shutil.rmtree(start_map)
+            Autosaver(tile_map, start_map).close()
+            canvas.start_recording(session)
+
+    window.protocol("WM_DELETE_WINDOW", close)
+    window.after_idle(first_paint)
     window.mainloop()
 
 
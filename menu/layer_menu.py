@@ -0,0 +1,124 @@
+import tkinter as tk
+
+
+class LayerMenu(tk.Frame):
+    def __init__(self, master=None, canvas=None):
+        """
+        Layer menu. Lists the layers of the map, top layer first, and lets the user pick the layer to edit,
+        reorder layers and toggle their visible, locked and static flags.
+
+        :param master: The master container
+        :param canvas: The canvas showing the map
+        """
+        super().__init__(master=master)
+        self.canvas = canvas
+
+        # Widgets
+        self.listbox = None
+        self.visible = tk.BooleanVar(master=self)
+        self.locked = tk.BooleanVar(master=self)
+        self.static = tk.BooleanVar(master=self)
+
+        self._create_widgets()
+        self._refresh()
+
+    def _create_widgets(self):
+        """
+        Create the layer list, the buttons and the flag checkboxes
+        """
+        self.listbox = tk.Listbox(master=self, height=5, exportselection=False)
+        self.listbox.grid(row=0, column=0, columnspan=2, sticky="WE")
+        self.listbox.bind("<<ListboxSelect>>", self._select_layer)
+
+        button_add = tk.Button(master=self, text="Add Layer", command=self._add_layer)
+        button_add.grid(row=1, column=0, sticky="WE")
+
+        button_remove = tk.Button(master=self, text="Remove", command=self._remove_layer)
+        button_remove.grid(row=1, column=1, sticky="WE")
+
+        button_up = tk.Button(master=self, text="Up", command=lambda: self._move_layer(1))
+        button_up.grid(row=2, column=0, sticky="WE")
+
+        button_down = tk.Button(master=self, text="Down", command=lambda: self._move_layer(-1))
+        button_down.grid(row=2, column=1, sticky="WE")
+
+        check_visible = tk.Checkbutton(master=self, text="Visible", variable=self.visible,
+                                       command=lambda: self.canvas.set_layer_visible(self._get_layer(),
+                                                                                     self.visible.get()))
+        check_visible.grid(row=3, column=0, columnspan=2, sticky="W")
+
+        check_locked = tk.Checkbutton(master=self, text="Locked", variable=self.locked,
+                                      command=lambda: self.canvas.set_layer_locked(self._get_layer(),
+                                                                                   self.locked.get()))
+        check_locked.grid(row=4, column=0, columnspan=2, sticky="W")
+
+        check_static = tk.Checkbutton(master=self, text="Static", variable=self.static,
+                                      command=lambda: self.canvas.set_layer_static(self._get_layer(),
+                                                                                   self.static.get()))
+        check_static.grid(row=5, column=0, columnspan=2, sticky="W")
+
+    def _refresh(self):
+        """
+        Redraws the layer list and the flags of the active layer
+        """
+        tile_map = self.canvas.get_tile_map()
+        active = tile_map.get_active_layer()
+
+        self.listbox.delete(0, tk.END)
+        for i, layer in enumerate(reversed(tile_map.layers)):
+            self.listbox.insert(tk.END, layer.name)
+            if layer is active:
+                self.listbox.selection_set(i)
+
+        if active is not None:
+            self.visible.set(active.visible)
+            self.locked.set(active.locked)
+            self.static.set(active.static)
+
+    def _get_layer(self):
+        """
+        Get the active layer
+
+        :return: The active layer
+        """
+        return self.canvas.get_tile_map().get_active_layer()
+
+    def _select_layer(self, event):
+        """
+        Makes the selected layer in the list the active layer
+
+        :param event: The tkinter event
+        """
+        selection = self.listbox.curselection()
+        if selection:
+            layers = self.canvas.get_tile_map().layers
+            self.canvas.set_active_layer(layers[len(layers) - 1 - selection[0]])
+            self._refresh()
+
+    def _add_layer(self):
+        """
+        Adds a layer on top and makes it active
+        """
+        layer = self.canvas.add_layer("Layer {}".format(len(self.canvas.get_tile_map().layers) + 1))
+        self.canvas.set_active_layer(layer)
+        self._refresh()
+
+    def _remove_layer(self):
+        """
+        Removes the active layer, a map always keeps at least one layer
+        """
+        tile_map = self.canvas.get_tile_map()
+        if len(tile_map.layers) > 1:
+            self.canvas.remove_layer(tile_map.get_active_layer())
+            self._refresh()
+
+    def _move_layer(self, direction):
+        """
+        Moves the active layer up or down
+
+        :param direction: 1 to move up, -1 to move down
+        """
+        tile_map = self.canvas.get_tile_map()
+        layer = tile_map.get_active_layer()
+        self.canvas.move_layer(layer, tile_map.layers.index(layer) + direction)
+        self._refresh()
@@ -1,22 +1,23 @@
+import os
 import tkinter as tk
 from tkinter import filedialog
-from PIL import Image
-from sprite.sprite import Sprite
 from mode import Modes
 
 
 class MainMenu(tk.Frame):
-    def __init__(self, master=None, mode=None, tile_menu=None):
+    def __init__(self, master=None, mode=None, tile_menu=None, canvas=None):
         """
         Menu. Creates the menu with buttons for importing sprites and setting modes.
 
         :param master: The master container
         :param mode: The mode object
         :param tile_menu: The tile menu object
+        :param canvas: The canvas showing the map
         """
         super().__init__(master=master)
         self.mode = mode
         self.tile_menu = tile_menu
+        self.canvas = canvas
 
         self._create_widgets()
 
@@ -33,21 +34,199 @@ class MainMenu(tk.Frame):
         button_edit = tk.Button(master=self, text="Edit Sprite", command=self._edit_sprite)
         button_edit.grid(row=2, column=0, sticky="WE")
 
+        button_import_terrain = tk.Button(master=self, text="Import Terrain", command=self._import_terrain)
+        button_import_terrain.grid(row=3, column=0, sticky="WE")
+
+        button_terrain = tk.Button(master=self, text="Terrain Brush", command=self._terrain_brush)
+        button_terrain.grid(row=4, column=0, sticky="WE")
+
+        button_import_animation = tk.Button(master=self, text="Import Animation", command=self._import_animation)
+        button_import_animation.grid(row=5, column=0, sticky="WE")
+
+        button_memory = tk.Button(master=self, text="Memory Report", command=self._show_memory_report)
+        button_memory.grid(row=6, column=0, sticky="WE")
+
+        button_reference = tk.Button(master=self, text="Reference Image", command=self._set_reference_image)
+        button_reference.grid(row=7, column=0, sticky="WE")
+
+        button_create_stamp = tk.Button(master=self, text="Create Stamp", command=self._create_stamp)
+        button_create_stamp.grid(row=8, column=0, sticky="WE")
+
+        button_stamp = tk.Button(master=self, text="Stamp Brush", command=self._stamp_brush)
+        button_stamp.grid(row=9, column=0, sticky="WE")
+
+        button_find = tk.Button(master=self, text="Find Sprite", command=self._find_sprite)
+        button_find.grid(row=10, column=0, sticky="WE")
+
+        button_replace = tk.Button(master=self, text="Replace Sprite", command=self._replace_sprite)
+        button_replace.grid(row=11, column=0, sticky="WE")
+
+        button_remove_unused = tk.Button(master=self, text="Remove Unused", command=self._remove_unused)
+        button_remove_unused.grid(row=12, column=0, sticky="WE")
+
+        button_script = tk.Button(master=self, text="Run Script", command=self._run_script)
+        button_script.grid(row=13, column=0, sticky="WE")
+
     def _import_sprite(self):
         """
         Import a sprite and render it on the tile menu
         """
+        # Imported here since it pulls in PIL, which is slow to import and not needed until the first import
+        from sprite.sprite import Sprite
+        from sprite.sprite_store import default_store
+
+        filename = filedialog.askopenfilename()
+        if filename != "":
+            # Load image, store into sprite class, add to tile menu. Images already imported aren't added again.
+            sprite = Sprite.from_file(filename)
+            if default_store().add(sprite) is sprite:
+                self.tile_menu.add_sprite(sprite)
+
+    def _import_animation(self):
+        """
+        Import an animated sprite (GIF, APNG, WebP or a horizontal strip of square frames) and render its first frame
+        on the tile menu
+        """
+        # Imported here since it pulls in PIL, see _import_sprite
+        from sprite.animated_sprite import AnimatedSprite
+        from sprite.sprite_store import default_store
+
+        filename = filedialog.askopenfilename()
+        if filename != "":
+            sprite = AnimatedSprite.from_file(filename)
+            if default_store().add(sprite) is sprite:
+                self.tile_menu.add_sprite(sprite)
+
+    def _import_terrain(self):
+        """
+        Import a terrain from a 4x4 sheet of edge variants and render it on the tile menu
+        """
+        # Imported here since they pull in PIL, see _import_sprite
+        from PIL import Image
+        from tilemap.autotile import TerrainSet
+        from sprite.sprite_store import default_store
+
         filename = filedialog.askopenfilename()
         if filename != "":
-            # Load image, store into sprite class, add to tile menu
-            image = Image.open(filename)
-            sprite = Sprite(image)
-            self.tile_menu.add_sprite(sprite)
+            terrain_set = TerrainSet.from_sheet(os.path.basename(filename), Image.open(filename),
+                                                store=default_store())
+            self.tile_menu.add_sprite(terrain_set.get_preview(), related_item=terrain_set, mode=Modes.TERRAIN)
+
+    def _show_memory_report(self):
+        """
+        Merges duplicate assets of the map and shows how much memory the sprite store saved
+        """
+        from tkinter import messagebox
+        from sprite.sprite_store import default_store
+
+        if self.canvas is not None:
+            self.canvas.deduplicate_assets()
+        messagebox.showinfo("Memory Report", default_store().format_report())
+
+    def _set_reference_image(self):
+        """
+        Shows a large image under the map to trace over
+        """
+        from tkinter import simpledialog
+
+        filename = filedialog.askopenfilename()
+        if filename != "" and self.canvas is not None:
+            cell_pixels = simpledialog.askinteger("Reference Image", "Image pixels per square:", initialvalue=32,
+                                                  minvalue=1)
+            if cell_pixels is not None:
+                self.canvas.set_reference_image(filename, cell_pixels)
+
+    def _create_stamp(self):
+        """
+        Creates a stamp from the tiles selected in edit mode and renders it on the tile menu
+        """
+        from tkinter import messagebox, simpledialog
+
+        if self.canvas is None:
+            return
+        tile_map = self.canvas.get_tile_map()
+        name = simpledialog.askstring("Create Stamp", "Name:", initialvalue="Stamp {}".format(len(tile_map.stamps) + 1))
+        if name is None:
+            return
+        stamp = self.canvas.create_stamp(name)
+        if stamp is None:
+            messagebox.showinfo("Create Stamp", "Select the tiles of the stamp in edit mode first.")
+            return
+        self.tile_menu.add_sprite(stamp.get_preview(tile_map), related_item=stamp, mode=Modes.STAMP)
+
+    def _get_picked_asset(self):
+        """
+        Get the asset id of the sprite picked in the tile menu in add mode
+
+        :return: The asset id, None if no sprite is picked
+        """
+        if self.mode != Modes.ADD or not self.mode.has_related_item():
+            return None
+        return self.canvas.get_tile_map().register_asset(self.mode.get_related_item())
+
+    def _find_sprite(self):
+        """
+        Selects every tile of the sprite picked in the tile menu
+        """
+        from tkinter import messagebox
+
+        asset = self._get_picked_asset() if self.canvas is not None else None
+        if asset is None:
+            messagebox.showinfo("Find Sprite", "Pick a sprite in the tile menu in add mode first.")
+            return
+        found = self.canvas.find_asset(asset)
+        messagebox.showinfo("Find Sprite", "{} tiles use this sprite.".format(len(found)))
+
+    def _replace_sprite(self):
+        """
+        Replaces every tile of the sprites of the selected tiles with the sprite picked in the tile menu. Finding
+        a sprite first selects its tiles.
+        """
+        from tkinter import messagebox
+
+        asset = self._get_picked_asset() if self.canvas is not None else None
+        old = self.canvas.get_selected_assets() if self.canvas is not None else set()
+        if asset is None or not old:
+            messagebox.showinfo("Replace Sprite", "Select tiles of the sprite to replace (see Find Sprite), then pick "
+                                                  "the new sprite in the tile menu in add mode.")
+            return
+        count = sum(self.canvas.replace_asset(current, asset) for current in old)
+        messagebox.showinfo("Replace Sprite", "{} tiles replaced.".format(count))
+
+    def _remove_unused(self):
+        """
+        Removes the sprites that no tile or stamp uses from the map
+        """
+        from tkinter import messagebox
+
+        if self.canvas is not None:
+            count = self.canvas.remove_unused_assets()
+            messagebox.showinfo("Remove Unused", "{} unused sprites removed from the map.".format(count))
+
+    def _run_script(self):
+        """
+        Runs a python script against the map, see canvas.scripting
+        """
+        from tkinter import messagebox
+        from canvas.scripting import run_script
+
+        if self.canvas is None:
+            return
+        filename = filedialog.askopenfilename(filetypes=[("Python", "*.py"), ("All files", "*")])
+        if filename == "":
+            return
+        try:
+            run_script(self.canvas, filename)
+        except Exception as error:
+            messagebox.showerror("Run Script", "{}: {}".format(type(error).__name__, error))
 
     def _add_sprite(self):
         """
         Set the mode to add sprite
         """
+        # The related item might be a terrain from the terrain brush
+        if self.mode != Modes.ADD:
+            self.mode.reset_related_item()
         self.mode.set_mode(Modes.ADD)
 
     def _edit_sprite(self):
@@ -55,3 +234,21 @@ class MainMenu(tk.Frame):
         Set the mode to edit sprite
         """
         self.mode.set_mode(Modes.EDIT)
+
+    def _terrain_brush(self):
+        """
+        Set the mode to terrain brush
+        """
+        # The related item might be a sprite from add mode
+        if self.mode != Modes.TERRAIN:
+            self.mode.reset_related_item()
+        self.mode.set_mode(Modes.TERRAIN)
+
+    def _stamp_brush(self):
+        """
+        Set the mode to stamp brush
+        """
+        # The related item might be a sprite or a terrain from the other modes
+        if self.mode != Modes.STAMP:
+            self.mode.reset_related_item()
+        self.mode.set_mode(Modes.STAMP)
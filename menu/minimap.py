@@ -0,0 +1,307 @@
+import tkinter as tk
+from tilemap.chunk import CHUNK_SIZE, EMPTY
+from tilemap.layer import chunk_of
+
+CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+
+class Minimap(tk.Frame):
+    def __init__(self, master=None, canvas=None, width: int = 160, height: int = 160, max_scale: int = 4,
+                 max_pixels: int = 2048, background=(190, 190, 190)):
+        """
+        Overview of the whole map, one or a few pixels per grid square, with a rectangle around the visible area.
+        Clicking or dragging on it moves the canvas there.
+
+        The overview is put together from one color summary per chunk: every square gets the average color of the
+        sprites on it, blended from the bottom layer up. Edits only recompute and repaint the squares they touch,
+        so the overview stays live on maps of millions of squares. Tiles bigger than a square only color the
+        square they are anchored at.
+
+        :param master: The master container
+        :param canvas: The canvas showing the map
+        :param width: The width of the panel in pixels
+        :param height: The height of the panel in pixels
+        :param max_scale: The most pixels per grid square, used for small maps
+        :param max_pixels: The biggest side of the overview in pixels, bigger maps get one pixel per square
+        :param background: The color of empty squares (r, g, b)
+        """
+        super().__init__(master=master)
+        self.canvas = canvas
+        self.max_scale = max_scale
+        self.max_pixels = max_pixels
+        self.background = tuple(background)
+        self._size = width, height
+
+        self._tile_map = canvas.get_tile_map()
+        self._colors = {}           # Asset id -> (r, g, b, a), the average color of the sprite
+        self._summaries = {}        # Chunk position -> RGB bytearray of the squares of the chunk, layers blended
+        self._summary_keys = {}     # Chunk position -> state of the layers the summary was made from
+        self._origin = (0, 0)       # Chunk position of the top left corner of the overview
+        self._extent = (0, 0)       # Size of the overview in chunks
+        self._scale = 1             # Pixels per grid square
+        self._photo = None
+
+        self._dirty_cells = set()
+        self._rebuild_needed = False
+        self._update_scheduled = False
+
+        self.view = None
+        self._image_item = None
+        self._viewport_item = None
+        self._create_widgets()
+
+        self._tile_map.listeners.append(self._handle_change)
+        canvas.add_view_listener(self._update_viewport)
+        self._rebuild()
+
+    def _create_widgets(self):
+        """
+        Create the overview canvas
+        """
+        self.view = tk.Canvas(master=self, width=self._size[0], height=self._size[1],
+                              bg="#{:02x}{:02x}{:02x}".format(*self.background), highlightthickness=0)
+        self.view.pack()
+        self._viewport_item = self.view.create_rectangle(0, 0, 0, 0, outline="red")
+        self.view.bind("<Button-1>", self._jump)
+        self.view.bind("<B1-Motion>", self._jump)
+
+    # ---------------------------------------------- COLORS ---------------------------------------------- #
+    def _get_color(self, asset: int):
+        """
+        Get the average color of an asset
+
+        :param asset: The asset id
+        :return: (r, g, b, a)
+        """
+        color = self._colors.get(asset)
+        if color is None:
+            # Imported here so that PIL isn't imported at startup
+            from PIL import Image
+            from sprite.sprite import expand_image
+            image = expand_image(self._tile_map.get_asset(asset)._original).convert("RGBA")
+            color = self._colors[asset] = image.resize((1, 1), Image.BOX).getpixel((0, 0))
+        return color
+
+    @staticmethod
+    def _blend(below, color):
+        """
+        Blends a color over another
+
+        :param below: (r, g, b)
+        :param color: (r, g, b, a)
+        :return: (r, g, b)
+        """
+        alpha = color[3]
+        if alpha == 255:
+            return color[:3]
+        return tuple((c * alpha + b * (255 - alpha)) // 255 for c, b in zip(color, below))
+
+    def _get_cell_color(self, cell):
+        """
+        Get the color of a square, every visible layer blended from the bottom up
+
+        :param cell: The grid square (x, y)
+        :return: (r, g, b)
+        """
+        color = self.background
+        for layer in self._tile_map.layers:
+            if layer.visible:
+                tile = layer.get_tile(cell)
+                if tile is not None:
+                    color = self._blend(color, self._get_color(tile[0]))
+        return color
+
+    def _get_summary_key(self, position):
+        """
+        Get the state of the layers at a chunk, which tells when its summary is out of date
+
+        :param position: The chunk position
+        :return: A tuple that changes whenever the squares of the chunk could look different
+        """
+        return tuple((layer.lid, id(chunk), chunk.version) for layer, chunk in
+                     ((layer, layer.chunks.get(position)) for layer in self._tile_map.layers if layer.visible)
+                     if chunk is not None)
+
+    def _summarize(self, position):
+        """
+        Computes the colors of the squares of a chunk
+
+        :param position: The chunk position
+        :return: The RGB bytes of the squares, row by row
+        """
+        colors = [self.background] * CELLS
+        for layer in self._tile_map.layers:
+            chunk = layer.chunks.get(position) if layer.visible else None
+            if chunk is None:
+                continue
+            for index, asset in enumerate(chunk.cells):
+                if asset != EMPTY:
+                    colors[index] = self._blend(colors[index], self._get_color(asset))
+        return bytearray(value for color in colors for value in color)
+
+    # --------------------------------------------- DRAWING ---------------------------------------------- #
+    def _rebuild(self):
+        """
+        Draws the whole overview. Summaries of chunks that didn't change are reused.
+        """
+        self._rebuild_needed = False
+        self._dirty_cells.clear()
+
+        positions = set()
+        for layer in self._tile_map.layers:
+            if layer.visible:
+                positions.update(layer.chunks)
+        if not positions:
+            self._summaries.clear()
+            self._summary_keys.clear()
+            self._extent = (0, 0)
+            if self._image_item is not None:
+                self.view.delete(self._image_item)
+                self._image_item = self._photo = None
+            return
+
+        for position in [position for position in self._summaries if position not in positions]:
+            del self._summaries[position]
+            del self._summary_keys[position]
+        for position in positions:
+            key = self._get_summary_key(position)
+            if self._summary_keys.get(position) != key:
+                self._summaries[position] = self._summarize(position)
+                self._summary_keys[position] = key
+
+        # One chunk of room on each side, so that drawing next to the map doesn't rebuild the overview right away
+        x0, y0 = min(x for x, _ in positions) - 1, min(y for _, y in positions) - 1
+        x1, y1 = max(x for x, _ in positions) + 1, max(y for _, y in positions) + 1
+        self._origin = x0, y0
+        self._extent = x1 - x0 + 1, y1 - y0 + 1
+        side = max(self._extent) * CHUNK_SIZE
+        self._scale = max(1, min(self.max_scale, self.max_pixels // side))
+
+        from PIL import Image, ImageTk
+        image = Image.new("RGB", (self._extent[0] * CHUNK_SIZE, self._extent[1] * CHUNK_SIZE), self.background)
+        for (x, y), summary in self._summaries.items():
+            image.paste(Image.frombytes("RGB", (CHUNK_SIZE, CHUNK_SIZE), bytes(summary)),
+                        ((x - x0) * CHUNK_SIZE, (y - y0) * CHUNK_SIZE))
+        if self._scale > 1:
+            image = image.resize((image.width * self._scale, image.height * self._scale), Image.NEAREST)
+
+        self._photo = ImageTk.PhotoImage(image)
+        if self._image_item is None:
+            self._image_item = self.view.create_image(0, 0, image=self._photo, anchor=tk.NW)
+            self.view.tag_lower(self._image_item)
+        else:
+            self.view.itemconfigure(self._image_item, image=self._photo)
+        self.view.configure(scrollregion=(0, 0, image.width, image.height))
+        self._update_viewport()
+
+    def _paint_cells(self):
+        """
+        Recomputes and repaints the squares that were edited since the last update
+        """
+        put = self._photo is not None
+        left, top = self._origin[0] * CHUNK_SIZE, self._origin[1] * CHUNK_SIZE
+        for cell in self._dirty_cells:
+            position, local = chunk_of(cell)
+            summary = self._summaries.get(position)
+            if summary is None:
+                # A new chunk inside the overview
+                summary = self._summaries[position] = bytearray(self.background) * CELLS
+            color = self._get_cell_color(cell)
+            index = (local[1] * CHUNK_SIZE + local[0]) * 3
+            summary[index:index + 3] = bytes(color)
+            self._summary_keys[position] = self._get_summary_key(position)
+
+            if put:
+                x, y = (cell[0] - left) * self._scale, (cell[1] - top) * self._scale
+                self.view.tk.call(str(self._photo), "put", "#{:02x}{:02x}{:02x}".format(*color),
+                                  "-to", x, y, x + self._scale, y + self._scale)
+        self._dirty_cells.clear()
+
+    def _update_viewport(self):
+        """
+        Moves the rectangle around the visible area of the canvas, and scrolls the overview to keep it in sight
+        """
+        x0, y0, x1, y1 = self.canvas.get_view()
+        left, top = self._origin[0] * CHUNK_SIZE, self._origin[1] * CHUNK_SIZE
+        box = [(x0 - left) * self._scale, (y0 - top) * self._scale,
+               (x1 - left) * self._scale, (y1 - top) * self._scale]
+        self.view.coords(self._viewport_item, *box)
+        self.view.tag_raise(self._viewport_item)
+
+        width, height = self._extent[0] * CHUNK_SIZE * self._scale, self._extent[1] * CHUNK_SIZE * self._scale
+        if width and height:
+            center_x, center_y = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            self.view.xview_moveto(max(0.0, (center_x - self._size[0] / 2) / width))
+            self.view.yview_moveto(max(0.0, (center_y - self._size[1] / 2) / height))
+
+    # --------------------------------------------- UPDATES ---------------------------------------------- #
+    def _handle_change(self, op, *args):
+        """
+        Map listener, collects the squares to repaint
+
+        :param op: The kind of change
+        :param args: The details of the change
+        """
+        if op in ("tile", "remove"):
+            # Painting terrain isn't listened to, the tiles the autotiler places for it are
+            self._mark_cell(args[1])
+        elif op == "tiles":
+            for cell, _, _, _ in args[1]:
+                if not self._mark_cell(cell):
+                    break
+        elif op == "asset" and args[0] in self._colors:
+            # The pixels of an asset that is already drawn changed, the chunks using it aren't known
+            del self._colors[args[0]]
+            self._summary_keys.clear()
+            self._rebuild_needed = True
+        elif op in ("layer", "remap"):
+            self._rebuild_needed = True
+            if op == "remap":
+                self._colors.clear()
+        else:
+            return
+        self._schedule_update()
+
+    def _mark_cell(self, cell) -> bool:
+        """
+        Marks a square to be repainted, or the whole overview to be rebuilt if the square is outside of it
+
+        :param cell: The grid square (x, y)
+        :return: True if the square is inside the overview, False otherwise
+        """
+        position = chunk_of(cell)[0]
+        if not (0 <= position[0] - self._origin[0] < self._extent[0] and
+                0 <= position[1] - self._origin[1] < self._extent[1]):
+            self._rebuild_needed = True
+            return False
+        self._dirty_cells.add(cell)
+        return True
+
+    def _schedule_update(self):
+        """
+        Updates the overview once the event loop is idle, so that edits made together are painted together
+        """
+        if not self._update_scheduled:
+            self._update_scheduled = True
+            self.after_idle(self._update)
+
+    def _update(self):
+        """
+        Repaints the edited squares, or rebuilds the overview after changes that affect all of it
+        """
+        self._update_scheduled = False
+        # Repainting square by square only pays off for small edits
+        if self._rebuild_needed or len(self._dirty_cells) > CELLS * 4:
+            self._rebuild()
+        elif self._dirty_cells:
+            self._paint_cells()
+
+    def _jump(self, event):
+        """
+        Centers the canvas on the square clicked on the overview
+
+        :param event: The tkinter event
+        """
+        x = self.view.canvasx(event.x) / self._scale + self._origin[0] * CHUNK_SIZE
+        y = self.view.canvasy(event.y) / self._scale + self._origin[1] * CHUNK_SIZE
+        self.canvas.center_on((x, y))
@@ -22,6 +22,9 @@ class TileMenu(tk.Frame):
 
         # Images
         self.images = []
+        # Sprites that haven't been rendered yet, slot -> (placeholder id, sprite)
+        self._pending = {}
+        self._render_scheduled = False
 
         self._create_canvas()
 
@@ -40,26 +43,45 @@ class TileMenu(tk.Frame):
         self.yscrollbar.config(command=self.canvas.yview)
         self.yscrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        self.canvas.config(yscrollcommand=self.yscrollbar.set)
+        self.canvas.config(yscrollcommand=self._handle_yscroll)
+        self.canvas.bind("<Configure>", lambda _: self._schedule_render(), add="+")
         self.canvas.pack()
 
-    def add_sprite(self, sprite):
+    def _handle_yscroll(self, first, last):
         """
-        Adds a sprite to the tile_menu
+        Updates the scrollbar and renders the sprites that scrolled into view
+
+        :param first: The top of the visible area, as a fraction
+        :param last: The bottom of the visible area, as a fraction
+        """
+        self.yscrollbar.set(first, last)
+        self._schedule_render()
+
+    def add_sprite(self, sprite, related_item=None, mode=Modes.ADD):
+        """
+        Adds a sprite to the tile_menu. Only a placeholder is drawn here, the sprite is decoded and rendered once
+        it is visible.
 
         :param sprite: The sprite to add
+        :param related_item: The item selected when the sprite is clicked, the sprite itself if None
+        :param mode: The mode the item can be selected in
         """
-        # Resize the image
-        sprite.resize((self.tile_size, self.tile_size))
-        photo_image_sprite = sprite.get_photo_image()
+        if related_item is None:
+            related_item = sprite
 
-        # Create the image
-        image_id = self.canvas.create_image((0, len(self.images) * (self.tile_size + 5)), image=photo_image_sprite)
-        self.canvas.images.append(photo_image_sprite)
-        self.images.append((image_id, sprite))
+        slot = len(self.images)
+        tag = "slot{}".format(slot)
+        y = slot * (self.tile_size + 5)
+        half_size = self.tile_size // 2
+
+        # Create the placeholder, at the same location the image will be
+        placeholder_id = self.canvas.create_rectangle(-half_size, y - half_size, half_size, y + half_size,
+                                                      outline="darkgrey", tags=(tag,))
+        self.images.append((placeholder_id, sprite))
+        self._pending[slot] = (placeholder_id, sprite)
 
         # Set tile click event
-        self.canvas.tag_bind(image_id, "<Button-1>", lambda _: self._set_related_item(sprite))
+        self.canvas.tag_bind(tag, "<Button-1>", lambda _: self._set_related_item(related_item, mode))
 
         # Set scroll region
         bbox = self.canvas.bbox(tk.ALL)
@@ -69,15 +91,85 @@ class TileMenu(tk.Frame):
         new_height = bbox[3] - bbox[1]
         self.canvas.configure(height=new_height)
 
-    def _set_related_item(self, sprite):
+        self._schedule_render()
+
+    def add_tile_map(self, tile_map):
+        """
+        Adds the sprites, terrains and stamps of a loaded map, each sprite once
+        :param tile_map: The tile map
+        """
+        seen = set()
+        for sprite in tile_map.assets:
+            if id(sprite) not in seen:
+                seen.add(id(sprite))
+                self.add_sprite(sprite)
+
+        for terrain_set in tile_map.terrains:
+            self.add_sprite(terrain_set.get_preview(), related_item=terrain_set, mode=Modes.TERRAIN)
+
+        for stamp in tile_map.stamps:
+            self.add_sprite(stamp.get_preview(tile_map), related_item=stamp, mode=Modes.STAMP)
+
+    def _schedule_render(self):
+        """
+        Renders the visible sprites once the event loop is idle. Multiple calls are merged into a single render.
+        """
+        if not self._render_scheduled and self._pending:
+            self._render_scheduled = True
+            self.after_idle(self._render_visible)
+
+    def _render_visible(self):
+        """
+        Decodes, resizes and draws the pending sprites that are in the visible part of the canvas
+        """
+        self._render_scheduled = False
+
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        half_size = self.tile_size // 2
+
+        for slot in list(self._pending):
+            y = slot * (self.tile_size + 5)
+            if y + half_size < top or y - half_size > bottom:
+                continue
+
+            placeholder_id, sprite = self._pending.pop(slot)
+
+            # Resize the image
+            sprite.resize((self.tile_size, self.tile_size))
+            photo_image_sprite = sprite.get_photo_image()
+
+            # Replace the placeholder with the image
+            image_id = self.canvas.create_image((0, y), image=photo_image_sprite, tags=("slot{}".format(slot),))
+            self.canvas.delete(placeholder_id)
+            self.canvas.images.append(photo_image_sprite)
+            self.images[slot] = (image_id, sprite)
+
+    def refresh_sprites(self, sprites):
+        """
+        Draws sprites whose pixels changed again. Sprites that weren't rendered yet are left to be rendered once
+        they are visible.
+
+        :param sprites: The sprites
+        """
+        changed = {id(sprite) for sprite in sprites}
+        for slot, (image_id, sprite) in enumerate(self.images):
+            if id(sprite) in changed and slot not in self._pending:
+                sprite.resize((self.tile_size, self.tile_size))
+                photo_image_sprite = sprite.get_photo_image()
+                self.canvas.itemconfigure(image_id, image=photo_image_sprite)
+                self.canvas.images.append(photo_image_sprite)
+
+    def _set_related_item(self, item, mode=Modes.ADD):
         """
-        Sets the sprite as a related item for the mode.
+        Sets the item as a related item for the mode.
 
-        :param sprite: The sprite to set
+        :param item: The item to set
+        :param mode: The mode the item belongs to
         """
-        # Only if the mode is add, then set the related_item
-        if self.mode == Modes.ADD:
-            self.mode.set_related_item(sprite)
+        # Only if the mode is the one of the item, then set the related_item
+        if self.mode == mode:
+            self.mode.set_related_item(item)
 
 
 
@@ -8,6 +8,8 @@ class Modes(Enum):
     ADD = auto()
     EDIT = auto()
     DELETE = auto()
+    TERRAIN = auto()
+    STAMP = auto()
 
 
 class ModeCursors(Enum):
@@ -17,6 +19,8 @@ class ModeCursors(Enum):
     ADD = "plus"
     EDIT = "hand2"
     DELETE = "X_cursor"
+    TERRAIN = "pencil"
+    STAMP = "plus"
 
 
 class Mode:
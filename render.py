@@ -0,0 +1,130 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# One renderer per worker process, so that the sprites scaled for a map are reused by the next maps of the worker
+_renderer = None
+# The most pixels a map is rendered into as one image, 1GB in RGBA. Bigger maps are written chunk by chunk.
+MAX_PIXELS = 2 ** 28
+
+
+def _init_worker(resample: str):
+    """
+    Creates the renderer of a worker process
+
+    :param resample: The name of the resampling filter
+    """
+    global _renderer
+    from tilemap.map_renderer import MapRenderer
+    _renderer = MapRenderer(resample)
+
+
+def render_map(directory: str, output: str, grid_size: int, tiles: bool, max_pixels: int = MAX_PIXELS):
+    """
+    Loads a saved map and renders it. Runs in a worker process.
+
+    A map too big to be one image is written one image per chunk, as with tiles. The size is checked before the
+    image is allocated, and running out of memory while rendering it also falls back to chunks.
+
+    :param directory: The map directory
+    :param output: The output directory
+    :param grid_size: The size of a cell in pixels
+    :param tiles: Whether to write one image per chunk instead of one image for the whole map
+    :param max_pixels: The most pixels rendered as one image
+    :return: (map name, number of tiles, number of images written, load time, render time, write time, whether
+    the map was written per chunk because it was too big)
+    """
+    from tilemap import map_file
+    if _renderer is None:
+        _init_worker("lanczos")
+
+    start = time.perf_counter()
+    tile_map = map_file.load_map(directory)
+    loaded = time.perf_counter()
+
+    name = os.path.basename(os.path.normpath(directory))
+    too_big = False
+    if not tiles:
+        bounds = _renderer.get_bounds(tile_map)
+        too_big = bounds is not None and \
+            (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) * grid_size * grid_size > max_pixels
+        if not too_big:
+            try:
+                image, count = _renderer.render_map(tile_map, grid_size, bounds)
+            except MemoryError:
+                too_big = True
+    if not tiles and not too_big:
+        rendered = time.perf_counter()
+        if image is not None:
+            image.save(os.path.join(output, name + ".png"))
+        written = time.perf_counter()
+        return name, count, int(image is not None), loaded - start, rendered - loaded, written - rendered, False
+
+    # Each chunk is written and dropped before the next one is rendered
+    os.makedirs(os.path.join(output, name), exist_ok=True)
+    count = images = 0
+    render_time = write_time = 0
+    last = time.perf_counter()
+    for position, image, drawn in _renderer.render_chunks(tile_map, grid_size):
+        rendered = time.perf_counter()
+        image.save(os.path.join(output, name, "{}_{}.png".format(*position)))
+        written = time.perf_counter()
+        render_time += rendered - last
+        write_time += written - rendered
+        last = written
+        count += drawn
+        images += 1
+    return name, count, images, loaded - start, render_time, write_time, too_big
+
+
+def main():
+    """
+    Renders saved maps to PNG images without opening a window. Maps are spread over a pool of processes.
+
+    python render.py MAP_DIR [MAP_DIR ...] -o OUT [--grid 32] [--tiles] [--workers N] [--resample lanczos]
+    """
+    parser = argparse.ArgumentParser(description="Renders saved maps to PNG images")
+    parser.add_argument("maps", nargs="+", help="the map directories")
+    parser.add_argument("-o", "--output", default=".", help="the output directory")
+    parser.add_argument("--grid", type=int, default=32, help="the size of a cell in pixels")
+    parser.add_argument("--tiles", action="store_true", help="write one image per chunk, as OUT/<map>/<x>_<y>.png")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of processes")
+    parser.add_argument("--resample", default="lanczos", help="the filter sprites are scaled with")
+    parser.add_argument("--max-pixels", type=int, default=MAX_PIXELS,
+                        help="the most pixels of a map rendered as one image, bigger maps are written per chunk")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    total_tiles = 0
+    failed = 0
+    workers = max(1, min(args.workers or 1, len(args.maps)))
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(args.resample,)) as executor:
+        futures = [executor.submit(render_map, directory, args.output, args.grid, args.tiles, args.max_pixels)
+                   for directory in args.maps]
+        for directory, future in zip(args.maps, futures):
+            try:
+                name, count, images, load, render, write, too_big = future.result()
+            except Exception as error:
+                # Whatever a bad map raises, from a corrupt chunk file to running out of memory, only fails that
+                # map. A worker killed by the system breaks the pool, and the maps left are reported failed too.
+                print("{}: failed ({})".format(directory, error or type(error).__name__), file=sys.stderr)
+                failed += 1
+                continue
+            total_tiles += count
+            if too_big:
+                print("{}: too big for one image, written per chunk".format(name), file=sys.stderr)
+            print("{}: {} tiles, {} images, load {:.1f} ms, render {:.1f} ms, write {:.1f} ms".format(
+                name, count, images, load * 1000, render * 1000, write * 1000))
+
+    elapsed = time.perf_counter() - start
+    rendered = len(args.maps) - failed
+    print("{} maps in {:.2f} s with {} workers: {:.1f} maps/s, {:.0f} tiles/s".format(
+        rendered, elapsed, workers, rendered / elapsed, total_tiles / elapsed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
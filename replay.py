@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+import time
+
+
+def main():
+    """
+    Replays an input session recorded with python main.py --record SESSION, and prints how long each canvas
+    handler took.
+
+    python replay.py SESSION                  Replays over the map saved next to the session (SESSION.map)
+    python replay.py SESSION --real-time      Spaces the events like they were recorded
+    python replay.py SESSION --repeat 5       Replays five times, each time over a fresh copy of the map
+    """
+    parser = argparse.ArgumentParser(description="Replays a recorded input session and times the canvas handlers")
+    parser.add_argument("session", help="the session file")
+    parser.add_argument("--map", help="the map to replay over, defaults to SESSION.map")
+    parser.add_argument("--real-time", action="store_true", help="space the events like they were recorded")
+    parser.add_argument("--repeat", type=int, default=1, help="the number of replays")
+    parser.add_argument("--json", help="append the timings of every replay to this file, one json line each")
+    args = parser.parse_args()
+
+    import tkinter as tk
+    from mode import Mode
+    from canvas.infinite_canvas2 import InfiniteCanvas2
+    from canvas.input_session import InputReplayer, read_session
+    from tilemap import map_file
+    from tilemap.tile_map import TileMap
+
+    directory = args.map if args.map is not None else args.session + ".map"
+    if args.map is not None and not map_file.exists(directory):
+        parser.error("{} doesn't hold a map".format(directory))
+    state = read_session(args.session)[0]
+
+    window = tk.Tk()
+    window.geometry("{}x{}".format(*state["size"]))
+    for run in range(args.repeat):
+        # Sessions edit the map, so every replay starts from the saved one. Nothing is written back.
+        tile_map = map_file.load_map(directory) if map_file.exists(directory) else TileMap()
+        mode = Mode()
+        canvas = InfiniteCanvas2(master=window, mode=mode, tile_map=tile_map)
+        canvas.pack(fill=tk.BOTH, expand=True)
+        window.update()
+
+        replayer = InputReplayer(canvas, mode, args.session)
+        report = replayer.replay(real_time=args.real_time)
+        print("Replay {} of {}".format(run + 1, args.repeat))
+        report.print_report()
+        if args.json is not None:
+            with open(args.json, "a") as file:
+                file.write(json.dumps({"time": time.time(), "session": args.session, "events": report.events,
+                                       "elapsed_ms": round(report.elapsed * 1000, 3),
+                                       "handlers": report.get_report()}) + "\n")
+        canvas.destroy()
+
+    window.destroy()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+from bisect import bisect_right
+from io import BytesIO
+from PIL import Image, ImageSequence
+from sprite.image_cache import ImageCache
+from sprite.sprite import Sprite
+
+DEFAULT_DURATION = 100
+
+
+class AnimatedSprite(Sprite):
+    def __init__(self, frames, durations):
+        """
+        A sprite made of frames shown one after the other. As a plain sprite it shows its first frame, which is
+        what the tile menu and the bitmaps of static layers use.
+
+        :param frames: The frames, a list of sprites
+        :param durations: How long each frame is shown, in ms. A single number applies to every frame.
+        """
+        if not frames:
+            raise ValueError("An animated sprite needs at least one frame")
+        if isinstance(durations, (int, float)):
+            durations = [durations] * len(frames)
+        if len(durations) != len(frames):
+            raise ValueError("Expected one duration per frame")
+
+        super().__init__(frames[0]._original, frames[0].content_hash)
+        self.frames = frames
+        self.durations = [max(1, int(duration)) for duration in durations]
+
+        # End time of every frame within a loop, to find the frame shown at a given time
+        self._ends = []
+        total = 0
+        for duration in self.durations:
+            total += duration
+            self._ends.append(total)
+
+    @classmethod
+    def from_file(cls, filename, content_hash: str = None):
+        """
+        Loads an animation from a file. Animated formats (GIF, APNG, WebP) use their own frames and durations,
+        any other image is read as a horizontal strip of square frames.
+
+        :param filename: The path of the image file
+        :param content_hash: Not used, the file is always read to find the frames
+        :return: The animated sprite
+        """
+        with open(filename, "rb") as file:
+            data = file.read()
+        file_hash = ImageCache.hash_bytes(data)
+        image = Image.open(BytesIO(data))
+
+        if getattr(image, "n_frames", 1) > 1:
+            images, durations = [], []
+            for frame in ImageSequence.Iterator(image):
+                images.append(frame.convert("RGBA"))
+                durations.append(frame.info.get("duration") or DEFAULT_DURATION)
+        else:
+            size = image.height
+            images = [image.crop((x, 0, x + size, size)) for x in range(0, image.width - size + 1, size)]
+            durations = DEFAULT_DURATION
+
+        # Every frame gets its own key in the image cache
+        frames = [Sprite(frame, "{}-{}".format(file_hash, i)) for i, frame in enumerate(images)]
+        return cls(frames, durations)
+
+    def is_animated(self):
+        """
+        Checks whether the sprite is animated
+
+        :return: True if it has more than one frame
+        """
+        return len(self.frames) > 1
+
+    def compact(self) -> bool:
+        """
+        Stores every frame as a palette image if it has at most 256 colors, see Sprite.compact
+
+        :return: True if every frame is stored compactly
+        """
+        compacted = all([frame.compact() for frame in self.frames])
+        if self._sprite is self._image:
+            self._sprite = self.frames[0]._original
+        self._image = self.frames[0]._original
+        return compacted
+
+    def get_frame_index(self, time: float) -> int:
+        """
+        Get the frame shown at a point in time. The animation loops.
+
+        :param time: The time in ms, from any fixed starting point shared by every animation
+        :return: The index of the frame
+        """
+        return min(bisect_right(self._ends, time % self._ends[-1]), len(self.frames) - 1)
+
+    def get_frame(self, index: int) -> Sprite:
+        """
+        Get a frame
+
+        :param index: The index of the frame
+        :return: The sprite of the frame
+        """
+        return self.frames[index]
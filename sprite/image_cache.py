@@ -0,0 +1,212 @@
+import os
+import hashlib
+from collections import OrderedDict
+from threading import RLock
+from PIL import Image
+
+
+class ImageCache:
+    def __init__(self, directory=None, max_bytes: int = 256 * 1024 * 1024, max_memory_items: int = 512):
+        """
+        A two level cache for scaled sprite images. Entries are keyed by the content hash of the source file,
+        the target size and the resampling filter. Recently used images are kept in memory, and every entry is
+        also written to disk so that the next session can skip decoding and resampling.
+
+        The disk cache is capped at max_bytes and evicts the least recently used files first. The modification
+        time of a file is used as its last use time, so no index file needs to be kept in sync.
+
+        :param directory: The cache directory. Defaults to $TILEMAP_EDITOR_CACHE or ~/.cache/tilemap_editor
+        :param max_bytes: The size cap of the disk cache in bytes
+        :param max_memory_items: The number of images kept in memory
+        """
+        if directory is None:
+            directory = os.environ.get("TILEMAP_EDITOR_CACHE",
+                                       os.path.join(os.path.expanduser("~"), ".cache", "tilemap_editor"))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_memory_items = max_memory_items
+
+        self._lock = RLock()
+        self._memory = OrderedDict()    # key -> Image
+        self._disk = OrderedDict()      # key -> file size, oldest first
+        self._disk_bytes = 0
+        self._disk_enabled = True
+
+        self._load_index()
+
+    # ---------------------------------------------- KEYS ------------------------------------------------ #
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """
+        Hashes the content of a file
+
+        :param data: The raw bytes of the file
+        :return: The hex digest used as the content hash
+        """
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, size, resample) -> str:
+        """
+        Creates the cache key of a scaled image
+
+        :param content_hash: The content hash of the source
+        :param size: The target size (width, height)
+        :param resample: The resampling filter
+        :return: The key, which is also the file name without the extension
+        """
+        return "{}_{}x{}_{}".format(content_hash, int(size[0]), int(size[1]), int(resample))
+
+    def _path(self, key):
+        """
+        The path of a cache entry
+
+        :param key: The cache key
+        :return: The file path
+        """
+        return os.path.join(self.directory, key + ".png")
+
+    # ---------------------------------------------- INDEX ----------------------------------------------- #
+    def _load_index(self):
+        """
+        Builds the LRU order of the disk cache from the files in the cache directory
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.is_file() and entry.name.endswith(".png")]
+        except OSError:
+            # Read only home directory or similar, keep working with the memory cache only
+            self._disk_enabled = False
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            size = entry.stat().st_size
+            self._disk[entry.name[:-len(".png")]] = size
+            self._disk_bytes += size
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used files until the disk cache fits under the size cap
+        """
+        while self._disk_bytes > self.max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # ---------------------------------------------- ACCESS ---------------------------------------------- #
+    def get(self, content_hash: str, size, resample):
+        """
+        Looks up a scaled image. The returned image is shared, so it must not be modified in place.
+
+        :param content_hash: The content hash of the source
+        :param size: The target size (width, height)
+        :param resample: The resampling filter
+        :return: The image, or None if it isn't cached
+        """
+        key = self.make_key(content_hash, size, resample)
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                return image
+
+            if key not in self._disk:
+                return None
+
+            path = self._path(key)
+            try:
+                image = Image.open(path)
+                image.load()
+                os.utime(path)
+            except OSError:
+                self._disk_bytes -= self._disk.pop(key)
+                return None
+
+            self._disk.move_to_end(key)
+            self._remember(key, image)
+            return image
+
+    def put(self, content_hash: str, size, resample, image, persist: bool = True):
+        """
+        Stores a scaled image in memory and on disk
+
+        :param content_hash: The content hash of the source
+        :param size: The target size (width, height)
+        :param resample: The resampling filter
+        :param image: The scaled image
+        :param persist: Whether to write the image to disk too, False for images that are cheap to make again
+        """
+        key = self.make_key(content_hash, size, resample)
+        with self._lock:
+            self._remember(key, image)
+
+            if not persist or not self._disk_enabled or key in self._disk:
+                return
+
+            # Write to a temporary file first so that a crash never leaves a half written entry behind
+            path = self._path(key)
+            temp_path = path + ".tmp"
+            try:
+                image.save(temp_path, format="PNG", compress_level=1)
+                os.replace(temp_path, path)
+                file_size = os.path.getsize(path)
+            except (OSError, ValueError):
+                return
+
+            self._disk[key] = file_size
+            self._disk_bytes += file_size
+            self._evict()
+
+    def _remember(self, key, image):
+        """
+        Adds an image to the memory cache
+
+        :param key: The cache key
+        :param image: The image
+        """
+        self._memory[key] = image
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def discard(self, content_hash: str):
+        """
+        Drops the images of a source from the memory cache, transformed ones included. Files on disk are left to
+        be evicted, since nothing asks for them once the source changed.
+
+        :param content_hash: The content hash of the source
+        """
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(content_hash)]:
+                del self._memory[key]
+
+    def clear_memory(self):
+        """
+        Empties the memory cache, the disk cache is left as is
+        """
+        with self._lock:
+            self._memory.clear()
+
+
+_default_cache = None
+_default_cache_lock = RLock()
+
+
+def default_cache() -> ImageCache:
+    """
+    Returns the cache shared by every sprite, creating it on first use
+
+    :return: The shared image cache
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+        return _default_cache
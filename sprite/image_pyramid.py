@@ -0,0 +1,241 @@
+import hashlib
+import json
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+from PIL import Image, UnidentifiedImageError
+
+TILE_SIZE = 256
+INFO = "pyramid.json"
+
+
+def _open_unbounded(filename: str):
+    """
+    Opens an image however many pixels it has. Image.open refuses images bigger than Image.MAX_IMAGE_PIXELS, a
+    limit against decompression bombs shared by every thread, but huge images are the point here. So the format is
+    found the way Image.open finds it and its plugin opens the file directly, which leaves the limit alone.
+
+    :param filename: The image file
+    :return: The image, not decoded yet
+    """
+    Image.init()
+    with open(filename, "rb") as file:
+        prefix = file.read(16)
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        # accept returns a message instead of True for files the plugin knows but can't open
+        if accept is not None and accept(prefix) is not True:
+            continue
+        try:
+            return factory(filename, filename)
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise UnidentifiedImageError("cannot identify image file {!r}".format(filename))
+
+
+class ImagePyramid:
+    def __init__(self, filename: str, directory: str = None, tile_size: int = TILE_SIZE, max_memory_tiles: int = 64):
+        """
+        A very large image split into square tiles at several resolutions. Level 0 is the full image, each level
+        after it is half the size of the one before, down to a level that fits in one tile. Only the tiles that are
+        drawn get decoded, so showing the image costs the same whatever its size.
+
+        The pyramid is built once per image and kept on disk, keyed by the path, size and modification time of
+        the file.
+
+        :param filename: The image file
+        :param directory: The cache directory. Defaults to $TILEMAP_EDITOR_CACHE/pyramids or
+        ~/.cache/tilemap_editor/pyramids
+        :param tile_size: The side of a tile in pixels, even
+        :param max_memory_tiles: The number of decoded tiles kept in memory
+        """
+        if tile_size % 2:
+            raise ValueError("The tile size must be even")
+        if directory is None:
+            directory = os.path.join(os.environ.get("TILEMAP_EDITOR_CACHE", os.path.join(
+                os.path.expanduser("~"), ".cache", "tilemap_editor")), "pyramids")
+        stat = os.stat(filename)
+        key = "{}|{}|{}|{}".format(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, tile_size)
+
+        self.filename = filename
+        self.tile_size = tile_size
+        self.directory = os.path.join(directory, hashlib.sha1(key.encode()).hexdigest())
+        self.max_memory_tiles = max_memory_tiles
+        self.sizes = []     # Level -> (width, height)
+        self.last_error = None
+
+        self._tiles = OrderedDict()     # (level, x, y) -> Image, least recently used first
+        self._lock = threading.Lock()
+        self._load_info()
+
+    def _load_info(self):
+        """
+        Reads the level sizes of a pyramid that was already built
+        """
+        try:
+            with open(os.path.join(self.directory, INFO), "r") as file:
+                self.sizes = [tuple(size) for size in json.load(file)["sizes"]]
+        except (OSError, ValueError, KeyError):
+            self.sizes = []
+
+    def is_built(self) -> bool:
+        """
+        Checks whether the tiles are on disk
+
+        :return: True if they are, False otherwise
+        """
+        return bool(self.sizes)
+
+    @property
+    def levels(self) -> int:
+        """
+        The number of levels
+        """
+        return len(self.sizes)
+
+    # --------------------------------------------- BUILDING --------------------------------------------- #
+    def build(self):
+        """
+        Splits the image into tiles at every level and writes them to disk. Slow for big images, run it with
+        build_in_background from the UI.
+
+        Level 0 is cut straight from the decoded image and every tile after it is made from the 2x2 tiles under it,
+        read back from disk, so building takes little more memory than the decoded image.
+        """
+        if self.is_built():
+            return
+
+        with _open_unbounded(self.filename) as source:
+            source.load()
+            sizes = [source.size]
+            self._write_level_0(source)
+
+        while sizes[-1][0] > self.tile_size or sizes[-1][1] > self.tile_size:
+            self._write_level(len(sizes), sizes[-1])
+            width, height = sizes[-1]
+            sizes.append((math.ceil(width / 2), math.ceil(height / 2)))
+
+        # The info file is written last, so a pyramid that was only partly written is built again
+        path = os.path.join(self.directory, INFO)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"source": os.path.abspath(self.filename), "sizes": sizes}, file)
+        os.replace(path + ".tmp", path)
+        self.sizes = [tuple(size) for size in sizes]
+
+    def _tile_path(self, level: int, x: int, y: int) -> str:
+        """
+        The path of a tile
+
+        :param level: The level
+        :param x: The column of the tile
+        :param y: The row of the tile
+        :return: The path
+        """
+        return os.path.join(self.directory, str(level), "{}_{}.png".format(x, y))
+
+    def _write_level_0(self, image):
+        """
+        Writes the tiles of the full image. Tiles are converted one at a time, so the image itself is never copied.
+
+        :param image: The decoded image
+        """
+        os.makedirs(os.path.join(self.directory, "0"), exist_ok=True)
+        for y in range(math.ceil(image.height / self.tile_size)):
+            for x in range(math.ceil(image.width / self.tile_size)):
+                box = (x * self.tile_size, y * self.tile_size,
+                       min(image.width, (x + 1) * self.tile_size), min(image.height, (y + 1) * self.tile_size))
+                tile = image.crop(box)
+                if tile.mode not in ("RGB", "RGBA"):
+                    tile = tile.convert("RGBA")
+                tile.save(self._tile_path(0, x, y), compress_level=1)
+
+    def _write_level(self, level: int, below):
+        """
+        Writes the tiles of a level after the first. Each tile averages the 2x2 blocks of the 2x2 tiles under it,
+        which gives the same pixels as halving the whole level before it since tiles have an even size.
+
+        :param level: The level
+        :param below: The size of the level before it (width, height)
+        """
+        os.makedirs(os.path.join(self.directory, str(level)), exist_ok=True)
+        below_columns, below_rows = math.ceil(below[0] / self.tile_size), math.ceil(below[1] / self.tile_size)
+        for y in range(math.ceil(below_rows / 2)):
+            for x in range(math.ceil(below_columns / 2)):
+                parts = []
+                for part_y in range(2 * y, min(2 * y + 2, below_rows)):
+                    for part_x in range(2 * x, min(2 * x + 2, below_columns)):
+                        with Image.open(self._tile_path(level - 1, part_x, part_y)) as file:
+                            parts.append((part_x - 2 * x, part_y - 2 * y, file.copy()))
+                width = sum(image.width for part_x, part_y, image in parts if part_y == 0)
+                height = sum(image.height for part_x, part_y, image in parts if part_x == 0)
+                block = Image.new(parts[0][2].mode, (width, height))
+                for part_x, part_y, image in parts:
+                    block.paste(image, (part_x * self.tile_size, part_y * self.tile_size))
+                block.reduce(2).save(self._tile_path(level, x, y), compress_level=1)
+
+    def build_in_background(self):
+        """
+        Builds the pyramid on a worker thread. Poll is_built to know when it is done.
+
+        :return: The thread
+        """
+        def run():
+            try:
+                self.build()
+            except (OSError, ValueError) as error:
+                self.last_error = error
+
+        thread = threading.Thread(target=run, name="pyramid", daemon=True)
+        thread.start()
+        return thread
+
+    # --------------------------------------------- READING ---------------------------------------------- #
+    def get_level(self, scale: float) -> int:
+        """
+        Get the level to draw the image from at a scale. That is the smallest level that still has at least one
+        pixel per screen pixel, so tiles are only ever scaled down, by less than half.
+
+        :param scale: Screen pixels per pixel of the full image
+        :return: The level
+        """
+        level = 0
+        while level + 1 < self.levels and scale * 2 ** (level + 1) <= 1:
+            level += 1
+        return level
+
+    def get_tile_count(self, level: int):
+        """
+        Get the number of tiles of a level
+
+        :param level: The level
+        :return: (columns, rows)
+        """
+        width, height = self.sizes[level]
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def get_tile(self, level: int, x: int, y: int):
+        """
+        Get a tile, decoding it if it isn't in memory
+
+        :param level: The level
+        :param x: The column of the tile
+        :param y: The row of the tile
+        :return: The image, edge tiles are smaller than the tile size
+        """
+        key = level, x, y
+        with self._lock:
+            image = self._tiles.get(key)
+            if image is not None:
+                self._tiles.move_to_end(key)
+                return image
+
+        with Image.open(self._tile_path(level, x, y)) as file:
+            image = file.copy()
+
+        with self._lock:
+            self._tiles[key] = image
+            while len(self._tiles) > self.max_memory_tiles:
+                self._tiles.popitem(last=False)
+        return image
@@ -1,41 +1,324 @@
-from PIL import Image, ImageTk
+from PIL import Image
 from copy import deepcopy
+from io import BytesIO
+import sys
+from sprite.image_cache import ImageCache, default_cache
+from tilemap.transform import FLIP_X, FLIP_Y, TRANSPOSE, compose, transform_size
+
+DEFAULT_RESAMPLE = Image.BICUBIC
+PREVIEW_RESAMPLE = Image.NEAREST
+
+# Resampling filters by name, so that callers can pick a filter without importing PIL
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "box": Image.BOX,
+    "bilinear": Image.BILINEAR,
+    "hamming": Image.HAMMING,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+
+
+def get_resample_filter(resample):
+    """
+    Get a PIL resampling filter
+
+    :param resample: A PIL resampling filter or the name of one, see RESAMPLE_FILTERS
+    :return: The PIL resampling filter
+    """
+    if isinstance(resample, str):
+        return RESAMPLE_FILTERS[resample.lower()]
+    return resample
+
+
+def transform_image(image, transform: int):
+    """
+    Flips and rotates an image, see tilemap.transform
+
+    :param image: The image
+    :param transform: The transform
+    :return: The transformed image, the image itself if the transform is 0
+    """
+    if transform & TRANSPOSE:
+        image = image.transpose(Image.TRANSPOSE)
+    if transform & FLIP_X:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    if transform & FLIP_Y:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    return image
+
+
+def _photo_image(image):
+    """
+    Creates a photo image. ImageTk is imported here since it pulls in tkinter, which isn't needed, and may not
+    even be installed, where sprites are used without a window (see render.py).
+
+    :param image: The image
+    :return: The photo image
+    """
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(image)
+
+
+def _open_image(filename):
+    """
+    Opens an image file without keeping the file handle open
+
+    :param filename: The path of the image file
+    :return: The image
+    """
+    with open(filename, "rb") as file:
+        return Image.open(BytesIO(file.read()))
+
+
+def compact_image(image):
+    """
+    Converts an image with at most 256 colors to a palette image with an RGBA palette. The conversion is lossless
+    and takes one byte per pixel instead of up to four.
+
+    :param image: The image
+    :return: The palette image, None if the image has too many colors
+    """
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+    colors = rgba.getcolors(256)
+    if colors is None:
+        return None
+
+    # Maps each pixel, read as one 32 bit integer, to the index of its color
+    index = {}
+    palette = bytearray()
+    for i, (_, color) in enumerate(colors):
+        index[int.from_bytes(bytes(color), sys.byteorder)] = i
+        palette += bytes(color)
+
+    pixels = memoryview(rgba.tobytes()).cast("I")
+    compact = Image.frombytes("P", rgba.size, bytes(map(index.__getitem__, pixels)))
+    compact.putpalette(palette, rawmode="RGBA")
+    return compact
+
+
+def expand_image(image):
+    """
+    Expands a palette image made by compact_image back to RGBA, other images are returned as is
+
+    :param image: The image
+    :return: The expanded image
+    """
+    return image.convert("RGBA") if image.mode == "P" else image
 
 
 class Sprite:
-    def __init__(self, image: Image):
+    def __init__(self, image: Image = None, content_hash: str = None, loader=None):
         """
         Sprite class, keeps an original and a copy. This allows the sprite to be resized without breaking
         the image. Of course the image will still break if scaled above its original size.
 
-        :param image: The image to be turned into a sprite
+        :param image: The image to be turned into a sprite. Can be None if a loader is given.
+        :param content_hash: The hash of the source file. Scaled images are only cached if this is set.
+        :param loader: A function returning the image, called the first time the original is needed.
         """
-        self._original = image
-        self.sprite = image
+        self._image = image
+        self._loader = loader
+        self._sprite = image
         self.ratio = (1, 1)
+        self.transform = 0      # Applied by resize, see tilemap.transform
+        self.content_hash = content_hash
+        self.pixel_hash = None  # Hash of the decoded pixels, set by the sprite store
+        self.source = None      # Path of the file the sprite was imported from, see SpriteWatcher
 
     def __deepcopy__(self, memodict={}):
-        copy_sprite = Sprite(deepcopy(self._original))
-        copy_sprite.sprite = self.sprite
+        if self._image is None:
+            copy_sprite = Sprite(None, self.content_hash, self._loader)
+        else:
+            copy_sprite = Sprite(deepcopy(self._image), self.content_hash)
+        copy_sprite._sprite = self._sprite
+        copy_sprite.pixel_hash = self.pixel_hash
         copy_sprite.set_ratio(self.ratio)
+        copy_sprite.transform = self.transform
+        copy_sprite.source = self.source
 
         return copy_sprite
 
-    def resize(self, size: tuple):
+    @classmethod
+    def from_file(cls, filename, content_hash: str = None):
+        """
+        Loads a sprite from a file. The content of the file is hashed so that scaled versions of the sprite
+        can be found in the image cache. The pixels themselves are only decoded once they are needed.
+
+        :param filename: The path of the image file
+        :param content_hash: The known hash of the file. If given, the file isn't even read until it is needed.
+        :return: The sprite
+        """
+        if content_hash is not None:
+            sprite = cls(None, content_hash, lambda: _open_image(filename))
+        else:
+            with open(filename, "rb") as file:
+                data = file.read()
+            sprite = cls(Image.open(BytesIO(data)), ImageCache.hash_bytes(data))
+        sprite.source = filename
+        return sprite
+
+    # ------------------------------------------- LAZY LOADING ------------------------------------------- #
+    @property
+    def _original(self):
+        """
+        The original image, loaded on first access
+        """
+        if self._image is None:
+            self._image = self._loader()
+            self._loader = None
+        return self._image
+
+    @property
+    def sprite(self):
+        """
+        The current (resized) image, which is the original until the sprite is resized
+        """
+        if self._sprite is None:
+            self._sprite = self._original
+        return self._sprite
+
+    @sprite.setter
+    def sprite(self, image):
+        self._sprite = image
+
+    def replace_image(self, image, content_hash: str = None):
+        """
+        Swaps in new pixels, for example after the source file changed. The sprite object stays the same, so the
+        map and the menus showing it see the change, and it keeps its current size. Cached scaled images of the
+        old pixels are dropped from memory.
+
+        :param image: The new original
+        :param content_hash: The hash of the new source file
+        """
+        size = self.get_size() if self._sprite is not None and self._sprite is not self._image else None
+        if self.content_hash is not None:
+            default_cache().discard(self.content_hash)
+        self._image, self._loader, self._sprite = image, None, image
+        self.content_hash = content_hash
+        self.pixel_hash = None
+        if size is not None:
+            self.resize(size)
+
+    def is_loaded(self):
+        """
+        Checks whether the original image has been loaded
+
+        :return: True if it has been loaded, False otherwise
         """
-        Resize the sprite.
+        return self._image is not None
 
-        :param size: The size, (width, height).
+    def is_animated(self):
+        """
+        Checks whether the sprite is animated, see AnimatedSprite
+
+        :return: False
+        """
+        return False
+
+    def compact(self) -> bool:
+        """
+        Stores the original as a palette image if it has at most 256 colors, which is usually the case for pixel
+        art. The original is only expanded back to RGBA, temporarily, when a scaled image is made.
+
+        :return: True if the original is stored compactly, False if it has too many colors
+        """
+        original = self._original
+        if original.mode == "P":
+            return True
+
+        compact = compact_image(original)
+        if compact is None:
+            return False
+        if self._sprite is original:
+            self._sprite = compact
+        self._image = compact
+        return True
+
+    def resize(self, size: tuple, resample=DEFAULT_RESAMPLE):
+        """
+        Resize the sprite. The sprite is flipped and rotated by its transform.
+
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter
         """
         size = list(size)
-        sprite_size = self.get_size()
+        # Only look at the current size when needed, since that might load the original
         if size[0] <= 0:
-            size[0] = sprite_size[0]
+            size[0] = self.get_size()[0]
         if size[1] <= 0:
-            size[1] = sprite_size[1]
+            size[1] = self.get_size()[1]
+
+        final_size = tuple(size)
+        self.sprite = self._get_resized(final_size, resample, self.transform)
+
+    def get_scaled(self, size, resample=DEFAULT_RESAMPLE, transform: int = 0):
+        """
+        Get the original scaled to a size without changing the sprite
+
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: The scaled image. It may be shared with other sprites, so it must not be modified in place.
+        """
+        return self._get_resized(tuple(size), resample, transform)
+
+    def _get_resized(self, size, resample, transform: int = 0):
+        """
+        Gets the original resized to the given size, from the image cache if possible. Transformed images are
+        made from the cached untransformed one and only kept in memory, since flipping and rotating by quarter
+        turns just moves pixels around.
+
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: The resized image. It may be shared with other sprites, so it must not be modified in place.
+        """
+        resample = get_resample_filter(resample)
+        if transform:
+            if self.content_hash is None:
+                return transform_image(self._get_resized(transform_size(size, transform), resample), transform)
 
-        final_size = size
-        self.sprite = self._original.resize(tuple(final_size))
+            cache = default_cache()
+            key = "{}-t{}".format(self.content_hash, transform)
+            image = cache.get(key, size, resample)
+            if image is None:
+                image = transform_image(self._get_resized(transform_size(size, transform), resample), transform)
+                cache.put(key, size, resample, image, persist=False)
+            return image
+
+        if self.content_hash is None:
+            return expand_image(self._original).resize(size, resample)
+
+        cache = default_cache()
+        image = cache.get(self.content_hash, size, resample)
+        if image is None:
+            image = expand_image(self._original).resize(size, resample)
+            cache.put(self.content_hash, size, resample, image)
+
+        return image
+
+    def get_preview(self, size, resample=DEFAULT_RESAMPLE, preview_resample=PREVIEW_RESAMPLE, transform: int = 0):
+        """
+        Get a quick preview of the original scaled to a size. The preview isn't cached, since it is only shown until
+        the final image is ready. If the final image is already cached it is returned instead.
+
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter of the final image
+        :param preview_resample: The resampling filter of the preview, NEAREST by default since it is the cheapest
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: (image, True if the image is the final image)
+        """
+        size = tuple(size)
+        if self.content_hash is not None:
+            key = "{}-t{}".format(self.content_hash, transform) if transform else self.content_hash
+            image = default_cache().get(key, size, get_resample_filter(resample))
+            if image is not None:
+                return image, True
+
+        image = expand_image(self._original).resize(transform_size(size, transform),
+                                                    get_resample_filter(preview_resample))
+        return transform_image(image, transform), False
 
     def snap_to_ratio(self):
         """
@@ -49,7 +332,30 @@ class Sprite:
         Get the photo image of the sprite
         :return: The photo image
         """
-        return ImageTk.PhotoImage(self.sprite)
+        return _photo_image(expand_image(self.sprite))
+
+    def get_scaled_photo_image(self, size, resample=DEFAULT_RESAMPLE, transform: int = 0):
+        """
+        Get the photo image of the original scaled to a size, without changing the sprite
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: The photo image
+        """
+        return _photo_image(self.get_scaled(size, resample, transform))
+
+    def get_preview_photo_image(self, size, resample=DEFAULT_RESAMPLE, preview_resample=PREVIEW_RESAMPLE,
+                                transform: int = 0):
+        """
+        Get the photo image of a quick preview of the original scaled to a size, see get_preview
+        :param size: The size, (width, height), once transformed
+        :param resample: The resampling filter of the final image
+        :param preview_resample: The resampling filter of the preview
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: (photo image, True if the image is the final image)
+        """
+        image, final = self.get_preview(size, resample, preview_resample, transform)
+        return _photo_image(image), final
 
     def get_size(self):
         """
@@ -60,10 +366,26 @@ class Sprite:
 
     def rotate(self, angle):
         """
-        Rotate the image
-        :param angle: The angle to rotate to
+        Rotate the sprite by quarter turns. The rotation goes into its transform, so it is kept when the sprite
+        is resized.
+        :param angle: The angle to rotate by, counterclockwise in degrees like PIL, a multiple of 90
+        """
+        if angle % 90:
+            raise ValueError("Sprites can only be rotated by quarter turns")
+        size = self.get_size()
+        for _ in range(angle // 90 % 4):
+            # A quarter turn counterclockwise: transposed, then flipped top to bottom
+            self.transform = compose(self.transform, TRANSPOSE | FLIP_Y)
+            size = size[1], size[0]
+        self.resize(size)
+
+    def flip(self, horizontal: bool = True):
+        """
+        Mirror the sprite. The flip goes into its transform, so it is kept when the sprite is resized.
+        :param horizontal: True to mirror left to right, False to mirror top to bottom
         """
-        self.sprite = self.sprite.rotate(angle)
+        self.transform = compose(self.transform, FLIP_X if horizontal else FLIP_Y)
+        self.resize(self.get_size())
 
     def set_ratio(self, ratio):
         """
@@ -91,7 +413,7 @@ class Sprite:
         Creates an image with reduced alpha and returns its photoimage
         :return: The photoimage with reduced alpha
         """
-        ghost = deepcopy(self.sprite)
+        ghost = self.sprite.convert("RGBA")
         ghost.putalpha(100)
-        return ImageTk.PhotoImage(ghost)
+        return _photo_image(ghost)
 
@@ -0,0 +1,214 @@
+import hashlib
+import os
+from threading import RLock
+
+
+def pixel_hash(image) -> str:
+    """
+    Hashes the decoded pixels of an image. Images with the same pixels get the same hash no matter which file or
+    format they came from.
+
+    :param image: The image
+    :return: The hex digest
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    digest = hashlib.sha1("{}x{}".format(*image.size).encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def image_bytes(image) -> int:
+    """
+    Get the size of the pixel buffer of an image
+
+    :param image: The image
+    :return: The size in bytes
+    """
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def sprite_bytes(sprite) -> int:
+    """
+    Get the size of the pixel buffers of a sprite, counting every frame of animated sprites
+
+    :param sprite: The sprite
+    :return: The size in bytes
+    """
+    if sprite.is_animated():
+        return sum(image_bytes(frame._original) for frame in sprite.frames)
+    return image_bytes(sprite._original)
+
+
+def sprite_is_compact(sprite) -> bool:
+    """
+    Checks whether a sprite stores its original as a palette image
+
+    :param sprite: The sprite
+    :return: True if compact, False otherwise
+    """
+    return sprite.is_loaded() and sprite._original.mode == "P"
+
+
+class SpriteStore:
+    def __init__(self, compact: bool = False):
+        """
+        Content addressed store of sprites. Sprites are keyed by the hash of their decoded pixels, so importing the
+        same image twice, or two identical tiles from different sheets, gives back the sprite that was stored first
+        and only one pixel buffer is kept.
+
+        :param compact: Whether sprites with at most 256 colors are stored as palette images, see Sprite.compact
+        """
+        self.compact = compact
+        self._lock = RLock()
+        self._sprites = {}          # Pixel hash -> Sprite
+        self._file_hashes = {}      # Content hash of the source file -> pixel hash, skips decoding known files
+        self.stored_bytes = 0
+        self.duplicates = 0         # Duplicate sprites dropped, on import or when merging map assets
+        self.saved_bytes = 0        # Pixel bytes of the dropped duplicates
+        self.remapped_tiles = 0     # Map tiles pointed from a duplicate asset to the stored one
+
+    def hash_sprite(self, sprite) -> str:
+        """
+        Get the pixel hash of a sprite, computing it the first time
+
+        :param sprite: The sprite
+        :return: The pixel hash
+        """
+        if sprite.pixel_hash is None and sprite.is_animated():
+            digest = hashlib.sha1(repr(sprite.durations).encode())
+            for frame in sprite.frames:
+                digest.update(self.hash_sprite(frame).encode())
+            sprite.pixel_hash = digest.hexdigest()
+        elif sprite.pixel_hash is None:
+            known = self._file_hashes.get(sprite.content_hash) if sprite.content_hash is not None else None
+            sprite.pixel_hash = known if known is not None else pixel_hash(sprite._original)
+        return sprite.pixel_hash
+
+    def add(self, sprite):
+        """
+        Stores a sprite, unless a sprite with the same pixels is already stored
+
+        :param sprite: The sprite
+        :return: The stored sprite, which is not the given sprite if it was a duplicate
+        """
+        with self._lock:
+            key = self.hash_sprite(sprite)
+            stored = self._sprites.get(key)
+            if stored is None:
+                self._sprites[key] = sprite
+                if self.compact:
+                    sprite.compact()
+                if sprite.content_hash is None:
+                    # Lets the image cache keep scaled versions of sprites that don't come from a file
+                    sprite.content_hash = key
+                elif not sprite.is_animated():
+                    self._file_hashes[sprite.content_hash] = key
+                self.stored_bytes += sprite_bytes(sprite)
+                return sprite
+
+            if stored is not sprite:
+                self.record_duplicate(sprite)
+            return stored
+
+    def reload(self, sprite, image, content_hash: str):
+        """
+        Swaps new pixels into a sprite, see Sprite.replace_image, and stores it under its new pixel hash
+
+        :param sprite: The sprite
+        :param image: The new original
+        :param content_hash: The hash of the new source file
+        """
+        with self._lock:
+            stored = sprite.pixel_hash is not None and self._sprites.get(sprite.pixel_hash) is sprite
+            if stored:
+                del self._sprites[sprite.pixel_hash]
+                self.stored_bytes -= sprite_bytes(sprite)
+            sprite.replace_image(image, content_hash)
+            if stored:
+                self.add(sprite)
+
+    def set_compact(self, compact: bool):
+        """
+        Turns compact storage on or off. Turning it on compacts the sprites already stored, turning it off only
+        affects sprites stored afterwards.
+
+        :param compact: Whether sprites are stored as palette images when possible
+        """
+        with self._lock:
+            self.compact = compact
+            if compact:
+                for sprite in self._sprites.values():
+                    sprite.compact()
+                self.stored_bytes = sum(sprite_bytes(sprite) for sprite in self._sprites.values())
+
+    def get(self, key: str):
+        """
+        Get a stored sprite by pixel hash
+
+        :param key: The pixel hash
+        :return: The sprite, None if there is no such sprite
+        """
+        return self._sprites.get(key)
+
+    def record_duplicate(self, sprite, tiles: int = 0):
+        """
+        Counts a duplicate that was dropped in favor of a stored sprite
+
+        :param sprite: The duplicate
+        :param tiles: The number of map tiles that were pointed to the stored sprite instead
+        """
+        with self._lock:
+            self.duplicates += 1
+            self.saved_bytes += sprite_bytes(sprite)
+            self.remapped_tiles += tiles
+
+    def __len__(self):
+        return len(self._sprites)
+
+    # ---------------------------------------------- REPORT ---------------------------------------------- #
+    def get_report(self) -> dict:
+        """
+        Get the memory report of the store
+
+        :return: A dict of counters
+        """
+        return {
+            "sprites": len(self._sprites),
+            "compact_sprites": sum(1 for sprite in self._sprites.values() if sprite_is_compact(sprite)),
+            "stored_bytes": self.stored_bytes,
+            "duplicates": self.duplicates,
+            "saved_bytes": self.saved_bytes,
+            "remapped_tiles": self.remapped_tiles,
+        }
+
+    def format_report(self) -> str:
+        """
+        Get the memory report in a readable format
+
+        :return: The report
+        """
+        report = self.get_report()
+        return ("Unique sprites: {sprites} ({compact_sprites} compact)\n"
+                "Pixel memory: {stored_kb:.1f} KB\n"
+                "Duplicates merged: {duplicates}\n"
+                "Memory saved: {saved_kb:.1f} KB\n"
+                "Map tiles remapped: {remapped_tiles}").format(stored_kb=report["stored_bytes"] / 1024,
+                                                              saved_kb=report["saved_bytes"] / 1024, **report)
+
+
+_default_store = None
+_default_store_lock = RLock()
+
+
+def default_store() -> SpriteStore:
+    """
+    Returns the store shared by the palette and the map, creating it on first use
+
+    :return: The shared sprite store
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SpriteStore(compact=os.environ.get("TILEMAP_EDITOR_COMPACT_SPRITES", "0") != "0")
+        return _default_store
@@ -0,0 +1,130 @@
+import os
+from io import BytesIO
+from sprite.sprite_store import default_store
+
+
+class SpriteWatcher:
+    def __init__(self, tile_map, interval: int = 1000, store=None):
+        """
+        Watches the source files of the assets of a map and reloads the ones that changed, so that an image saved
+        from a paint program shows up without restarting. Files are polled by modification time and size, which
+        costs one stat call per asset, and only read when one of them changed. A file that can't be decoded, like
+        one that is still being written, is tried again on the next poll.
+
+        Animated sprites aren't watched, their frames may come from more than one file.
+
+        :param tile_map: The tile map
+        :param interval: The time between polls, in ms
+        :param store: The sprite store the sprites are kept in, the shared store if None
+        """
+        self._tile_map = tile_map
+        self.interval = interval
+        self._store = store if store is not None else default_store()
+        self._stats = {}    # Source path -> (modification time in ns, size) when it was last looked at
+        self._job = None
+        self._widget = None
+        # Called with the list of reloaded asset ids after every poll that reloaded something
+        self.listeners = []
+
+    # -------------------------------------------- SCHEDULING -------------------------------------------- #
+    def start(self, widget):
+        """
+        Starts polling periodically
+
+        :param widget: The widget whose event loop runs the timer
+        """
+        self._widget = widget
+        if self._job is None:
+            self._job = widget.after(self.interval, self._tick)
+
+    def stop(self):
+        """
+        Stops polling
+        """
+        if self._job is not None:
+            self._widget.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        """
+        Periodic poll
+        """
+        self._job = None
+        self.poll()
+        self.start(self._widget)
+
+    # ---------------------------------------------- POLLING --------------------------------------------- #
+    @staticmethod
+    def _stat(path):
+        """
+        Get the modification time and size of a file
+
+        :param path: The path
+        :return: (modification time in ns, size), None if the file is gone
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """
+        Reloads the assets whose source file changed since the last poll. A file seen for the first time is only
+        remembered.
+
+        :return: The ids of the reloaded assets
+        """
+        seen = set()
+        changed_sprites = set()
+        for sprite in self._tile_map.assets:
+            if id(sprite) in seen or sprite.source is None or sprite.is_animated():
+                continue
+            seen.add(id(sprite))
+
+            stat = self._stat(sprite.source)
+            last = self._stats.get(sprite.source)
+            if stat is None or stat == last:
+                continue
+            if last is not None:
+                changed = self._reload(sprite)
+                if changed is None:
+                    continue
+                if changed:
+                    changed_sprites.add(id(sprite))
+            self._stats[sprite.source] = stat
+
+        # Merged duplicates share their sprite, so they are reloaded with it
+        reloaded = [aid for aid, sprite in enumerate(self._tile_map.assets) if id(sprite) in changed_sprites]
+        for aid in reloaded:
+            self._tile_map.asset_changed(aid)
+        if reloaded:
+            for listener in self.listeners:
+                listener(reloaded)
+        return reloaded
+
+    def _reload(self, sprite):
+        """
+        Reads the source file of a sprite again and swaps in its pixels
+
+        :param sprite: The sprite
+        :return: True if the pixels were swapped, False if the content of the file is the same, None if it couldn't
+        be decoded
+        """
+        # Imported here so that PIL isn't imported at startup
+        from PIL import Image
+        from sprite.image_cache import ImageCache
+        try:
+            with open(sprite.source, "rb") as file:
+                data = file.read()
+            content_hash = ImageCache.hash_bytes(data)
+            if content_hash == sprite.content_hash:
+                # Only touched, or saved with the same content
+                return False
+            image = Image.open(BytesIO(data))
+            image.load()
+        except OSError:
+            return None
+
+        self._store.reload(sprite, image, content_hash)
+        return True
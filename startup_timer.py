@@ -0,0 +1,53 @@
+import json
+import sys
+import time
+
+
+class StartupTimer:
+    def __init__(self, start: float = None):
+        """
+        Records how long each phase of the startup takes. Used to keep track of startup regressions.
+
+        :param start: The perf_counter value startup began at, defaults to now
+        """
+        self._start = time.perf_counter() if start is None else start
+        self._last = self._start
+        self.phases = []    # (name, phase duration, time since start), in seconds
+
+    def mark(self, name: str):
+        """
+        Marks the end of a startup phase
+
+        :param name: The name of the phase
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last, now - self._start))
+        self._last = now
+
+    def get_report(self) -> dict:
+        """
+        Get the recorded phases
+
+        :return: A dict of phase name to {"phase_ms", "total_ms"}
+        """
+        return {name: {"phase_ms": round(phase * 1000, 2), "total_ms": round(total * 1000, 2)}
+                for name, phase, total in self.phases}
+
+    def print_report(self, file=sys.stderr):
+        """
+        Prints the startup report in a readable format
+
+        :param file: The file to print to
+        """
+        print("Startup report", file=file)
+        for name, phase, total in self.phases:
+            print("  {:<20} {:>9.2f} ms  (at {:>9.2f} ms)".format(name, phase * 1000, total * 1000), file=file)
+
+    def save_report(self, filename: str):
+        """
+        Appends the report as a single json line, so that runs can be compared over time
+
+        :param filename: The file to append to
+        """
+        with open(filename, "a") as file:
+            file.write(json.dumps({"time": time.time(), "phases": self.get_report()}) + "\n")
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The modules import each other from the root of the repository, like when main.py is run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeSprite:
+    def __init__(self, pixel_hash=None):
+        """
+        Stands in for a sprite where only the identity and the pixel hash matter
+
+        :param pixel_hash: The hash of the pixels, None if it isn't known
+        """
+        self.pixel_hash = pixel_hash
@@ -0,0 +1,94 @@
+from conftest import FakeSprite
+from tilemap.asset_index import AssetIndex
+from tilemap.tile_map import TileMap
+
+
+def make_map(count=3):
+    tile_map = TileMap()
+    layer = tile_map.add_layer("Layer")
+    for key in range(count):
+        tile_map.register_asset(FakeSprite(key))
+    return tile_map, layer
+
+
+def test_indexes_existing_tiles_and_edits():
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    index = AssetIndex(tile_map)
+    layer.set_tile((20, 0), 0)
+    layer.set_tiles([((x, 40), 1, (1, 1), 0) for x in range(-3, 3)])
+    assert sorted(cell for _, cell in index.find(0)) == [(0, 0), (20, 0)]
+    assert index.count(1) == 6
+    assert index.get_used() == {0, 1}
+    assert index.find(2) == []
+
+
+def test_stale_chunks_are_pruned_on_lookup():
+    tile_map, layer = make_map()
+    index = AssetIndex(tile_map)
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((1, 0), 1)
+    layer.set_tile((20, 0), 0)
+    # Replaced and removed without the index hearing about the asset that left
+    layer.set_tile((0, 0), 1)
+    layer.remove_tile((20, 0))
+    assert index._chunks[0] == {(layer.lid, (0, 0)), (layer.lid, (1, 0))}
+
+    assert index.count(0) == 0
+    assert 0 not in index._chunks
+    assert index.get_used() == {1}
+
+
+def test_removed_layers_are_pruned():
+    tile_map, layer = make_map()
+    index = AssetIndex(tile_map)
+    other = tile_map.add_layer("Other")
+    other.set_tile((0, 0), 0)
+    layer.set_tile((0, 0), 0)
+    tile_map.remove_layer(other)
+    assert index.find(0) == [(layer, (0, 0))]
+
+
+def test_follows_remap_of_removed_assets():
+    tile_map, layer = make_map(4)
+    index = AssetIndex(tile_map)
+    layer.set_tile((0, 0), 1)
+    layer.set_tile((0, 0), 3)
+    layer.set_tile((30, 0), 2)
+    # 1 only has a stale chunk left, and 3 moves onto its id
+    assert tile_map.remove_assets([0, 1]) == {2: 0, 3: 1}
+    assert index.find(0) == [(layer, (30, 0))]
+    assert index.find(1) == [(layer, (0, 0))]
+    assert index.find(2) == index.find(3) == []
+
+
+class PixelStore:
+    """Stands in for the sprite store, hashing sprites by the pixels they were given"""
+    def hash_sprite(self, sprite):
+        return sprite.pixels
+
+    def record_duplicate(self, sprite, count):
+        pass
+
+
+def test_follows_remap_of_merged_duplicates():
+    tile_map = TileMap()
+    layer = tile_map.add_layer("Layer")
+    for pixels in ("a", "b", "a"):
+        sprite = FakeSprite()
+        sprite.pixels = pixels
+        tile_map.register_asset(sprite)
+    index = AssetIndex(tile_map)
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((30, 30), 2)
+    assert tile_map.deduplicate_assets(PixelStore()) == {2: 0}
+    assert sorted(cell for _, cell in index.find(0)) == [(0, 0), (30, 30)]
+    assert index.get_used() == {0}
+
+
+def test_close_stops_listening():
+    tile_map, layer = make_map()
+    index = AssetIndex(tile_map)
+    index.close()
+    layer.set_tile((0, 0), 0)
+    assert index.get_used() == set()
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from tilemap.autotile import Autotiler, TerrainSet, EDGES, N, E, S, W  # noqa: E402
+from tilemap.tile_map import TileMap  # noqa: E402
+from tilemap.transform import FLIP_X, ROTATE_90  # noqa: E402
+
+
+@pytest.fixture
+def painted():
+    from PIL import Image
+    sheet = Image.new("RGBA", (64, 64))
+    # Every variant a different color, so that each gets its own asset
+    for index in range(16):
+        sheet.paste((index * 16, 0, 0, 255), ((index % 4) * 16, (index // 4) * 16, (index % 4 + 1) * 16,
+                                              (index // 4 + 1) * 16))
+    tile_map = TileMap()
+    layer = tile_map.add_layer("Layer 1")
+    terrain = TerrainSet.from_sheet("grass", sheet)
+    autotiler = Autotiler(tile_map)
+    autotiler.paint(layer, [(x, y) for x in range(3) for y in range(3)], terrain)
+    return tile_map, layer, autotiler
+
+
+def test_paint_picks_variant_from_neighbors(painted):
+    tile_map, layer, autotiler = painted
+    center = layer.get_tile((1, 1))[0]
+    corner = layer.get_tile((0, 0))[0]
+    assert tile_map.get_asset(center) is tile_map.terrains[0].get_sprite(EDGES)
+    assert tile_map.get_asset(corner) is tile_map.terrains[0].get_sprite(E | S)
+    assert layer.get_tile((1, 0))[0] == tile_map.register_asset(tile_map.terrains[0].get_sprite(E | S | W))
+    assert layer.get_tile((1, 2))[0] == tile_map.register_asset(tile_map.terrains[0].get_sprite(N | E | W))
+
+
+@pytest.mark.parametrize("transform", [FLIP_X, ROTATE_90])
+def test_transformed_tile_is_put_back(painted, transform):
+    tile_map, layer, autotiler = painted
+    asset = layer.get_tile((1, 1))[0]
+    layer.set_tile((1, 1), asset, (1, 1), transform)
+
+    # Painting a neighbor again updates the transformed cell
+    assert (1, 1) in autotiler.paint(layer, [(0, 0)], tile_map.terrains[0])
+    assert layer.get_transform((1, 1)) == 0
+
+
+@pytest.mark.parametrize("span, transform", [((1, 1), FLIP_X), ((2, 1), 0)])
+def test_recompute_puts_back_transformed_and_resized_tiles(painted, span, transform):
+    tile_map, layer, autotiler = painted
+    asset = layer.get_tile((2, 2))[0]
+    layer.set_tile((2, 2), asset, span, transform)
+
+    assert autotiler.recompute_layer(layer) == {(2, 2)}
+    assert layer.get_tile((2, 2)) == (asset, (1, 1)) and layer.get_transform((2, 2)) == 0
+    assert autotiler.recompute_layer(layer) == set()
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image, ImageChops  # noqa: E402
+from sprite.image_pyramid import ImagePyramid  # noqa: E402
+
+
+def assemble(pyramid, level):
+    columns, rows = pyramid.get_tile_count(level)
+    image = Image.new("RGBA", pyramid.sizes[level])
+    for y in range(rows):
+        for x in range(columns):
+            image.paste(pyramid.get_tile(level, x, y), (x * pyramid.tile_size, y * pyramid.tile_size))
+    return image
+
+
+def test_levels_halve_the_image(tmp_path):
+    source = Image.effect_noise((301, 163), 60).convert("L")
+    source.putalpha(Image.effect_noise((301, 163), 90).convert("L"))
+    filename = str(tmp_path / "source.png")
+    source.save(filename)
+
+    pyramid = ImagePyramid(filename, str(tmp_path / "cache"), tile_size=64)
+    pyramid.build()
+    assert pyramid.sizes == [(301, 163), (151, 82), (76, 41), (38, 21)]
+
+    # Built from the tiles of the level before, the levels match halving the whole image
+    expected = source.convert("RGBA")
+    for level in range(pyramid.levels):
+        assert ImageChops.difference(assemble(pyramid, level), expected).getbbox() is None
+        expected = expected.reduce(2)
+
+
+def test_tile_size_must_be_even(tmp_path):
+    filename = str(tmp_path / "source.png")
+    Image.new("RGB", (8, 8)).save(filename)
+    with pytest.raises(ValueError):
+        ImagePyramid(filename, str(tmp_path / "cache"), tile_size=63)
@@ -0,0 +1,118 @@
+import os
+from conftest import FakeSprite
+from tilemap import journal
+from tilemap.journal import Journal, list_segments, read_records, recover, segment_path
+from tilemap.tile_map import TileMap
+from tilemap.transform import FLIP_X
+
+
+def make_map():
+    tile_map = TileMap()
+    layer = tile_map.add_layer("Layer")
+    tile_map.register_asset(FakeSprite("a"))
+    tile_map.register_asset(FakeSprite("b"))
+    return tile_map, layer
+
+
+def copy_map(tile_map):
+    """A map with the same layers and assets and no tiles, like the last snapshot of tile_map"""
+    other = TileMap()
+    for layer in tile_map.layers:
+        other.add_layer(layer.name, lid=layer.lid)
+    for sprite in tile_map.assets:
+        other.restore_asset(sprite)
+    return other
+
+
+def write_batch(log):
+    log.flush()
+    log.wait()
+
+
+def test_recover_replays_every_kind_of_edit(tmp_path):
+    tile_map, layer = make_map()
+    log = Journal(tile_map, str(tmp_path))
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((-5, 3), 1, (2, 3), FLIP_X)
+    layer.set_tiles([((x, 1), 1, (1, 1), 0) for x in range(20)])
+    layer.remove_tile((4, 1))
+    log.close()
+
+    other = copy_map(tile_map)
+    assert recover(str(tmp_path), other) == 24
+    restored = other.get_layer(layer.lid)
+    assert sorted(restored.tiles()) == sorted(layer.tiles())
+    assert restored.get_transform((-5, 3)) == FLIP_X
+
+
+def test_recover_ignores_truncated_tail(tmp_path):
+    tile_map, layer = make_map()
+    log = Journal(tile_map, str(tmp_path))
+    layer.set_tile((0, 0), 0)
+    write_batch(log)
+    layer.set_tile((1, 0), 1)
+    log.close()
+
+    path = segment_path(str(tmp_path), 0)
+    size = os.path.getsize(path)
+    # The second batch was only partly written when the program died
+    with open(path, "r+b") as file:
+        file.truncate(size - 3)
+
+    other = copy_map(tile_map)
+    assert recover(str(tmp_path), other) == 1
+    assert list(other.get_layer(layer.lid).tiles()) == [((0, 0), 0, (1, 1))]
+
+
+def test_read_records_stops_at_corrupt_batch(tmp_path):
+    tile_map, layer = make_map()
+    log = Journal(tile_map, str(tmp_path))
+    layer.set_tile((0, 0), 0)
+    write_batch(log)
+    layer.set_tile((1, 0), 0)
+    write_batch(log)
+    layer.set_tile((2, 0), 0)
+    log.close()
+
+    path = segment_path(str(tmp_path), 0)
+    with open(path, "r+b") as file:
+        data = bytearray(file.read())
+        # Flip a byte in the payload of the second batch, its crc doesn't match anymore
+        second = 2 * journal._FRAME.size + journal._RECORD.size
+        data[second + 2] ^= 0xFF
+        file.seek(0)
+        file.write(data)
+    assert [record[2] for record in read_records(path)] == [0]
+
+
+def test_recover_skips_unknown_layers_assets_and_terrains(tmp_path):
+    tile_map, layer = make_map()
+    log = Journal(tile_map, str(tmp_path))
+    layer.set_tile((0, 0), 1)
+    layer.set_terrain((1, 1), 1)
+    late = tile_map.add_layer("Late")
+    late.set_tile((0, 0), 0)
+    log.close()
+
+    other = TileMap()
+    other.add_layer("Layer", lid=layer.lid)
+    other.restore_asset(tile_map.assets[0])
+    # Asset 1, the terrain and the late layer never reached a snapshot
+    assert recover(str(tmp_path), other) == 0
+    assert other.get_layer(layer.lid).get_tile((0, 0)) is None
+    assert other.get_layer(layer.lid).get_terrain((1, 1)) == 0
+
+
+def test_rotate_switches_segment_and_discards_older(tmp_path):
+    tile_map, layer = make_map()
+    log = Journal(tile_map, str(tmp_path))
+    layer.set_tile((0, 0), 0)
+    log.rotate(1)
+    layer.set_tile((1, 0), 1)
+    write_batch(log)
+    assert list_segments(str(tmp_path)) == [0, 1]
+    assert [record[2] for record in read_records(segment_path(str(tmp_path), 1))] == [1]
+
+    log.discard_before(1)
+    log.close()
+    assert list_segments(str(tmp_path)) == [1]
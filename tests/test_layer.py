@@ -0,0 +1,24 @@
+from tilemap.layer import Layer
+
+
+def test_find_tile_returns_anchor_of_covering_tile():
+    layer = Layer(0, "Layer")
+    layer.set_tile((2, 3), 0)
+    layer.set_tile((14, 14), 1, (4, 3))
+    assert layer.find_tile((2, 3)) == (2, 3)
+    assert layer.find_tile((3, 3)) is None
+    # The big tile sticks out of its chunk into three others
+    for cell in ((14, 14), (17, 14), (14, 16), (17, 16)):
+        assert layer.find_tile(cell) == (14, 14)
+    assert layer.find_tile((18, 14)) is None
+    assert layer.find_tile((14, 17)) is None
+
+
+def test_find_tile_prefers_anchored_tile_and_negative_cells():
+    layer = Layer(0, "Layer")
+    layer.set_tiles([((-3, -3), 0, (3, 3), 0), ((-2, -2), 1, (1, 1), 0)])
+    assert layer.find_tile((-2, -2)) == (-2, -2)
+    assert layer.find_tile((-1, -1)) == (-3, -3)
+    assert layer.find_tile((0, 0)) is None
+    layer.remove_tile((-3, -3))
+    assert layer.find_tile((-1, -1)) is None
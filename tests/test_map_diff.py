@@ -0,0 +1,97 @@
+from conftest import FakeSprite
+from tilemap.map_diff import diff_maps, merge_maps
+from tilemap.tile_map import TileMap
+from tilemap.transform import FLIP_X
+
+SPRITES = [FakeSprite("a"), FakeSprite("b"), FakeSprite("c")]
+
+
+def make_map(tiles, sprites=SPRITES):
+    """A map with one layer holding tiles, given as cell -> asset id"""
+    tile_map = TileMap()
+    for sprite in sprites:
+        tile_map.register_asset(sprite)
+    layer = tile_map.add_layer("Layer")
+    for cell, asset in tiles.items():
+        layer.set_tile(cell, asset)
+    return tile_map
+
+
+def test_diff_lists_changed_cells_and_skips_equal_chunks():
+    tiles = {(x, y): (x + y) % 3 for x in range(64) for y in range(4)}
+    before = make_map(tiles)
+    after = make_map(tiles)
+    layer = after.layers[0]
+    layer.set_tile((1, 1), 2, (2, 2))
+    layer.remove_tile((40, 0))
+    layer.set_tile((100, 100), 0, (1, 1), FLIP_X)
+
+    diff = diff_maps(before, after)
+    assert diff.changes == {
+        (0, (1, 1)): (("c", (1, 1), 0), ("c", (2, 2), 0)),
+        (0, (40, 0)): (("b", (1, 1), 0), None),
+        (0, (100, 100)): (None, ("a", (1, 1), FLIP_X)),
+    }
+    # Chunks (1, 0) and (3, 0) hash the same in both maps
+    assert diff.chunks_skipped == 2 and diff.chunks_compared == 3
+
+
+def test_diff_matches_assets_by_pixels_across_ids():
+    before = make_map({(0, 0): 0, (1, 0): 1})
+    # The same pixels under other ids
+    after = make_map({(0, 0): 1, (1, 0): 0}, [FakeSprite("b"), FakeSprite("a")])
+    assert len(diff_maps(before, after)) == 0
+    after.layers[0].set_tile((1, 0), 1)
+    assert diff_maps(before, after).changes == {(0, (1, 0)): (("b", (1, 1), 0), ("a", (1, 1), 0))}
+
+
+def test_diff_reports_added_and_removed_layers():
+    before = make_map({})
+    after = make_map({})
+    after.remove_layer(after.layers[0])
+    added = after.add_layer("Other")
+    diff = diff_maps(before, after)
+    assert diff.removed_layers == [0] and diff.added_layers == [added.lid]
+
+
+def test_merge_applies_their_changes():
+    base = make_map({(0, 0): 0, (1, 0): 0})
+    ours = make_map({(0, 0): 1, (1, 0): 0})
+    theirs = make_map({(0, 0): 0, (5, 5): 2}, SPRITES + [FakeSprite("new")])
+    theirs.layers[0].set_tile((9, 9), 3)
+
+    result = merge_maps(base, ours, theirs)
+    assert result.conflicts == [] and result.applied == 3
+    layer = ours.layers[0]
+    assert sorted(layer.tiles()) == [((0, 0), 1, (1, 1)), ((5, 5), 2, (1, 1)), ((9, 9), 3, (1, 1))]
+    assert ours.assets[3].pixel_hash == "new"
+
+
+def test_merge_reports_conflicts_and_keeps_ours():
+    base = make_map({(0, 0): 0, (1, 0): 0, (2, 0): 0})
+    ours = make_map({(0, 0): 1, (1, 0): 2})
+    theirs = make_map({(0, 0): 2, (1, 0): 2, (2, 0): 0})
+
+    result = merge_maps(base, ours, theirs)
+    # (1, 0) changed the same way on both sides, (2, 0) only on ours
+    assert result.conflicts == [(0, (0, 0), ("a", (1, 1), 0), ("b", (1, 1), 0), ("c", (1, 1), 0))]
+    assert result.applied == 0
+    assert ours.layers[0].get_tile((0, 0)) == (1, (1, 1))
+    assert ours.layers[0].get_tile((2, 0)) is None
+
+
+def test_merge_layers():
+    base = make_map({(0, 0): 0})
+    base.add_layer("Removed by them")
+    base.add_layer("Removed by them, edited by us")
+    ours = make_map({(0, 0): 0})
+    ours.add_layer("Removed by them")
+    ours.add_layer("Removed by them, edited by us").set_tile((3, 3), 1)
+    theirs = make_map({(0, 0): 0})
+    added = theirs.add_layer("Added", lid=3)
+    added.set_tile((7, 7), 2)
+
+    result = merge_maps(base, ours, theirs)
+    assert [layer.name for layer in ours.layers] == ["Layer", "Removed by them, edited by us", "Added"]
+    assert result.layer_conflicts == [2]
+    assert ours.get_layer(added.lid).get_tile((7, 7)) == (2, (1, 1))
@@ -0,0 +1,215 @@
+import json
+import os
+import pytest
+from array import array
+from tilemap import map_file
+from tilemap.chunk import EMPTY
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+from sprite.sprite import Sprite  # noqa: E402
+from tilemap.autosave import Autosaver  # noqa: E402
+from tilemap.journal import Journal, list_segments, recover  # noqa: E402
+from tilemap.tile_map import TileMap  # noqa: E402
+from tilemap.transform import FLIP_Y, ROTATE_90  # noqa: E402
+
+
+def make_map():
+    tile_map = TileMap()
+    layer = tile_map.add_layer("Ground")
+    tile_map.add_layer("Top", visible=False, locked=True)
+    for color in ((255, 0, 0, 255), (0, 0, 255, 128)):
+        tile_map.register_asset(Sprite(Image.new("RGBA", (8, 8), color)))
+    return tile_map, layer
+
+
+def tiles_of(tile_map):
+    return {layer.lid: sorted((cell, asset, span, layer.get_transform(cell)) for cell, asset, span in layer.tiles())
+            for layer in tile_map.layers}
+
+
+def test_encode_decode_chunk_round_trip():
+    cells = array("i", [EMPTY]) * map_file.CELLS
+    cells[0], cells[17], cells[255] = 3, 0, 70000
+    terrain = bytearray(map_file.CELLS)
+    terrain[5] = 2
+    data = map_file.encode_chunk((-2, 7), cells, {17: (3, 2)}, terrain, {0: ROTATE_90, 255: FLIP_Y})
+
+    position, decoded, spans, decoded_terrain, transforms = map_file.decode_chunk(data)
+    assert position == (-2, 7)
+    assert decoded == cells
+    assert spans == {17: (3, 2)}
+    assert decoded_terrain == terrain
+    assert transforms == {0: ROTATE_90, 255: FLIP_Y}
+
+
+def test_decode_chunk_rejects_other_files():
+    with pytest.raises(ValueError):
+        map_file.decode_chunk(b"PNG!" + bytes(20))
+
+
+def test_autosave_round_trip(tmp_path):
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((-20, 15), 1, (2, 3), ROTATE_90)
+    layer.set_terrain((3, 3), 1)
+    tile_map.layers[1].set_tile((40, 40), 1)
+    saver = Autosaver(tile_map, str(tmp_path))
+    saver.close()
+    assert saver.last_error is None
+
+    loaded = map_file.load_map(str(tmp_path))
+    assert [(l.lid, l.name, l.visible, l.locked) for l in loaded.layers] == \
+        [(l.lid, l.name, l.visible, l.locked) for l in tile_map.layers]
+    assert tiles_of(loaded) == tiles_of(tile_map)
+    assert loaded.get_layer(layer.lid).get_terrain((3, 3)) == 1
+    assert [sprite.pixel_hash for sprite in loaded.assets] == [sprite.pixel_hash for sprite in tile_map.assets]
+
+
+def test_autosave_only_writes_changed_chunks(tmp_path):
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((100, 100), 0)
+    saver = Autosaver(tile_map, str(tmp_path))
+    assert len(saver.snapshot()["chunks"]) == 2
+    layer.set_tile((1, 0), 1)
+    layer.remove_tile((100, 100))
+    snapshot = saver.snapshot()
+    assert [key for key, *_ in snapshot["chunks"]] == [(layer.lid, (0, 0))]
+    assert snapshot["removed"] == [(layer.lid, (6, 6))]
+    assert saver.snapshot() is None
+    saver.close()
+
+
+def test_recover_after_generation_switch(tmp_path):
+    directory = str(tmp_path)
+    tile_map, layer = make_map()
+    saver = Autosaver(tile_map, directory)
+    log = saver.journal = Journal(tile_map, directory, generation=saver.generation)
+    layer.set_tile((0, 0), 0)
+    saver.save()
+    saver.flush()
+    # Logged after the snapshot of generation 1, into its segment
+    layer.set_tile((0, 0), 1)
+    layer.set_tile((5, 5), 0)
+    log.flush()
+    log.wait()
+    assert list_segments(directory) == [1]
+
+    # Left behind by a crash before it was discarded, it is older than the snapshot and must not be replayed
+    os.rename(os.path.join(directory, "journal", "1.log"), os.path.join(directory, "journal", "0.log"))
+    loaded = map_file.load_map(directory)
+    assert recover(directory, loaded) == 0
+    os.rename(os.path.join(directory, "journal", "0.log"), os.path.join(directory, "journal", "1.log"))
+
+    loaded = map_file.load_map(directory)
+    assert loaded.get_layer(layer.lid).get_tile((0, 0)) == (0, (1, 1))
+    assert recover(directory, loaded) == 2
+    assert tiles_of(loaded) == tiles_of(tile_map)
+    log.close()
+    saver.close()
+
+
+def chunk_files(directory):
+    chunks_dir = os.path.join(directory, map_file.CHUNKS_DIR)
+    return sorted(os.path.join(lid, name) for lid in os.listdir(chunks_dir)
+                  for name in os.listdir(os.path.join(chunks_dir, lid)))
+
+
+def test_manifest_only_reads_chunks_of_its_snapshot(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((100, 100), 0)
+    saver = Autosaver(tile_map, directory)
+    saver.save()
+    saver.flush()
+    saved = tiles_of(tile_map)
+
+    # Cut off after the chunks of the next snapshot were written, before its manifest
+    write_file = map_file.write_file
+
+    def fail_manifest(path, data, fsync=True):
+        if path.endswith(map_file.MANIFEST):
+            raise OSError("cut off")
+        write_file(path, data, fsync)
+
+    monkeypatch.setattr(map_file, "write_file", fail_manifest)
+    layer.set_tile((0, 0), 1)
+    layer.remove_tile((100, 100))
+    saver.save()
+    saver.flush()
+    assert saver.last_error is not None
+    assert tiles_of(map_file.load_map(directory)) == saved
+
+    # The next snapshot writes everything again and deletes the files no manifest names
+    monkeypatch.setattr(map_file, "write_file", write_file)
+    saver.save()
+    saver.close()
+    assert tiles_of(map_file.load_map(directory)) == tiles_of(tile_map)
+    assert chunk_files(directory) == [os.path.join(str(layer.lid), "0_0.3.chunk")]
+
+
+def test_autosave_replaces_chunk_files(tmp_path):
+    directory = str(tmp_path)
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((100, 100), 0)
+    saver = Autosaver(tile_map, directory)
+    saver.save()
+    layer.set_tile((1, 0), 1)
+    saver.save()
+    layer.remove_tile((100, 100))
+    saver.close()
+    assert chunk_files(directory) == [os.path.join(str(layer.lid), "0_0.2.chunk")]
+    assert tiles_of(map_file.load_map(directory)) == tiles_of(tile_map)
+
+
+def test_version_2_map_is_rewritten(tmp_path):
+    directory = str(tmp_path)
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((100, 100), 1)
+    Autosaver(tile_map, directory).close()
+
+    # Version 2 named the chunk files after their position only and didn't list them
+    manifest = map_file.read_manifest(directory)
+    for lid, chunks in map_file.list_chunks(manifest).items():
+        for position, generation in chunks.items():
+            os.rename(map_file.chunk_path(directory, lid, position, generation),
+                      map_file.chunk_path(directory, lid, position))
+    del manifest["chunks"]
+    map_file.write_file(os.path.join(directory, map_file.MANIFEST), json.dumps(manifest).encode())
+
+    loaded = map_file.load_map(directory)
+    assert tiles_of(loaded) == tiles_of(tile_map)
+    saver = Autosaver(loaded, directory)
+    saver.mark_saved()
+    saver.close()
+    assert chunk_files(directory) == [os.path.join(str(layer.lid), "0_0.2.chunk"),
+                                      os.path.join(str(layer.lid), "6_6.2.chunk")]
+    assert tiles_of(map_file.load_map(directory)) == tiles_of(tile_map)
+
+
+def test_load_drops_tiles_of_unknown_assets(tmp_path):
+    directory = str(tmp_path)
+    tile_map, layer = make_map()
+    layer.set_tile((0, 0), 0)
+    layer.set_tile((1, 0), 1)
+    Autosaver(tile_map, directory).close()
+
+    # Hand edited: a chunk with asset ids the manifest doesn't list, and a stamp using one
+    (position, generation), = map_file.list_chunks(map_file.read_manifest(directory))[layer.lid].items()
+    cells = array("i", [EMPTY]) * map_file.CELLS
+    cells[0], cells[1], cells[2], cells[3] = 0, 2, -7, 1
+    map_file.write_file(map_file.chunk_path(directory, layer.lid, position, generation),
+                        map_file.encode_chunk(position, cells, {1: (4, 4)}, None, {2: FLIP_Y}))
+    manifest = map_file.read_manifest(directory)
+    manifest["stamps"] = [{"name": "Bad", "tiles": [[layer.lid, 0, 0, 1, 1, 1, 0], [layer.lid, 1, 0, 9, 1, 1, 0]]}]
+    map_file.write_file(os.path.join(directory, map_file.MANIFEST), json.dumps(manifest).encode())
+
+    with pytest.warns(UserWarning, match="dropped 3 tiles"):
+        loaded = map_file.load_map(directory)
+    assert tiles_of(loaded)[layer.lid] == [((0, 0), 0, (1, 1), 0), ((3, 0), 1, (1, 1), 0)]
+    assert loaded.get_layer(layer.lid).max_span == (1, 1)
+    assert [tile[2] for tile in loaded.stamps[0].tiles] == [1]
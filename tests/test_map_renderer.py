@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+from sprite.sprite import Sprite  # noqa: E402
+from tilemap.chunk import CHUNK_SIZE  # noqa: E402
+from tilemap.map_renderer import MapRenderer  # noqa: E402
+from tilemap.tile_map import TileMap  # noqa: E402
+from tilemap.transform import ROTATE_90  # noqa: E402
+
+GRID = 2
+
+
+def make_map():
+    tile_map = TileMap()
+    bottom, top = tile_map.add_layer("Bottom"), tile_map.add_layer("Top")
+    tile_map.add_layer("Hidden", visible=False).set_tile((0, 0), 0)
+    colors = (255, 0, 0, 255), (0, 255, 0, 128), (0, 0, 255, 255)
+    red, green, blue = [tile_map.register_asset(Sprite(Image.new("RGBA", (4, 4), color))) for color in colors]
+    for x in range(-20, 20, 3):
+        bottom.set_tile((x, x // 2), red)
+    # Sticking out of their chunk into the chunks to the right and below, over several chunks for the biggest
+    bottom.set_tile((14, -3), blue, (5, 4), ROTATE_90)
+    top.set_tile((-18, -18), green, (40, 20))
+    top.set_tile((30, 1), blue)
+    return tile_map
+
+
+def test_chunks_match_the_single_image():
+    tile_map = make_map()
+    renderer = MapRenderer("nearest")
+    image, count = renderer.render_map(tile_map, GRID)
+    bounds = renderer.get_bounds(tile_map)
+
+    chunks = list(renderer.render_chunks(tile_map, GRID))
+    assert sum(drawn for _, _, drawn in chunks) == count
+    side = CHUNK_SIZE * GRID
+    full = Image.new("RGBA", (image.width + 2 * side, image.height + 2 * side))
+    full.paste(image, (side, side))
+    for position, chunk_image, _ in chunks:
+        left = (position[0] * CHUNK_SIZE - bounds[0]) * GRID + side
+        top = (position[1] * CHUNK_SIZE - bounds[1]) * GRID + side
+        assert chunk_image.tobytes() == full.crop((left, top, left + side, top + side)).tobytes(), position
+
+
+def test_chunks_are_rendered_one_at_a_time():
+    chunks = MapRenderer("nearest").render_chunks(make_map(), GRID)
+    position, image, _ = next(chunks)
+    assert image.size == (CHUNK_SIZE * GRID, CHUNK_SIZE * GRID)
+    assert len(list(chunks)) > 1
@@ -0,0 +1,61 @@
+import pytest
+from conftest import FakeSprite
+from tilemap.stamp import GHOST_ALPHA, Stamp
+from tilemap.tile_map import TileMap
+from tilemap.transform import ROTATE_90
+
+TILES = [(0, (10, 5), 0, (1, 1), 0), (1, (12, 4), 1, (2, 3), ROTATE_90), (0, (11, 6), 2, (1, 1), 0)]
+
+
+def test_from_tiles_moves_to_origin_and_sizes():
+    stamp = Stamp.from_tiles("Tree", TILES)
+    assert stamp.tiles == [(0, (0, 1), 0, (1, 1), 0), (1, (2, 0), 1, (2, 3), ROTATE_90), (0, (1, 2), 2, (1, 1), 0)]
+    assert stamp.size == (4, 3)
+    assert Stamp("Empty", []).size == (0, 0)
+
+
+def test_get_layer_tiles_places_at_origin():
+    stamp = Stamp.from_tiles("Tree", TILES)
+    assert stamp.get_layer_tiles((-3, 7)) == {
+        0: [((-3, 8), 0, (1, 1), 0), ((-2, 9), 2, (1, 1), 0)],
+        1: [((-1, 7), 1, (2, 3), ROTATE_90)],
+    }
+
+
+def test_dict_round_trip():
+    stamp = Stamp.from_tiles("Tree", TILES)
+    loaded = Stamp.from_dict(stamp.to_dict())
+    assert loaded.name == "Tree" and loaded.tiles == stamp.tiles and loaded.size == stamp.size
+
+
+def test_removing_assets_remaps_stamps():
+    tile_map = TileMap()
+    for key in "abc":
+        tile_map.register_asset(FakeSprite(key))
+    stamp = Stamp("Tree", [(0, (0, 0), 2, (1, 1), 0), (0, (1, 0), 0, (1, 1), 0)])
+    tile_map.add_stamp(stamp)
+    assert tile_map.remove_assets([1]) == {2: 1}
+    assert [tile[2] for tile in stamp.tiles] == [1, 0]
+
+
+def test_image_draws_layers_in_map_order():
+    pytest.importorskip("PIL")
+    from PIL import Image
+    from sprite.sprite import Sprite
+
+    tile_map = TileMap()
+    bottom, top = tile_map.add_layer("Bottom"), tile_map.add_layer("Top")
+    red = tile_map.register_asset(Sprite(Image.new("RGBA", (4, 4), (255, 0, 0, 255))))
+    blue = tile_map.register_asset(Sprite(Image.new("RGBA", (4, 4), (0, 0, 255, 255))))
+    # The tile of the top layer is listed first but drawn last
+    stamp = Stamp("Pair", [(top.lid, (0, 0), blue, (1, 1), 0), (bottom.lid, (0, 0), red, (2, 1), 0)])
+
+    image = stamp.get_image(tile_map, 8)
+    assert image.size == (16, 8)
+    assert image.getpixel((2, 2)) == (0, 0, 255, 255)
+    assert image.getpixel((12, 2)) == (255, 0, 0, 255)
+    assert stamp.get_image(tile_map, 8) is image
+
+    ghost = stamp.get_ghost_image(tile_map, 8)
+    assert ghost.getpixel((12, 2)) == (255, 0, 0, GHOST_ALPHA)
+    assert image.getpixel((12, 2))[3] == 255
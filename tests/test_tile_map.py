@@ -0,0 +1,28 @@
+from conftest import FakeSprite
+from tilemap.tile_map import TileMap
+
+
+def test_register_asset_reuses_id_of_same_sprite():
+    tile_map = TileMap()
+    sprite = FakeSprite("a")
+    assert tile_map.register_asset(sprite) == 0
+    assert tile_map.register_asset(sprite) == 0
+    assert tile_map.assets == [sprite]
+
+
+def test_register_asset_matches_duplicates_by_pixels():
+    tile_map = TileMap()
+    first = FakeSprite("a")
+    tile_map.register_asset(first)
+    assert tile_map.register_asset(FakeSprite("a")) == 0
+    assert tile_map.assets == [first]
+
+
+def test_dropped_duplicate_doesnt_leak_its_id():
+    tile_map = TileMap()
+    tile_map.register_asset(FakeSprite("a"))
+    # Duplicates aren't kept by the map, so their id() is reused by the next sprites once they are collected
+    for index in range(50):
+        tile_map.register_asset(FakeSprite("a"))
+        sprite = FakeSprite(index)
+        assert tile_map.get_asset(tile_map.register_asset(sprite)) is sprite
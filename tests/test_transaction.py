@@ -0,0 +1,138 @@
+import pytest
+
+from conftest import FakeSprite
+from tilemap.history import History
+from tilemap.tile_map import TileMap
+from tilemap.transaction import Transaction
+
+
+@pytest.fixture
+def tile_map():
+    tile_map = TileMap()
+    tile_map.add_layer("Layer 1")
+    for index in range(3):
+        tile_map.register_asset(FakeSprite(index))
+    return tile_map
+
+
+def make_transaction(tile_map, history, name="Script"):
+    return Transaction(tile_map, name, on_commit=lambda transaction: history.record(transaction.name,
+                                                                                      transaction.get_changes()))
+
+
+def test_commit_keeps_edits_and_records_one_entry(tile_map):
+    layer = tile_map.layers[0]
+    layer.set_tile((0, 0), 0)
+    committed = []
+    with Transaction(tile_map, "Fill", on_commit=committed.append) as edit:
+        for x in range(100):
+            edit.set_tile((x, 1), 1)
+        edit.remove_tile((0, 0))
+        assert edit.get_tile((5, 1)) == (1, (1, 1), 0)
+
+    assert len(committed) == 1 and committed[0].closed
+    changes = committed[0].get_changes()
+    assert len(changes) == 101
+    assert (layer.lid, (0, 0), (0, (1, 1), 0), None) in changes
+    assert layer.get_tile((99, 1)) == (1, (1, 1))
+
+
+def test_cells_edited_back_are_not_changes(tile_map):
+    with Transaction(tile_map) as edit:
+        edit.set_tile((3, 3), 2)
+        edit.remove_tile((3, 3))
+        assert edit.get_changes() == []
+
+
+def test_rollback_after_exception(tile_map):
+    layer = tile_map.layers[0]
+    layer.set_tile((0, 0), 0, (2, 1), 4)
+    committed = []
+    with pytest.raises(KeyError):
+        with Transaction(tile_map, on_commit=committed.append) as edit:
+            edit.set_tile((0, 0), 1)
+            edit.set_tile((0, 0), 2)
+            edit.set_tile((7, 7), 1)
+            raise KeyError("stop")
+
+    assert committed == []
+    assert layer.get_tile((0, 0)) == (0, (2, 1)) and layer.get_transform((0, 0)) == 4
+    assert layer.get_tile((7, 7)) is None
+
+
+def test_closed_transaction_and_locked_layer_refuse_edits(tile_map):
+    locked = tile_map.add_layer("Locked", locked=True)
+    with Transaction(tile_map) as edit:
+        with pytest.raises(ValueError):
+            edit.set_tile((0, 0), 0, layer=locked.lid)
+        with pytest.raises(ValueError):
+            edit.set_tile((0, 0), 0, layer=1234)
+    with pytest.raises(RuntimeError):
+        edit.set_tile((0, 0), 0)
+
+
+def test_sprites_are_registered(tile_map):
+    sprite = FakeSprite("new")
+    with Transaction(tile_map) as edit:
+        edit.set_tile((0, 0), sprite)
+    assert tile_map.get_asset(tile_map.layers[0].get_tile((0, 0))[0]) is sprite
+
+
+def test_undo_and_redo(tile_map):
+    layer = tile_map.layers[0]
+    history = History(tile_map)
+    layer.set_tile((1, 1), 0)
+    with make_transaction(tile_map, history, "Batch") as edit:
+        edit.set_tile((1, 1), 1)
+        edit.set_tile((2, 1), 2)
+
+    assert history.undo() == ("Batch", {layer.lid: [(2, 1), (1, 1)]})
+    assert layer.get_tile((1, 1)) == (0, (1, 1)) and layer.get_tile((2, 1)) is None
+    assert history.undo() is None
+    assert history.redo()[0] == "Batch"
+    assert layer.get_tile((1, 1)) == (1, (1, 1)) and layer.get_tile((2, 1)) == (2, (1, 1))
+    assert history.redo() is None
+
+
+def test_undo_skips_cells_edited_since(tile_map):
+    layer = tile_map.layers[0]
+    history = History(tile_map)
+    with make_transaction(tile_map, history) as edit:
+        edit.set_tile((0, 0), 1)
+        edit.set_tile((1, 0), 1)
+    # Edited by hand, which isn't recorded
+    layer.set_tile((0, 0), 2)
+
+    assert history.undo()[1] == {layer.lid: [(1, 0)]}
+    assert layer.get_tile((0, 0)) == (2, (1, 1)) and layer.get_tile((1, 0)) is None
+    # The cell skipped by the undo doesn't hold the state before either, so redo leaves it alone too
+    assert history.redo()[1] == {layer.lid: [(1, 0)]}
+    assert layer.get_tile((0, 0)) == (2, (1, 1))
+
+
+def test_record_clears_redo(tile_map):
+    history = History(tile_map)
+    for name in ("a", "b"):
+        with make_transaction(tile_map, history, name) as edit:
+            edit.set_tile((0, 0), 1 if name == "a" else 2)
+    history.undo()
+    with make_transaction(tile_map, history, "c") as edit:
+        edit.set_tile((5, 5), 0)
+    assert not history.can_redo() and history.can_undo()
+
+
+def test_remap_after_remove_assets(tile_map):
+    layer = tile_map.layers[0]
+    history = History(tile_map)
+    with make_transaction(tile_map, history) as edit:
+        edit.set_tile((0, 0), 2)
+    history.undo()
+    # Asset 2 is only used by the redo entry
+    assert history.get_assets() == {2}
+
+    remap = tile_map.remove_assets([0, 1])
+    assert remap == {2: 0}
+    history.remap(remap)
+    assert history.get_assets() == {0}
+    history.redo()
+    assert layer.get_tile((0, 0)) == (0, (1, 1))
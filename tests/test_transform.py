@@ -0,0 +1,49 @@
+import pytest
+from tilemap.transform import FLIP_X, FLIP_Y, IDENTITY, ROTATE_90, ROTATE_180, ROTATE_270, TRANSFORMS, \
+    TRANSPOSE, compose, transform_size
+
+
+def test_compose_named_transforms():
+    assert compose(ROTATE_90, ROTATE_90) == ROTATE_180
+    assert compose(ROTATE_90, ROTATE_180) == ROTATE_270
+    assert compose(ROTATE_270, ROTATE_90) == IDENTITY
+    assert compose(FLIP_X, FLIP_Y) == ROTATE_180
+    assert compose(TRANSPOSE, FLIP_X) == ROTATE_90
+
+
+def test_compose_is_a_group():
+    for first in TRANSFORMS:
+        assert compose(first, IDENTITY) == compose(IDENTITY, first) == first
+        # Every transform can be undone
+        assert any(compose(first, second) == IDENTITY for second in TRANSFORMS)
+        for second in TRANSFORMS:
+            for third in TRANSFORMS:
+                assert compose(compose(first, second), third) == compose(first, compose(second, third))
+
+
+def test_flips_undo_themselves_and_rotations_dont_commute_with_them():
+    for transform in (FLIP_X, FLIP_Y, TRANSPOSE, ROTATE_180):
+        assert compose(transform, transform) == IDENTITY
+    assert compose(ROTATE_90, FLIP_X) != compose(FLIP_X, ROTATE_90)
+
+
+def test_transform_size():
+    assert transform_size((3, 2), IDENTITY) == (3, 2)
+    assert transform_size((3, 2), ROTATE_180) == (3, 2)
+    assert transform_size((3, 2), ROTATE_90) == (2, 3)
+    assert transform_size((3, 2), ROTATE_270) == (2, 3)
+
+
+def test_compose_matches_pixels():
+    pytest.importorskip("PIL")
+    from PIL import Image
+    from sprite.sprite import transform_image
+
+    image = Image.new("L", (3, 2))
+    image.frombytes(bytes(range(6)))
+    for first in TRANSFORMS:
+        for second in TRANSFORMS:
+            composed = transform_image(image, compose(first, second))
+            assert transform_image(transform_image(image, first), second).tobytes() == composed.tobytes(), \
+                (first, second)
+            assert composed.size == transform_size(image.size, compose(first, second))
@@ -0,0 +1,115 @@
+from tilemap.chunk import Chunk, CHUNK_SIZE, EMPTY
+from tilemap.layer import chunk_of
+
+
+class AssetIndex:
+    def __init__(self, tile_map):
+        """
+        Reverse index from asset id to the chunks using it, kept up to date by listening to the map. Edits only
+        add a chunk to the index of the asset placed, so they cost O(1). Chunks that no longer hold an asset are
+        dropped from its index when it is looked up, so lookups only scan the chunks that use the asset, or used it
+        since the last lookup.
+
+        :param tile_map: The tile map
+        """
+        self._tile_map = tile_map
+        self._chunks = {}   # Asset id -> set of (layer id, chunk position)
+        self._build()
+        tile_map.listeners.append(self._handle_change)
+
+    def _build(self):
+        """
+        Indexes every chunk of the map
+        """
+        self._chunks.clear()
+        for layer in self._tile_map.layers:
+            for position, chunk in layer.chunks.items():
+                for asset in set(chunk.cells):
+                    if asset != EMPTY:
+                        self._chunks.setdefault(asset, set()).add((layer.lid, position))
+
+    def _handle_change(self, op, *args):
+        """
+        Map listener, indexes the chunks tiles are placed in
+
+        :param op: The kind of change
+        :param args: The details of the change
+        """
+        if op == "tile":
+            layer, cell, asset = args[:3]
+            self._chunks.setdefault(asset, set()).add((layer.lid, chunk_of(cell)[0]))
+        elif op == "tiles":
+            layer, tiles = args
+            for cell, asset, _, _ in tiles:
+                self._chunks.setdefault(asset, set()).add((layer.lid, chunk_of(cell)[0]))
+        elif op == "remap":
+            # The cells were rewritten without going through the layers, so the chunks move to the new ids. Chunks
+            # merged into an id that is still indexed are fine, lookups drop the ones that don't hold it.
+            chunks = {}
+            for asset, keys in self._chunks.items():
+                chunks.setdefault(args[0].get(asset, asset), set()).update(keys)
+            self._chunks = chunks
+
+    def close(self):
+        """
+        Stops listening to the map
+        """
+        self._tile_map.listeners.remove(self._handle_change)
+
+    # --------------------------------------------- LOOKUPS ---------------------------------------------- #
+    def get_chunks(self, asset: int):
+        """
+        Get the chunks holding an asset. The ones that don't anymore are dropped from the index.
+
+        :param asset: The asset id
+        :return: A list of (layer, chunk)
+        """
+        keys = self._chunks.get(asset)
+        if not keys:
+            return []
+
+        layers = {layer.lid: layer for layer in self._tile_map.layers}
+        found = []
+        for key in list(keys):
+            layer = layers.get(key[0])
+            chunk = None if layer is None else layer.chunks.get(key[1])
+            if chunk is None or asset not in chunk.cells:
+                keys.discard(key)
+            else:
+                found.append((layer, chunk))
+        if not keys:
+            del self._chunks[asset]
+        return found
+
+    def find(self, asset: int):
+        """
+        Finds the tiles of an asset
+
+        :param asset: The asset id
+        :return: A list of (layer, cell)
+        """
+        tiles = []
+        for layer, chunk in self.get_chunks(asset):
+            left, top = chunk.position[0] * CHUNK_SIZE, chunk.position[1] * CHUNK_SIZE
+            for index, current in enumerate(chunk.cells):
+                if current == asset:
+                    local = Chunk.local(index)
+                    tiles.append((layer, (left + local[0], top + local[1])))
+        return tiles
+
+    def count(self, asset: int) -> int:
+        """
+        Counts the tiles of an asset
+
+        :param asset: The asset id
+        :return: The number of tiles
+        """
+        return sum(chunk.cells.count(asset) for _, chunk in self.get_chunks(asset))
+
+    def get_used(self):
+        """
+        Get the assets that have tiles in the map
+
+        :return: A set of asset ids
+        """
+        return {asset for asset in list(self._chunks) if self.get_chunks(asset)}
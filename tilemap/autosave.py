@@ -0,0 +1,379 @@
+import json
+import os
+import queue
+import threading
+from array import array
+from tilemap import map_file
+
+
+class Autosaver:
+    def __init__(self, tile_map, directory: str, interval: int = 30000, journal=None):
+        """
+        Saves the map in the background. Saving is split in two: taking a snapshot runs on the UI thread and only
+        copies the chunks that changed since the last snapshot, which is a few small buffer copies. Encoding,
+        writing and fsyncing the snapshot happens on a worker thread, so saving never holds up the UI.
+
+        :param tile_map: The tile map to save
+        :param directory: The map directory, see map_file
+        :param interval: The time between autosaves, in ms
+        :param journal: The journal of the edits between snapshots, see Journal. Set later if None.
+        """
+        self._tile_map = tile_map
+        self.directory = directory
+        self.interval = interval
+        self.journal = journal
+
+        # (lid, chunk position) -> (chunk, chunk version, terrain version) at the last snapshot
+        self._saved = {}
+        self._asset_keys = []       # Asset id -> pixel hash, for the assets seen so far
+        self._written_images = set()
+        self._generation = 0
+        if map_file.exists(directory):
+            # Chunk files are named after their generation, so numbering goes on from the map already there
+            try:
+                self._generation = map_file.read_manifest(directory).get("generation", 0)
+            except (OSError, ValueError):
+                pass
+        self._last_manifest = None
+        self._job = None
+        self._widget = None
+        self._save_requested = False
+
+        self._lock = threading.Lock()
+        self._failed = False        # Set by the worker when writing failed, the next snapshot saves everything
+        self.last_error = None
+
+        # Only used by the worker: (lid, chunk position) -> generation of the chunk file the manifest names
+        self._files = {}
+        self._sweep = True          # Whether the chunk files no manifest names still have to be deleted
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._worker.start()
+
+    @property
+    def generation(self) -> int:
+        """
+        The generation of the last snapshot
+        """
+        return self._generation
+
+    # ------------------------------------------- SCHEDULING --------------------------------------------- #
+    def start(self, widget):
+        """
+        Starts saving periodically
+
+        :param widget: The widget whose event loop runs the timer
+        """
+        self._widget = widget
+        if self._job is None:
+            self._job = widget.after(self.interval, self._tick)
+
+    def stop(self):
+        """
+        Stops saving periodically
+        """
+        if self._job is not None:
+            self._widget.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        """
+        Periodic autosave
+        """
+        self._job = None
+        self.save()
+        self.start(self._widget)
+
+    def request_save(self):
+        """
+        Saves once the event loop is idle. Multiple requests in the same frame are merged.
+        """
+        if self._widget is None:
+            self.save()
+        elif not self._save_requested:
+            self._save_requested = True
+            self._widget.after_idle(self._save_request)
+
+    def _save_request(self):
+        """
+        Runs a requested save
+        """
+        self._save_requested = False
+        self.save()
+
+    # --------------------------------------------- SAVING ----------------------------------------------- #
+    def save(self):
+        """
+        Takes a snapshot of the changes and hands it to the worker thread. Returns right away.
+
+        :return: True if there was something to save, False otherwise
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return False
+        self._queue.put(snapshot)
+        return True
+
+    def flush(self):
+        """
+        Waits until every snapshot handed to the worker is on disk
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Saves the last changes, waits for them to be written and stops the worker
+        """
+        self.stop()
+        self.save()
+        self._queue.put(None)
+        self._worker.join()
+
+    def mark_saved(self):
+        """
+        Marks the map as saved as it is now, for maps that were just loaded from the map directory
+        """
+        files = None
+        if map_file.exists(self.directory):
+            manifest = map_file.read_manifest(self.directory)
+            self._generation = manifest.get("generation", 0)
+            files = map_file.list_chunks(manifest)
+
+        # The chunks of maps saved before version 3 are left out, so that the next snapshot writes them all again
+        # under their new names
+        if files is not None:
+            self._files = {(lid, position): generation for lid, layer_files in files.items()
+                           for position, generation in layer_files.items()}
+            for layer in self._tile_map.layers:
+                for position in set(layer.chunks).union(layer.terrain):
+                    chunk = layer.chunks.get(position)
+                    self._saved[(layer.lid, position)] = (chunk, None if chunk is None else chunk.version,
+                                                          layer.terrain_versions.get(position, 0))
+        # Loaded sprites already know their hash, so this doesn't decode them
+        self._snapshot_assets()
+        self._last_manifest = self._build_manifest()
+
+    def snapshot(self):
+        """
+        Copies what changed since the last snapshot. Runs on the UI thread, so it only compares chunk versions and
+        copies the cell buffers of the chunks that changed.
+
+        :return: The snapshot, None if nothing changed
+        """
+        with self._lock:
+            if self._failed:
+                self._failed = False
+                self._saved.clear()
+                self._asset_keys.clear()
+                self._written_images.clear()
+                self._last_manifest = None
+
+        # Without a previous snapshot every chunk is copied, and the chunk files of the map are replaced as a whole
+        full = not self._saved
+        tile_map = self._tile_map
+        chunks = []
+        current = {}
+        for layer in tile_map.layers:
+            positions = set(layer.chunks)
+            positions.update(layer.terrain)
+            for position in positions:
+                key = layer.lid, position
+                chunk = layer.chunks.get(position)
+                state = chunk, None if chunk is None else chunk.version, layer.terrain_versions.get(position, 0)
+                current[key] = state
+
+                saved = self._saved.get(key)
+                if saved is not None and saved[0] is state[0] and saved[1:] == state[1:]:
+                    continue
+
+                terrain = layer.terrain.get(position)
+                if chunk is None:
+                    cells, spans, transforms = array("i", [-1]) * map_file.CELLS, {}, {}
+                else:
+                    cells, spans, transforms = array("i", chunk.cells), dict(chunk.spans), dict(chunk.transforms)
+                chunks.append((key, cells, spans, None if terrain is None else bytes(terrain), transforms))
+
+        removed = [key for key in self._saved if key not in current]
+        images = [(key, frame._original) for key, frame in self._snapshot_assets()]
+        manifest = self._build_manifest()
+        if not chunks and not removed and not images and manifest == self._last_manifest:
+            return None
+
+        self._saved = current
+        self._last_manifest = manifest
+        self._generation += 1
+        if self.journal is not None:
+            # Edits from now on go to the segment of this snapshot
+            self.journal.rotate(self._generation)
+        return {
+            "generation": self._generation,
+            "manifest": dict(manifest, generation=self._generation),
+            "chunks": chunks,
+            "removed": removed,
+            "images": images,
+            "full": full,
+        }
+
+    def _snapshot_assets(self):
+        """
+        Hashes the assets and terrain sprites, and finds the ones whose images weren't written yet
+
+        :return: A list of (pixel hash, sprite) for the images that still have to be written
+        """
+        # Imported here so that maps without sprites don't need PIL
+        from sprite.sprite_store import default_store
+        store = default_store()
+
+        sprites = list(self._tile_map.assets)
+        for terrain_set in self._tile_map.terrains:
+            sprites.append(terrain_set.default_sprite)
+            sprites.extend(rule.sprite for rule in terrain_set.rules)
+
+        images = []
+        for sprite in sprites:
+            frames = sprite.frames if sprite.is_animated() else [sprite]
+            for frame in frames:
+                key = store.hash_sprite(frame)
+                if key not in self._written_images:
+                    self._written_images.add(key)
+                    images.append((key, frame))
+
+        # Asset ids shift when unused assets are removed, so the keys are looked up again. Hashes are kept by the
+        # sprites, so this doesn't decode anything.
+        self._asset_keys = [store.hash_sprite(sprite) for sprite in self._tile_map.assets]
+        return images
+
+    def _build_manifest(self):
+        """
+        Describes the layers, assets and terrains of the map
+
+        :return: The manifest
+        """
+        tile_map = self._tile_map
+        assets = []
+        for sprite, key in zip(tile_map.assets, self._asset_keys):
+            entry = {"hash": key}
+            if sprite.source is not None:
+                # Where the sprite was imported from, so that it can still be reloaded when the file changes
+                entry["source"] = sprite.source
+            if sprite.is_animated():
+                entry["frames"] = [frame.pixel_hash for frame in sprite.frames]
+                entry["durations"] = list(sprite.durations)
+            assets.append(entry)
+
+        active = tile_map.get_active_layer()
+        return {
+            "format": map_file.FORMAT_VERSION,
+            "active_layer": None if active is None else active.lid,
+            "layers": [{"lid": layer.lid, "name": layer.name, "visible": layer.visible, "locked": layer.locked,
+                        "static": layer.static} for layer in tile_map.layers],
+            "assets": assets,
+            "terrains": [{"name": terrain_set.name, "default": terrain_set.default_sprite.pixel_hash,
+                          "rules": [[rule.sprite.pixel_hash, rule.same, rule.different]
+                                    for rule in terrain_set.rules]}
+                         for terrain_set in tile_map.terrains],
+            "stamps": [stamp.to_dict() for stamp in tile_map.stamps],
+        }
+
+    # --------------------------------------------- WORKER ----------------------------------------------- #
+    def _run(self):
+        """
+        Worker thread, writes the snapshots in order
+        """
+        while True:
+            snapshot = self._queue.get()
+            try:
+                if snapshot is None:
+                    return
+                self._write(snapshot)
+            except (OSError, ValueError) as error:
+                self.last_error = error
+                # The files of the failed snapshot are named by no manifest
+                self._sweep = True
+                with self._lock:
+                    self._failed = True
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshot):
+        """
+        Writes a snapshot. The chunks and images go first and the manifest last, so the manifest never refers to
+        something that isn't on disk yet. Chunk files are named after the generation of the snapshot and the files
+        the manifest no longer names are only deleted after it, so that the manifest on disk always names the chunk
+        files of its own snapshot, even if writing stops halfway.
+
+        :param snapshot: The snapshot
+        """
+        directory = self.directory
+        generation = snapshot["generation"]
+        directories = {directory}
+        os.makedirs(os.path.join(directory, map_file.ASSETS_DIR), exist_ok=True)
+
+        for key, image in snapshot["images"]:
+            path = map_file.asset_path(directory, key)
+            if not os.path.exists(path):
+                temp_path = path + ".tmp"
+                with open(temp_path, "wb") as file:
+                    image.save(file, format="PNG")
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, path)
+                directories.add(os.path.dirname(path))
+
+        files = {} if snapshot["full"] else dict(self._files)
+        for (lid, position), cells, spans, terrain, transforms in snapshot["chunks"]:
+            path = map_file.chunk_path(directory, lid, position, generation)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            map_file.write_file(path, map_file.encode_chunk(position, cells, spans, terrain, transforms))
+            directories.add(os.path.dirname(path))
+            files[(lid, position)] = generation
+        for key in snapshot["removed"]:
+            files.pop(key, None)
+
+        for path in directories:
+            map_file.fsync_directory(path)
+
+        listing = {}
+        for (lid, position), file_generation in files.items():
+            listing.setdefault(str(lid), {})[map_file.chunk_key(position)] = file_generation
+        manifest = dict(snapshot["manifest"], chunks=listing)
+        map_file.write_file(os.path.join(directory, map_file.MANIFEST), json.dumps(manifest, indent=1).encode())
+        map_file.fsync_directory(directory)
+
+        # The manifest on disk names the new files now, so the ones they replace can go
+        stale = [(key, file_generation) for key, file_generation in self._files.items()
+                 if files.get(key) != file_generation]
+        self._files = files
+        for (lid, position), file_generation in stale:
+            try:
+                os.remove(map_file.chunk_path(directory, lid, position, file_generation))
+            except FileNotFoundError:
+                pass
+        if self._sweep:
+            self._sweep_chunks()
+            self._sweep = False
+
+        # The snapshot holds every edit logged before it, so the older journal segments can go
+        if self.journal is not None:
+            self.journal.discard_before(generation)
+
+    def _sweep_chunks(self):
+        """
+        Deletes the chunk files the manifest doesn't name: those of maps saved before version 3, of removed layers,
+        and those left by snapshots that failed or were cut off before their manifest was written
+        """
+        chunks_dir = os.path.join(self.directory, map_file.CHUNKS_DIR)
+        if not os.path.isdir(chunks_dir):
+            return
+
+        named = {map_file.chunk_path(self.directory, lid, position, generation)
+                 for (lid, position), generation in self._files.items()}
+        for layer_dir in os.listdir(chunks_dir):
+            layer_path = os.path.join(chunks_dir, layer_dir)
+            if not os.path.isdir(layer_path):
+                continue
+            for name in os.listdir(layer_path):
+                path = os.path.join(layer_path, name)
+                if (name.endswith(".chunk") or name.endswith(".tmp")) and path not in named:
+                    os.remove(path)
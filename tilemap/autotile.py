@@ -0,0 +1,298 @@
+from PIL import Image, ImageChops
+from tilemap.chunk import CHUNK_SIZE, EMPTY
+from sprite.sprite import Sprite
+
+# Neighbor bits of a mask. A bit is set when the neighbor has the same terrain as the cell.
+N, NE, E, SE, S, SW, W, NW = 1, 2, 4, 8, 16, 32, 64, 128
+EDGES = N | E | S | W
+# (x offset, y offset, bit)
+DIRECTIONS = ((0, -1, N), (1, -1, NE), (1, 0, E), (1, 1, SE), (0, 1, S), (-1, 1, SW), (-1, 0, W), (-1, -1, NW))
+# Bits of the 4 bit edge masks used by 4x4 terrain sheets (N=1, E=2, S=4, W=8)
+SHEET_EDGES = (N, E, S, W)
+
+
+class TerrainRule:
+    def __init__(self, sprite, same: int = 0, different: int = 0):
+        """
+        A rule of a terrain set. It matches a cell when every neighbor in `same` has the same terrain as the cell
+        and no neighbor in `different` does. Neighbors in neither don't matter.
+
+        :param sprite: The sprite used when the rule matches
+        :param same: The neighbor bits that must be the same terrain
+        :param different: The neighbor bits that must not be the same terrain
+        """
+        self.sprite = sprite
+        self.same = same
+        self.different = different
+
+    def matches(self, mask: int):
+        """
+        Checks whether the rule matches a neighbor mask
+
+        :param mask: The neighbor mask
+        :return: True if it matches, False otherwise
+        """
+        return mask & self.same == self.same and mask & self.different == 0
+
+
+class TerrainSet:
+    def __init__(self, name: str, default_sprite):
+        """
+        A terrain that can be painted with the terrain brush. The tile of every painted cell is picked from the
+        rules, in order, using which of the 8 neighbors have the same terrain. Cells no rule matches use the
+        default sprite.
+
+        :param name: The name of the terrain
+        :param default_sprite: The sprite used when no rule matches
+        """
+        self.name = name
+        self.default_sprite = default_sprite
+        self.rules = []
+
+    @classmethod
+    def from_sheet(cls, name: str, image: Image, columns: int = 4, rows: int = 4, store=None):
+        """
+        Creates a terrain set from a sheet of 16 edge variants. The variant at index i (left to right, top to
+        bottom) is used when the edges in the 4 bit mask i (N=1, E=2, S=4, W=8) are the same terrain.
+
+        :param name: The name of the terrain
+        :param image: The sheet
+        :param columns: The number of variants per row
+        :param rows: The number of rows
+        :param store: A sprite store, variants identical to sprites already in it are shared instead of copied
+        :return: The terrain set
+        """
+        width, height = image.size[0] // columns, image.size[1] // rows
+        sprites = {}
+        for i in range(min(columns * rows, 16)):
+            x, y = (i % columns) * width, (i // columns) * height
+            mask = 0
+            for bit, edge in enumerate(SHEET_EDGES):
+                if i & (1 << bit):
+                    mask |= edge
+            sprite = Sprite(image.crop((x, y, x + width, y + height)))
+            sprites[mask] = sprite if store is None else store.add(sprite)
+
+        terrain_set = cls(name, sprites[EDGES])
+        terrain_set.add_bitmask_variants(sprites, EDGES)
+        return terrain_set
+
+    def add_rule(self, sprite, same: int = 0, different: int = 0):
+        """
+        Adds a rule, rules added first take priority
+
+        :param sprite: The sprite used when the rule matches
+        :param same: The neighbor bits that must be the same terrain
+        :param different: The neighbor bits that must not be the same terrain
+        """
+        self.rules.append(TerrainRule(sprite, same, different))
+
+    def add_bitmask_variants(self, sprites: dict, bits: int = 0xFF):
+        """
+        Adds one rule per variant, matching the neighbors in `bits` exactly
+
+        :param sprites: Mask -> sprite
+        :param bits: The neighbor bits the masks are made of, EDGES for 16 variant sets, 0xFF for 47/256 variants
+        """
+        for mask, sprite in sprites.items():
+            self.add_rule(sprite, same=mask, different=bits & ~mask)
+
+    def get_sprite(self, mask: int):
+        """
+        Get the sprite for a neighbor mask
+
+        :param mask: The neighbor mask
+        :return: The sprite of the first matching rule, the default sprite if none match
+        """
+        for rule in self.rules:
+            if rule.matches(mask):
+                return rule.sprite
+        return self.default_sprite
+
+    def get_preview(self):
+        """
+        Get the sprite shown for the terrain in menus, the one used for a cell surrounded by the same terrain
+
+        :return: The sprite
+        """
+        return self.get_sprite(0xFF)
+
+    def compile(self, tile_map):
+        """
+        Resolves the rules for every possible mask
+
+        :param tile_map: The tile map the assets are registered in
+        :return: A list of 256 asset ids, indexed by mask
+        """
+        return [tile_map.register_asset(self.get_sprite(mask)) for mask in range(256)]
+
+
+class Autotiler:
+    def __init__(self, tile_map):
+        """
+        Picks the tiles of terrain cells. Painting only recomputes the 8 neighbors of the changed cells, while a
+        whole layer is recomputed chunk by chunk with image operations over the terrain arrays.
+
+        :param tile_map: The tile map
+        """
+        self._tile_map = tile_map
+        self._tables = {}   # Terrain id -> list of 256 asset ids
+        # Point tables turning a difference of terrain ids into a neighbor bit, one per direction
+        self._bit_tables = {bit: [bit] + [0] * 255 for _, _, bit in DIRECTIONS}
+
+    def _get_table(self, tid: int):
+        """
+        Get the compiled rules of a terrain
+
+        :param tid: The terrain id
+        :return: The mask -> asset id table
+        """
+        table = self._tables.get(tid)
+        if table is None:
+            table = self._tables[tid] = self._tile_map.get_terrain_set(tid).compile(self._tile_map)
+        return table
+
+    def invalidate(self):
+        """
+        Drops the compiled rules, call when the rules of a terrain set change
+        """
+        self._tables.clear()
+
+    # ------------------------------------------- INCREMENTAL -------------------------------------------- #
+    def paint(self, layer, cells, terrain_set):
+        """
+        Paints a terrain on cells and updates the tiles around them
+
+        :param layer: The layer
+        :param cells: The cells to paint
+        :param terrain_set: The terrain set, or None to erase the terrain
+        :return: The set of cells whose tile changed
+        """
+        tid = 0 if terrain_set is None else self._tile_map.register_terrain(terrain_set)
+
+        dirty = set()
+        for cell in cells:
+            layer.set_terrain(cell, tid)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    dirty.add((cell[0] + dx, cell[1] + dy))
+
+        changed = set()
+        if tid == 0:
+            for cell in cells:
+                if layer.remove_tile(cell) is not None:
+                    changed.add(cell)
+
+        for cell in dirty:
+            if self._update_cell(layer, cell):
+                changed.add(cell)
+        return changed
+
+    def get_mask(self, layer, cell) -> int:
+        """
+        Computes the neighbor mask of a cell
+
+        :param layer: The layer
+        :param cell: The cell position (x, y)
+        :return: The mask
+        """
+        tid = layer.get_terrain(cell)
+        mask = 0
+        for dx, dy, bit in DIRECTIONS:
+            if layer.get_terrain((cell[0] + dx, cell[1] + dy)) == tid:
+                mask |= bit
+        return mask
+
+    def _update_cell(self, layer, cell):
+        """
+        Sets the tile of a terrain cell from its neighbors
+
+        :param layer: The layer
+        :param cell: The cell position (x, y)
+        :return: True if the tile changed, False otherwise
+        """
+        tid = layer.get_terrain(cell)
+        if tid == 0:
+            return False
+
+        asset = self._get_table(tid)[self.get_mask(layer, cell)]
+        # A tile with the right asset that was resized, flipped or rotated doesn't follow the rules either
+        if layer.get_tile(cell) == (asset, (1, 1)) and layer.get_transform(cell) == 0:
+            return False
+        layer.set_tile(cell, asset)
+        return True
+
+    # ---------------------------------------------- WHOLE ---------------------------------------------- #
+    def recompute_layer(self, layer):
+        """
+        Reapplies the rules to every terrain cell of a layer
+
+        :param layer: The layer
+        :return: The set of cells whose tile changed
+        """
+        changed = set()
+        for position in list(layer.terrain):
+            changed.update(self._recompute_chunk(layer, position))
+        return changed
+
+    def _padded_terrain(self, layer, position):
+        """
+        Gets the terrain of a chunk with a one cell border taken from the neighboring chunks
+
+        :param layer: The layer
+        :param position: The chunk position
+        :return: The terrain ids as bytes, (CHUNK_SIZE + 2) squared
+        """
+        empty = bytes(CHUNK_SIZE * CHUNK_SIZE)
+
+        def terrain_at(dx, dy):
+            return layer.terrain.get((position[0] + dx, position[1] + dy), empty)
+
+        padded = bytearray()
+        for y in range(-1, CHUNK_SIZE + 1):
+            dy = -1 if y < 0 else (1 if y >= CHUNK_SIZE else 0)
+            row = (y % CHUNK_SIZE) * CHUNK_SIZE
+            left, middle, right = terrain_at(-1, dy), terrain_at(0, dy), terrain_at(1, dy)
+            padded.append(left[row + CHUNK_SIZE - 1])
+            padded += middle[row:row + CHUNK_SIZE]
+            padded.append(right[row])
+        return bytes(padded)
+
+    def _recompute_chunk(self, layer, position):
+        """
+        Reapplies the rules to a chunk. The masks of all cells are computed at once: the terrain is compared with
+        a copy of itself shifted towards each neighbor, and the matches are added up into the mask image.
+
+        :param layer: The layer
+        :param position: The chunk position
+        :return: The cells whose tile changed
+        """
+        size = CHUNK_SIZE + 2
+        padded = Image.frombytes("L", (size, size), self._padded_terrain(layer, position))
+        center = padded.crop((1, 1, CHUNK_SIZE + 1, CHUNK_SIZE + 1))
+
+        masks = Image.new("L", (CHUNK_SIZE, CHUNK_SIZE))
+        for dx, dy, bit in DIRECTIONS:
+            shifted = padded.crop((1 + dx, 1 + dy, CHUNK_SIZE + 1 + dx, CHUNK_SIZE + 1 + dy))
+            masks = ImageChops.add(masks, ImageChops.difference(center, shifted).point(self._bit_tables[bit]))
+
+        terrain = layer.terrain[position]
+        masks = masks.tobytes()
+        chunk = layer.chunks.get(position)
+        base = position[0] * CHUNK_SIZE, position[1] * CHUNK_SIZE
+
+        changed = []
+        for index, tid in enumerate(terrain):
+            if tid == 0:
+                continue
+
+            asset = self._get_table(tid)[masks[index]]
+            # Spans and transforms are only stored for tiles that are bigger than a cell or transformed
+            if chunk is not None and chunk.cells[index] == asset and index not in chunk.spans \
+                    and index not in chunk.transforms:
+                continue
+
+            cell = base[0] + index % CHUNK_SIZE, base[1] + index // CHUNK_SIZE
+            chunk = layer.set_tile(cell, asset)
+            changed.append(cell)
+        return changed
@@ -0,0 +1,145 @@
+import hashlib
+from array import array
+
+# Number of cells on each side of a chunk
+CHUNK_SIZE = 16
+# Asset id of a cell without a tile
+EMPTY = -1
+
+
+class Chunk:
+    def __init__(self, position):
+        """
+        A square block of CHUNK_SIZE x CHUNK_SIZE cells of a layer. Each cell holds the id of the asset whose tile
+        is anchored (top left corner) there, or EMPTY. Tiles covering more than one cell keep their span separately
+        since most tiles are a single cell, and so do flipped or rotated tiles with their transform.
+
+        :param position: The position of the chunk in chunks (x, y)
+        """
+        self.position = position
+        self.cells = array("i", [EMPTY]) * (CHUNK_SIZE * CHUNK_SIZE)
+        self.spans = {}     # Cell index -> (width, height) in cells, only for tiles bigger than a cell
+        self.transforms = {}    # Cell index -> transform (see tilemap.transform), only for transformed tiles
+        self.count = 0
+        # Incremented on every change, used to know when cached renders of the chunk are out of date
+        self.version = 0
+        self._hash = None
+        self._hash_version = -1
+
+    @staticmethod
+    def index(local) -> int:
+        """
+        Get the index of a cell in the cell array
+
+        :param local: The cell position inside the chunk (x, y)
+        :return: The index
+        """
+        return local[1] * CHUNK_SIZE + local[0]
+
+    @staticmethod
+    def local(index: int):
+        """
+        Get the position of a cell inside the chunk from its index
+
+        :param index: The index in the cell array
+        :return: The position (x, y)
+        """
+        return index % CHUNK_SIZE, index // CHUNK_SIZE
+
+    def get(self, local):
+        """
+        Get the tile anchored at a cell
+
+        :param local: The cell position inside the chunk (x, y)
+        :return: (asset, span) or None if the cell is empty
+        """
+        index = self.index(local)
+        asset = self.cells[index]
+        if asset == EMPTY:
+            return None
+        return asset, self.spans.get(index, (1, 1))
+
+    def get_transform(self, local) -> int:
+        """
+        Get the transform of the tile anchored at a cell
+
+        :param local: The cell position inside the chunk (x, y)
+        :return: The transform, 0 if the tile isn't transformed or the cell is empty
+        """
+        return self.transforms.get(self.index(local), 0)
+
+    def set(self, local, asset: int, span=(1, 1), transform: int = 0):
+        """
+        Anchor a tile at a cell, replacing the previous tile
+
+        :param local: The cell position inside the chunk (x, y)
+        :param asset: The asset id
+        :param span: The size of the tile in cells (width, height)
+        :param transform: The flips and rotation of the sprite, see tilemap.transform
+        """
+        index = self.index(local)
+        if self.cells[index] == EMPTY:
+            self.count += 1
+        self.cells[index] = asset
+
+        if tuple(span) == (1, 1):
+            self.spans.pop(index, None)
+        else:
+            self.spans[index] = tuple(span)
+        if transform:
+            self.transforms[index] = transform
+        else:
+            self.transforms.pop(index, None)
+        self.version += 1
+
+    def remove(self, local):
+        """
+        Remove the tile anchored at a cell
+
+        :param local: The cell position inside the chunk (x, y)
+        :return: (asset, span) of the removed tile, or None if the cell was empty
+        """
+        tile = self.get(local)
+        if tile is not None:
+            index = self.index(local)
+            self.cells[index] = EMPTY
+            self.spans.pop(index, None)
+            self.transforms.pop(index, None)
+            self.count -= 1
+            self.version += 1
+        return tile
+
+    def is_empty(self):
+        """
+        Checks whether there are no tiles in the chunk
+
+        :return: True if empty, False otherwise
+        """
+        return self.count == 0
+
+    def tiles(self):
+        """
+        Iterates over the tiles of the chunk
+
+        :return: A generator of (local, asset, span)
+        """
+        for index, asset in enumerate(self.cells):
+            if asset != EMPTY:
+                yield self.local(index), asset, self.spans.get(index, (1, 1))
+
+    def content_hash(self) -> bytes:
+        """
+        Get a hash of the tiles of the chunk. It is kept until the chunk changes, so comparing chunks that didn't
+        change since they were last compared doesn't even read their cells.
+
+        :return: The hash
+        """
+        if self._hash_version != self.version:
+            digest = hashlib.blake2b(self.cells.tobytes(), digest_size=16)
+            if self.spans:
+                digest.update(repr(sorted(self.spans.items())).encode())
+            if self.transforms:
+                digest.update(b"t" + repr(sorted(self.transforms.items())).encode())
+            self._hash = digest.digest()
+            self._hash_version = self.version
+        return self._hash
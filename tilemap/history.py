@@ -0,0 +1,139 @@
+from collections import deque
+
+
+def get_state(layer, cell):
+    """
+    Get what is anchored at a cell, in a form that can be put back with set_state
+
+    :param layer: The layer
+    :param cell: The cell position (x, y)
+    :return: (asset, span, transform), None if there is no tile
+    """
+    tile = layer.get_tile(cell)
+    if tile is None:
+        return None
+    return tile[0], tile[1], layer.get_transform(cell)
+
+
+def set_state(layer, cell, state):
+    """
+    Puts a state from get_state back
+
+    :param layer: The layer
+    :param cell: The cell position (x, y)
+    :param state: (asset, span, transform), None to remove the tile
+    """
+    if state is None:
+        layer.remove_tile(cell)
+    else:
+        layer.set_tile(cell, *state)
+
+
+class History:
+    def __init__(self, tile_map, limit: int = 100):
+        """
+        Undo and redo history of the map. An entry holds the state of every cell it changed, before and after, so
+        undoing a batch of thousands of edits is one entry.
+
+        Only some edits are recorded, so a cell can change after its entry. Undo and redo leave alone the cells
+        that don't hold the state the entry left them in, instead of overwriting the later edits.
+
+        :param tile_map: The tile map
+        :param limit: The number of entries kept, the oldest are dropped first
+        """
+        self._tile_map = tile_map
+        self._undo = deque(maxlen=limit)    # (name, [(layer id, cell, before, after)])
+        self._redo = []
+
+    def record(self, name: str, changes):
+        """
+        Adds an entry. The entries that were undone can't be redone anymore.
+
+        :param name: What the entry did, shown to the user
+        :param changes: A list of (layer id, cell, state before, state after), see get_state
+        """
+        if changes:
+            self._undo.append((name, list(changes)))
+            self._redo.clear()
+
+    def can_undo(self) -> bool:
+        """
+        Checks whether there is something to undo
+
+        :return: True if there is, False otherwise
+        """
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        """
+        Checks whether there is something to redo
+
+        :return: True if there is, False otherwise
+        """
+        return bool(self._redo)
+
+    def undo(self):
+        """
+        Puts the cells of the last entry back to how they were before it. Cells changed since are skipped.
+
+        :return: (name of the entry, dict of layer id -> cells changed), None if there is nothing to undo
+        """
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        self._redo.append(entry)
+        return entry[0], self._apply(reversed(entry[1]), 2)
+
+    def redo(self):
+        """
+        Applies the last undone entry again. Cells changed since the undo are skipped.
+
+        :return: (name of the entry, dict of layer id -> cells changed), None if there is nothing to redo
+        """
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        self._undo.append(entry)
+        return entry[0], self._apply(entry[1], 3)
+
+    def get_assets(self):
+        """
+        Get the assets the entries can put back, so that they aren't removed from the map while they can be
+
+        :return: A set of asset ids
+        """
+        return {state[0] for _, changes in (*self._undo, *self._redo)
+                for change in changes for state in change[2:] if state is not None}
+
+    def remap(self, remap: dict):
+        """
+        Points the entries to new asset ids, see TileMap.deduplicate_assets and TileMap.remove_assets
+
+        :param remap: A dict of old asset id -> new asset id
+        """
+        def remap_state(state):
+            return None if state is None else (remap.get(state[0], state[0]), state[1], state[2])
+
+        for entries in (self._undo, self._redo):
+            remapped = [(name, [(lid, cell, remap_state(before), remap_state(after))
+                                for lid, cell, before, after in changes]) for name, changes in entries]
+            entries.clear()
+            entries.extend(remapped)
+
+    def _apply(self, changes, index: int):
+        """
+        Sets cells to one of the states of their changes. Cells that don't hold the other state, because they were
+        edited since, and layers that were removed since are skipped.
+
+        :param changes: The changes
+        :param index: 2 to apply the states before, 3 for the states after
+        :return: A dict of layer id -> cells changed
+        """
+        touched = {}
+        for change in changes:
+            layer = self._tile_map.get_layer(change[0])
+            if layer is None or get_state(layer, change[1]) != change[5 - index]:
+                continue
+            set_state(layer, change[1], change[index])
+            touched.setdefault(layer.lid, []).append(change[1])
+        return touched
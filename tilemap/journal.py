@@ -0,0 +1,315 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+from tilemap import map_file
+
+# The journal is a directory of segments, journal/<generation>.log. A segment holds the edits made after the
+# snapshot of that generation was taken. Edits are absolute (the new content of a cell), so replaying them over
+# any later snapshot is harmless, and a crash in the middle of saving a snapshot loses nothing.
+JOURNAL_DIR = "journal"
+
+OP_TILE, OP_REMOVE, OP_TERRAIN = 1, 2, 3
+# Follows the OP_TILE record of a flipped or rotated tile, older versions skip it and keep the tile untransformed
+OP_TRANSFORM = 4
+_RECORD = struct.Struct("<BIiiiBB")     # op, layer id, x, y, asset or terrain id, span width, span height
+_FRAME = struct.Struct("<II")           # length and crc32 of a batch of records
+
+
+def segment_path(directory: str, generation: int) -> str:
+    """
+    The path of a journal segment
+
+    :param directory: The map directory
+    :param generation: The generation of the snapshot the segment applies to
+    :return: The path
+    """
+    return os.path.join(directory, JOURNAL_DIR, "{}.log".format(generation))
+
+
+def list_segments(directory: str):
+    """
+    Lists the journal segments of a map
+
+    :param directory: The map directory
+    :return: A sorted list of generations
+    """
+    try:
+        names = os.listdir(os.path.join(directory, JOURNAL_DIR))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len(".log")]) for name in names if name.endswith(".log") and name[:-4].isdigit())
+
+
+def read_records(path: str):
+    """
+    Reads the records of a segment. A batch that was only partly written when the program died is ignored, along
+    with anything after it.
+
+    :param path: The path of the segment
+    :return: A generator of (op, lid, x, y, value, width, height)
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        payload = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc or length % _RECORD.size:
+            return
+        yield from _RECORD.iter_unpack(payload)
+        offset += _FRAME.size + length
+
+
+def recover(directory: str, tile_map) -> int:
+    """
+    Replays the journal over a map loaded from its last snapshot. Edits of layers or assets that didn't make it
+    into a snapshot are skipped.
+
+    :param directory: The map directory
+    :param tile_map: The map loaded from the directory
+    :return: The number of edits replayed
+    """
+    generation = map_file.read_manifest(directory).get("generation", 0) if map_file.exists(directory) else 0
+    count = 0
+    for segment in list_segments(directory):
+        if segment < generation:
+            continue
+        for op, lid, x, y, value, width, height in read_records(segment_path(directory, segment)):
+            layer = tile_map.get_layer(lid)
+            if layer is None:
+                continue
+            if op == OP_TILE and 0 <= value < len(tile_map.assets):
+                layer.set_tile((x, y), value, (width, height))
+            elif op == OP_TRANSFORM:
+                tile = layer.get_tile((x, y))
+                if tile is None:
+                    continue
+                layer.set_tile((x, y), tile[0], tile[1], value)
+            elif op == OP_REMOVE:
+                layer.remove_tile((x, y))
+            elif op == OP_TERRAIN and 0 <= value <= len(tile_map.terrains):
+                layer.set_terrain((x, y), value)
+            else:
+                continue
+            count += 1
+    return count
+
+
+class Journal:
+    def __init__(self, tile_map, directory: str, generation: int = 0, flush_interval: int = 500,
+                 compact_bytes: int = 1024 * 1024):
+        """
+        Write-ahead log of the edits of a map, between two snapshots. Every edit is packed into a small binary
+        record as it happens. Records are buffered and written in batches by a background thread, each batch
+        followed by an fsync.
+
+        When the journal grows past compact_bytes, or when something a record can't describe changes (a new asset
+        or layer), a snapshot is requested. Once the snapshot is on disk the segments before it are deleted, which
+        folds the journal into the map files.
+
+        :param tile_map: The tile map to log
+        :param directory: The map directory
+        :param generation: The generation of the last snapshot
+        :param flush_interval: The time between batched writes, in ms
+        :param compact_bytes: The journal size that triggers a snapshot
+        """
+        self._tile_map = tile_map
+        self.directory = directory
+        self.generation = generation
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        # Called with no arguments when a snapshot should be taken
+        self.request_snapshot = None
+
+        self._buffer = bytearray()
+        self._size = 0              # Bytes logged since the last snapshot
+        self._paused = False
+        self._job = None
+        self._widget = None
+        self.last_error = None
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._writer.start()
+
+        tile_map.listeners.append(self._handle_change)
+
+    # ------------------------------------------- RECORDING ---------------------------------------------- #
+    def _handle_change(self, op, *args):
+        """
+        Map listener, packs edits into records
+
+        :param op: The kind of change
+        :param args: The details of the change
+        """
+        if self._paused:
+            return
+
+        if op == "tile":
+            layer, cell, asset, span, transform = args
+            self._buffer += _RECORD.pack(OP_TILE, layer.lid, cell[0], cell[1], asset, span[0], span[1])
+            if transform:
+                self._buffer += _RECORD.pack(OP_TRANSFORM, layer.lid, cell[0], cell[1], transform, 0, 0)
+                self._size += _RECORD.size
+        elif op == "tiles":
+            layer, tiles = args
+            for cell, asset, span, transform in tiles:
+                self._buffer += _RECORD.pack(OP_TILE, layer.lid, cell[0], cell[1], asset, span[0], span[1])
+                if transform:
+                    self._buffer += _RECORD.pack(OP_TRANSFORM, layer.lid, cell[0], cell[1], transform, 0, 0)
+                    self._size += _RECORD.size
+            self._size += _RECORD.size * (len(tiles) - 1)
+        elif op == "remove":
+            layer, cell = args
+            self._buffer += _RECORD.pack(OP_REMOVE, layer.lid, cell[0], cell[1], 0, 0, 0)
+        elif op == "terrain":
+            layer, cell, tid = args
+            self._buffer += _RECORD.pack(OP_TERRAIN, layer.lid, cell[0], cell[1], tid, 0, 0)
+        else:
+            # Assets and layers are only saved by snapshots
+            self._request_snapshot()
+            return
+
+        self._size += _RECORD.size
+        if self._size >= self.compact_bytes:
+            self._request_snapshot()
+
+    def _request_snapshot(self):
+        """
+        Asks for a snapshot, which is where the journal gets compacted
+        """
+        if self.request_snapshot is not None:
+            self.request_snapshot()
+
+    def pause(self):
+        """
+        Stops recording, used while replaying the journal
+        """
+        self._paused = True
+
+    def resume(self):
+        """
+        Starts recording again
+        """
+        self._paused = False
+
+    # -------------------------------------------- FLUSHING ---------------------------------------------- #
+    def start(self, widget):
+        """
+        Starts flushing periodically
+
+        :param widget: The widget whose event loop runs the timer
+        """
+        self._widget = widget
+        if self._job is None:
+            self._job = widget.after(self.flush_interval, self._tick)
+
+    def stop(self):
+        """
+        Stops flushing periodically
+        """
+        if self._job is not None:
+            self._widget.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        """
+        Periodic flush
+        """
+        self._job = None
+        self.flush()
+        self.start(self._widget)
+
+    def flush(self):
+        """
+        Hands the buffered records to the writer thread as one batch. Returns right away.
+        """
+        if self._buffer:
+            self._queue.put(("append", self.generation, bytes(self._buffer)))
+            self._buffer.clear()
+
+    def rotate(self, generation: int):
+        """
+        Starts a new segment. Called on the UI thread right when the snapshot of a generation is taken, so that
+        the new segment holds exactly the edits made after the snapshot.
+
+        :param generation: The generation of the snapshot
+        """
+        self.flush()
+        self.generation = generation
+        self._size = 0
+
+    def discard_before(self, generation: int):
+        """
+        Deletes the segments older than a snapshot. Called once the snapshot is on disk.
+
+        :param generation: The generation of the snapshot
+        """
+        self._queue.put(("discard", generation, None))
+
+    def wait(self):
+        """
+        Waits until everything handed to the writer thread is done
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Writes the last records and stops the writer thread
+        """
+        self.stop()
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        self._tile_map.listeners.remove(self._handle_change)
+
+    # --------------------------------------------- WRITER ----------------------------------------------- #
+    def _run(self):
+        """
+        Writer thread
+        """
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                action, generation, payload = task
+                if action == "append":
+                    self._append(generation, payload)
+                else:
+                    self._discard(generation)
+            except OSError as error:
+                self.last_error = error
+            finally:
+                self._queue.task_done()
+
+    def _append(self, generation, payload):
+        """
+        Appends a batch of records to a segment and waits for it to reach the disk
+
+        :param generation: The generation of the segment
+        :param payload: The packed records
+        """
+        path = segment_path(self.directory, generation)
+        created = not os.path.exists(path)
+        if created:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as file:
+            file.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            file.flush()
+            os.fsync(file.fileno())
+        if created:
+            map_file.fsync_directory(os.path.dirname(path))
+
+    def _discard(self, generation):
+        """
+        Deletes the segments older than a generation
+
+        :param generation: The generation
+        """
+        for segment in list_segments(self.directory):
+            if segment < generation:
+                os.remove(segment_path(self.directory, segment))
@@ -0,0 +1,215 @@
+from tilemap.chunk import Chunk, CHUNK_SIZE
+
+
+def chunk_of(cell):
+    """
+    Splits a cell position into the position of its chunk and its position inside the chunk
+
+    :param cell: The cell position (x, y)
+    :return: (chunk position, local position)
+    """
+    return (cell[0] // CHUNK_SIZE, cell[1] // CHUNK_SIZE), (cell[0] % CHUNK_SIZE, cell[1] % CHUNK_SIZE)
+
+
+class Layer:
+    def __init__(self, lid: int, name: str, visible: bool = True, locked: bool = False, static: bool = False):
+        """
+        A layer of the tile map. Tiles are stored in chunks that are created when the first tile is placed in them
+        and dropped when they become empty.
+
+        A locked layer can't be edited. Locked and static layers are drawn from cached chunk bitmaps instead of
+        one canvas item per tile.
+
+        :param lid: The id of the layer, unique within the map
+        :param name: The name shown to the user
+        :param visible: Whether the layer is shown
+        :param locked: Whether the layer can be edited
+        :param static: Whether the layer is drawn from chunk bitmaps even when it is not locked
+        """
+        self.lid = lid
+        self.name = name
+        self.visible = visible
+        self.locked = locked
+        self.static = static
+        self.chunks = {}    # Chunk position -> Chunk
+        # The widest and tallest spans of the tiles placed so far, bounds the search in find_tile
+        self.max_span = (1, 1)
+        # Chunk position -> bytearray of terrain ids (0 for none), only for chunks that have terrain painted
+        self.terrain = {}
+        # Chunk position -> number of terrain changes, used to know when saved terrain is out of date
+        self.terrain_versions = {}
+        # Called as on_change(op, layer, cell, *values) after every edit, set by the tile map
+        self.on_change = None
+
+    def is_composited(self):
+        """
+        Checks whether the layer is drawn from cached chunk bitmaps
+
+        :return: True if it is, False otherwise
+        """
+        return self.locked or self.static
+
+    def get_tile(self, cell):
+        """
+        Get the tile anchored at a cell
+
+        :param cell: The cell position (x, y)
+        :return: (asset, span) or None if there is no tile
+        """
+        position, local = chunk_of(cell)
+        chunk = self.chunks.get(position)
+        if chunk is None:
+            return None
+        return chunk.get(local)
+
+    def find_tile(self, cell):
+        """
+        Finds the tile covering a cell: the tile anchored at it, or else a bigger tile anchored above or to the
+        left of it. Only the chunks close enough to hold such a tile are searched, see max_span.
+
+        :param cell: The cell position (x, y)
+        :return: The cell the tile is anchored at, None if no tile covers the cell
+        """
+        if self.get_tile(cell) is not None:
+            return cell
+        x, y = cell
+        width, height = self.max_span
+        found = None
+        for cx in range((x - width + 1) // CHUNK_SIZE, x // CHUNK_SIZE + 1):
+            for cy in range((y - height + 1) // CHUNK_SIZE, y // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                for index, span in chunk.spans.items():
+                    local = Chunk.local(index)
+                    anchor = cx * CHUNK_SIZE + local[0], cy * CHUNK_SIZE + local[1]
+                    # Of overlapping tiles, the one anchored last in reading order is on top
+                    if 0 <= x - anchor[0] < span[0] and 0 <= y - anchor[1] < span[1] \
+                            and (found is None or anchor[::-1] > found[::-1]):
+                        found = anchor
+        return found
+
+    def grow_max_span(self, span):
+        """
+        Makes max_span big enough for a tile
+
+        :param span: The size of the tile in cells (width, height)
+        """
+        if span[0] > self.max_span[0] or span[1] > self.max_span[1]:
+            self.max_span = max(self.max_span[0], span[0]), max(self.max_span[1], span[1])
+
+    def get_transform(self, cell) -> int:
+        """
+        Get the transform of the tile anchored at a cell
+
+        :param cell: The cell position (x, y)
+        :return: The transform, 0 if the tile isn't transformed or there is no tile
+        """
+        position, local = chunk_of(cell)
+        chunk = self.chunks.get(position)
+        if chunk is None:
+            return 0
+        return chunk.get_transform(local)
+
+    def set_tile(self, cell, asset: int, span=(1, 1), transform: int = 0):
+        """
+        Anchor a tile at a cell, replacing the tile that was there
+
+        :param cell: The cell position (x, y)
+        :param asset: The asset id
+        :param span: The size of the tile in cells (width, height), once transformed
+        :param transform: The flips and rotation of the sprite, see tilemap.transform
+        :return: The chunk that was changed
+        """
+        position, local = chunk_of(cell)
+        chunk = self.chunks.get(position)
+        if chunk is None:
+            chunk = self.chunks[position] = Chunk(position)
+        chunk.set(local, asset, span, transform)
+        self.grow_max_span(span)
+        if self.on_change is not None:
+            self.on_change("tile", self, cell, asset, span, transform)
+        return chunk
+
+    def set_tiles(self, tiles):
+        """
+        Anchor many tiles at once, like set_tile but with a single notification for all of them
+
+        :param tiles: A list of (cell, asset, span, transform)
+        :return: The positions of the chunks that were changed
+        """
+        changed = set()
+        for cell, asset, span, transform in tiles:
+            position, local = chunk_of(cell)
+            chunk = self.chunks.get(position)
+            if chunk is None:
+                chunk = self.chunks[position] = Chunk(position)
+            chunk.set(local, asset, span, transform)
+            self.grow_max_span(span)
+            changed.add(position)
+        if tiles and self.on_change is not None:
+            self.on_change("tiles", self, tiles)
+        return changed
+
+    def remove_tile(self, cell):
+        """
+        Remove the tile anchored at a cell
+
+        :param cell: The cell position (x, y)
+        :return: (asset, span) of the removed tile, or None if there was none
+        """
+        position, local = chunk_of(cell)
+        chunk = self.chunks.get(position)
+        if chunk is None:
+            return None
+
+        tile = chunk.remove(local)
+        if chunk.is_empty():
+            del self.chunks[position]
+        if tile is not None and self.on_change is not None:
+            self.on_change("remove", self, cell)
+        return tile
+
+    def get_terrain(self, cell) -> int:
+        """
+        Get the terrain painted at a cell
+
+        :param cell: The cell position (x, y)
+        :return: The terrain id, 0 if there is none
+        """
+        position, local = chunk_of(cell)
+        terrain = self.terrain.get(position)
+        if terrain is None:
+            return 0
+        return terrain[Chunk.index(local)]
+
+    def set_terrain(self, cell, tid: int):
+        """
+        Paint a terrain at a cell. The tile of the cell is left to the autotiler.
+
+        :param cell: The cell position (x, y)
+        :param tid: The terrain id, 0 to clear it
+        """
+        position, local = chunk_of(cell)
+        terrain = self.terrain.get(position)
+        if terrain is None:
+            if tid == 0:
+                return
+            terrain = self.terrain[position] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        terrain[Chunk.index(local)] = tid
+        self.terrain_versions[position] = self.terrain_versions.get(position, 0) + 1
+        if self.on_change is not None:
+            self.on_change("terrain", self, cell, tid)
+
+        if tid == 0 and not any(terrain):
+            del self.terrain[position]
+
+    def tiles(self):
+        """
+        Iterates over every tile of the layer
+
+        :return: A generator of (cell, asset, span)
+        """
+        for (cx, cy), chunk in self.chunks.items():
+            for local, asset, span in chunk.tiles():
+                yield (cx * CHUNK_SIZE + local[0], cy * CHUNK_SIZE + local[1]), asset, span
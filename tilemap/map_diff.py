@@ -0,0 +1,203 @@
+from array import array
+from tilemap.chunk import Chunk, CHUNK_SIZE, EMPTY
+
+_EMPTY_CELLS = array("i", [EMPTY]) * (CHUNK_SIZE * CHUNK_SIZE)
+
+
+def asset_keys(tile_map):
+    """
+    Get the keys that identify the assets of a map across maps. Asset ids are only meaningful within one map.
+
+    :param tile_map: The tile map
+    :return: A list of asset id -> pixel hash (or file hash for sprites that weren't hashed)
+    """
+    return [sprite.pixel_hash or sprite.content_hash or id(sprite) for sprite in tile_map.assets]
+
+
+class MapDiff:
+    def __init__(self):
+        """
+        The differences between two versions of a map. Tiles are given as (asset key, span, transform), or None for
+        an empty cell, so that they can be compared and applied across maps.
+        """
+        self.changes = {}           # (lid, cell) -> (tile before, tile after)
+        self.added_layers = []      # Ids of the layers only in the second map
+        self.removed_layers = []    # Ids of the layers only in the first map
+        self.chunks_compared = 0    # Chunks compared cell by cell
+        self.chunks_skipped = 0     # Chunks skipped because their hashes matched
+
+    def __len__(self):
+        return len(self.changes) + len(self.added_layers) + len(self.removed_layers)
+
+    def get_layer_changes(self, lid: int):
+        """
+        Get the changes of a layer
+
+        :param lid: The layer id
+        :return: A dict of cell -> (tile before, tile after)
+        """
+        return {cell: change for (layer, cell), change in self.changes.items() if layer == lid}
+
+
+class MergeResult:
+    def __init__(self):
+        """
+        The outcome of a three-way merge
+        """
+        self.applied = 0            # Cells changed in the merged map
+        self.conflicts = []         # (lid, cell, base tile, our tile, their tile), our tile was kept
+        self.layer_conflicts = []   # Ids of layers added, removed or edited on both sides incompatibly
+
+
+# ----------------------------------------------- DIFF ----------------------------------------------- #
+def diff_maps(before, after) -> MapDiff:
+    """
+    Compares two versions of a map. Layers are matched by id. Chunks whose content hashes match are skipped
+    without looking at their cells, so the cost is in the number of chunks that differ, not the size of the maps.
+
+    Hashes are computed over asset ids, so they can only be compared when both maps give the same ids to the
+    same assets, which holds for versions of the same map since assets are only ever appended. Otherwise every
+    chunk is compared cell by cell.
+
+    Terrain isn't compared, the tiles it produced are.
+
+    :param before: The first map
+    :param after: The second map
+    :return: The differences
+    """
+    diff = MapDiff()
+    keys_before, keys_after = asset_keys(before), asset_keys(after)
+    shared = min(len(keys_before), len(keys_after))
+    same_ids = keys_before[:shared] == keys_after[:shared]
+
+    layers_after = {layer.lid: layer for layer in after.layers}
+    for layer in before.layers:
+        other = layers_after.pop(layer.lid, None)
+        if other is None:
+            diff.removed_layers.append(layer.lid)
+        else:
+            _diff_layer(diff, layer, other, keys_before, keys_after, same_ids)
+    diff.added_layers = list(layers_after)
+    return diff
+
+
+def _diff_layer(diff, layer, other, keys_before, keys_after, same_ids):
+    """
+    Compares two versions of a layer
+
+    :param diff: The diff to add to
+    :param layer: The first version
+    :param other: The second version
+    :param keys_before: The asset keys of the first map
+    :param keys_after: The asset keys of the second map
+    :param same_ids: Whether the maps give the same ids to the same assets
+    """
+    chunks, other_chunks = layer.chunks, other.chunks
+    for position in set(chunks).union(other_chunks):
+        chunk, other_chunk = chunks.get(position), other_chunks.get(position)
+        if chunk is other_chunk or (same_ids and chunk is not None and other_chunk is not None
+                                    and chunk.content_hash() == other_chunk.content_hash()):
+            diff.chunks_skipped += 1
+            continue
+        diff.chunks_compared += 1
+        _diff_chunk(diff, layer.lid, position, chunk, other_chunk, keys_before, keys_after, same_ids)
+
+
+def _diff_chunk(diff, lid, position, chunk, other_chunk, keys_before, keys_after, same_ids):
+    """
+    Compares two versions of a chunk cell by cell. Either can be None for a chunk without tiles.
+
+    :param diff: The diff to add to
+    :param lid: The layer id
+    :param position: The chunk position
+    :param chunk: The first version
+    :param other_chunk: The second version
+    :param keys_before: The asset keys of the first map
+    :param keys_after: The asset keys of the second map
+    :param same_ids: Whether the maps give the same ids to the same assets
+    """
+    cells, spans, transforms = (_EMPTY_CELLS, {}, {}) if chunk is None else \
+        (chunk.cells, chunk.spans, chunk.transforms)
+    other_cells, other_spans, other_transforms = (_EMPTY_CELLS, {}, {}) if other_chunk is None else \
+        (other_chunk.cells, other_chunk.spans, other_chunk.transforms)
+    left, top = position[0] * CHUNK_SIZE, position[1] * CHUNK_SIZE
+
+    for index, (asset, other_asset) in enumerate(zip(cells, other_cells)):
+        if asset == other_asset and (asset == EMPTY or same_ids) and spans.get(index) == other_spans.get(index) \
+                and transforms.get(index) == other_transforms.get(index):
+            continue
+        tile = None if asset == EMPTY else \
+            (keys_before[asset], spans.get(index, (1, 1)), transforms.get(index, 0))
+        other_tile = None if other_asset == EMPTY else \
+            (keys_after[other_asset], other_spans.get(index, (1, 1)), other_transforms.get(index, 0))
+        if tile != other_tile:
+            x, y = Chunk.local(index)
+            diff.changes[(lid, (left + x, top + y))] = tile, other_tile
+
+
+# ----------------------------------------------- MERGE ---------------------------------------------- #
+def merge_maps(base, ours, theirs) -> MergeResult:
+    """
+    Three-way merge: the changes made in theirs since base are applied to ours, which is edited in place.
+
+    A cell changed on both sides to different tiles is a conflict and keeps our tile. Layers added in theirs are
+    added to ours, layers removed in theirs are removed from ours unless we edited them.
+
+    :param base: The common ancestor of both maps
+    :param ours: Our version, receives the merge
+    :param theirs: Their version
+    :return: The merge result
+    """
+    result = MergeResult()
+    our_diff = diff_maps(base, ours)
+    their_diff = diff_maps(base, theirs)
+
+    our_ids = {}
+    for aid, key in enumerate(asset_keys(ours)):
+        our_ids.setdefault(key, aid)
+    their_keys = asset_keys(theirs)
+    their_sprites = dict(zip(their_keys, theirs.assets))
+
+    def get_asset(key):
+        aid = our_ids.get(key)
+        if aid is None:
+            aid = our_ids[key] = ours.register_asset(their_sprites[key])
+        return aid
+
+    for (lid, cell), (before, after) in their_diff.changes.items():
+        our_change = our_diff.changes.get((lid, cell))
+        layer = ours.get_layer(lid)
+        if our_change is not None or layer is None:
+            mine = None if our_change is None else our_change[1]
+            if layer is None or mine != after:
+                result.conflicts.append((lid, cell, before, mine, after))
+            continue
+
+        if after is None:
+            layer.remove_tile(cell)
+        else:
+            layer.set_tile(cell, get_asset(after[0]), after[1], after[2])
+        result.applied += 1
+
+    for lid in their_diff.added_layers:
+        if ours.get_layer(lid) is not None:
+            # We added a layer with the same id
+            result.layer_conflicts.append(lid)
+            continue
+        source = theirs.get_layer(lid)
+        layer = ours.add_layer(source.name, lid=lid, visible=source.visible, locked=source.locked,
+                               static=source.static)
+        for cell, asset, span in source.tiles():
+            layer.set_tile(cell, get_asset(their_keys[asset]), span, source.get_transform(cell))
+            result.applied += 1
+
+    edited = {lid for lid, _ in our_diff.changes}
+    for lid in their_diff.removed_layers:
+        layer = ours.get_layer(lid)
+        if layer is None:
+            continue
+        if lid in edited:
+            result.layer_conflicts.append(lid)
+        else:
+            ours.remove_layer(layer)
+    return result
@@ -0,0 +1,333 @@
+import json
+import os
+import struct
+import sys
+import warnings
+from array import array
+from tilemap.chunk import Chunk, CHUNK_SIZE, EMPTY
+from tilemap.tile_map import TileMap
+
+# A saved map is a directory:
+#   map.json                    The manifest: layers, assets and terrains
+#   assets/<pixel hash>.png     The pixels of every asset, written once
+#   chunks/<lid>/<x>_<y>.<generation>.chunk
+#                               One file per chunk, so that saving only rewrites the chunks that changed. A chunk
+#                               written by a snapshot is named after its generation and the manifest lists the file
+#                               of every chunk, so a manifest is never read with the chunks of a later snapshot.
+# Version 2 added the transforms of flipped and rotated tiles, version 3 the generations of the chunk files. Before
+# version 3, chunk files were named <x>_<y>.chunk and every file of a layer directory was loaded.
+FORMAT_VERSION = 3
+MANIFEST = "map.json"
+ASSETS_DIR = "assets"
+CHUNKS_DIR = "chunks"
+
+_CHUNK_MAGIC = b"TMCK"
+_CHUNK_HEADER = struct.Struct("<4sBiiH?")     # magic, format version, x, y, number of spans, has terrain
+_SPAN = struct.Struct("<HBB")                 # cell index, width, height
+_COUNT = struct.Struct("<H")
+_TRANSFORM = struct.Struct("<HB")             # cell index, transform
+CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+
+# ---------------------------------------------- CHUNKS ---------------------------------------------- #
+def encode_chunk(position, cells: array, spans: dict, terrain=None, transforms: dict = None) -> bytes:
+    """
+    Packs a chunk into its binary form. Cells are stored as little endian 32 bit asset ids.
+
+    :param position: The chunk position (x, y)
+    :param cells: The cell array of the chunk
+    :param spans: Cell index -> (width, height) for tiles bigger than a cell
+    :param terrain: The terrain ids of the chunk, None if it has none
+    :param transforms: Cell index -> transform for flipped or rotated tiles
+    :return: The bytes
+    """
+    transforms = transforms or {}
+    if sys.byteorder == "big":
+        cells = array("i", cells)
+        cells.byteswap()
+
+    data = bytearray(_CHUNK_HEADER.pack(_CHUNK_MAGIC, FORMAT_VERSION, position[0], position[1], len(spans),
+                                        terrain is not None))
+    data += cells.tobytes()
+    for index, span in sorted(spans.items()):
+        data += _SPAN.pack(index, *span)
+    data += _COUNT.pack(len(transforms))
+    for index, transform in sorted(transforms.items()):
+        data += _TRANSFORM.pack(index, transform)
+    if terrain is not None:
+        data += terrain
+    return bytes(data)
+
+
+def decode_chunk(data: bytes):
+    """
+    Unpacks a chunk packed by encode_chunk
+
+    :param data: The bytes
+    :return: (position, cell array, spans, terrain bytearray or None, transforms)
+    """
+    magic, version, x, y, span_count, has_terrain = _CHUNK_HEADER.unpack_from(data)
+    if magic != _CHUNK_MAGIC or version > FORMAT_VERSION:
+        raise ValueError("Not a chunk file, or written by a newer version")
+
+    offset = _CHUNK_HEADER.size
+    cells = array("i")
+    cells.frombytes(data[offset:offset + CELLS * 4])
+    if sys.byteorder == "big":
+        cells.byteswap()
+    offset += CELLS * 4
+
+    spans = {}
+    for _ in range(span_count):
+        index, width, height = _SPAN.unpack_from(data, offset)
+        spans[index] = (width, height)
+        offset += _SPAN.size
+
+    transforms = {}
+    if version >= 2:
+        transform_count, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        for _ in range(transform_count):
+            index, transform = _TRANSFORM.unpack_from(data, offset)
+            transforms[index] = transform
+            offset += _TRANSFORM.size
+
+    terrain = bytearray(data[offset:offset + CELLS]) if has_terrain else None
+    return (x, y), cells, spans, terrain, transforms
+
+
+def chunk_path(directory: str, lid: int, position, generation: int = None) -> str:
+    """
+    The path of a chunk file
+
+    :param directory: The map directory
+    :param lid: The layer id
+    :param position: The chunk position (x, y)
+    :param generation: The generation of the snapshot that wrote the file, None for maps saved before version 3
+    :return: The path
+    """
+    if generation is None:
+        name = "{}_{}.chunk".format(*position)
+    else:
+        name = "{}_{}.{}.chunk".format(position[0], position[1], generation)
+    return os.path.join(directory, CHUNKS_DIR, str(lid), name)
+
+
+def chunk_key(position) -> str:
+    """
+    The key of a chunk in the chunk list of the manifest
+
+    :param position: The chunk position (x, y)
+    :return: The key, "x_y"
+    """
+    return "{}_{}".format(*position)
+
+
+def list_chunks(manifest: dict):
+    """
+    Lists the chunk files named by a manifest
+
+    :param manifest: The manifest
+    :return: A dict of layer id -> {chunk position: generation of the file}, None for manifests older than
+    version 3
+    """
+    if "chunks" not in manifest:
+        return None
+    files = {}
+    for lid, chunks in manifest["chunks"].items():
+        layer_files = files[int(lid)] = {}
+        for key, generation in chunks.items():
+            x, y = key.split("_")
+            layer_files[(int(x), int(y))] = generation
+    return files
+
+
+def asset_path(directory: str, key: str) -> str:
+    """
+    The path of an asset image
+
+    :param directory: The map directory
+    :param key: The pixel hash of the image
+    :return: The path
+    """
+    return os.path.join(directory, ASSETS_DIR, key + ".png")
+
+
+# ---------------------------------------------- FILES ----------------------------------------------- #
+def write_file(path: str, data: bytes, fsync: bool = True):
+    """
+    Writes a file atomically: the data goes to a temporary file which then replaces the file, so a crash leaves
+    either the old or the new file behind, never a half written one.
+
+    :param path: The path
+    :param data: The content
+    :param fsync: Whether to wait for the data to reach the disk
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def fsync_directory(path: str):
+    """
+    Makes the creation, renaming and removal of files in a directory durable. Does nothing where directories
+    can't be opened, like on Windows.
+
+    :param path: The directory
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_manifest(directory: str) -> dict:
+    """
+    Reads the manifest of a saved map
+
+    :param directory: The map directory
+    :return: The manifest
+    """
+    with open(os.path.join(directory, MANIFEST), "r") as file:
+        manifest = json.load(file)
+    if manifest.get("format", 0) > FORMAT_VERSION:
+        raise ValueError("The map was saved by a newer version")
+    return manifest
+
+
+def exists(directory: str) -> bool:
+    """
+    Checks whether a directory holds a saved map
+
+    :param directory: The directory
+    :return: True if it does, False otherwise
+    """
+    return os.path.isfile(os.path.join(directory, MANIFEST))
+
+
+# ---------------------------------------------- LOADING --------------------------------------------- #
+def load_map(directory: str) -> TileMap:
+    """
+    Loads a saved map. Asset images are only decoded once they are drawn.
+
+    :param directory: The map directory
+    :return: The tile map
+    """
+    # Imported here so that saving a map doesn't need PIL
+    from sprite.sprite import Sprite
+    from sprite.animated_sprite import AnimatedSprite
+    from tilemap.autotile import TerrainSet
+    from tilemap.stamp import Stamp
+
+    manifest = read_manifest(directory)
+    sprites = {}
+
+    def get_sprite(key):
+        sprite = sprites.get(key)
+        if sprite is None:
+            sprite = sprites[key] = Sprite.from_file(asset_path(directory, key), key)
+            sprite.pixel_hash = key
+            sprite.source = None
+        return sprite
+
+    def get_asset(entry):
+        if "frames" not in entry:
+            return get_sprite(entry["hash"])
+        if entry["hash"] not in sprites:
+            animation = AnimatedSprite([get_sprite(key) for key in entry["frames"]], entry["durations"])
+            animation.pixel_hash = entry["hash"]
+            sprites[entry["hash"]] = animation
+        return sprites[entry["hash"]]
+
+    tile_map = TileMap()
+    for entry in manifest["assets"]:
+        sprite = get_asset(entry)
+        if "source" in entry and not sprite.is_animated():
+            sprite.source = entry["source"]
+        tile_map.restore_asset(sprite)
+
+    for entry in manifest["terrains"]:
+        terrain_set = TerrainSet(entry["name"], get_sprite(entry["default"]))
+        for key, same, different in entry["rules"]:
+            terrain_set.add_rule(get_sprite(key), same, different)
+        tile_map.register_terrain(terrain_set)
+
+    # Tiles of assets the manifest doesn't list, from a hand edited map or one whose save was cut off, are dropped
+    # so that drawing the map can't fail on them
+    asset_count = len(tile_map.assets)
+    dropped = 0
+    files = list_chunks(manifest)
+    for entry in manifest["layers"]:
+        layer = tile_map.add_layer(entry["name"], lid=entry["lid"], visible=entry["visible"],
+                                   locked=entry["locked"], static=entry["static"])
+        dropped += load_chunks(directory, layer, None if files is None else files.get(layer.lid, {}), asset_count)
+
+    # Maps saved before stamps existed have none
+    for entry in manifest.get("stamps", []):
+        tiles = [tile for tile in entry["tiles"] if 0 <= tile[3] < asset_count]
+        dropped += len(entry["tiles"]) - len(tiles)
+        tile_map.add_stamp(Stamp.from_dict(dict(entry, tiles=tiles)))
+
+    if dropped:
+        warnings.warn("{}: dropped {} tiles of unknown assets".format(directory, dropped))
+
+    active = tile_map.get_layer(manifest.get("active_layer"))
+    if active is not None:
+        tile_map.set_active_layer(active)
+    return tile_map
+
+
+def load_chunks(directory: str, layer, files=None, asset_count: int = None) -> int:
+    """
+    Reads the chunk files of a layer into it
+
+    :param directory: The map directory
+    :param layer: The layer
+    :param files: The chunk files of the layer named by the manifest, chunk position -> generation, see
+    list_chunks. None to read every file of the layer directory, for maps saved before version 3.
+    :param asset_count: The number of assets of the map, tiles of other asset ids are dropped. None to keep every
+    tile.
+    :return: The number of tiles dropped
+    """
+    if files is None:
+        layer_dir = os.path.join(directory, CHUNKS_DIR, str(layer.lid))
+        if not os.path.isdir(layer_dir):
+            return 0
+        paths = [os.path.join(layer_dir, name) for name in os.listdir(layer_dir) if name.endswith(".chunk")]
+    else:
+        paths = [chunk_path(directory, layer.lid, position, generation) for position, generation in files.items()]
+
+    dropped = 0
+    for path in paths:
+        with open(path, "rb") as file:
+            position, cells, spans, terrain, transforms = decode_chunk(file.read())
+
+        # min and max run in C, the cells are only walked for chunks that do hold unknown ids
+        if asset_count is not None and (min(cells) < EMPTY or max(cells) >= asset_count):
+            for index, asset in enumerate(cells):
+                if asset != EMPTY and not 0 <= asset < asset_count:
+                    cells[index] = EMPTY
+                    spans.pop(index, None)
+                    transforms.pop(index, None)
+                    dropped += 1
+
+        count = CELLS - cells.count(EMPTY)
+        if count:
+            chunk = Chunk(position)
+            chunk.cells, chunk.spans, chunk.transforms, chunk.count = cells, spans, transforms, count
+            layer.chunks[position] = chunk
+            for span in spans.values():
+                layer.grow_max_span(span)
+        if terrain is not None and any(terrain):
+            layer.terrain[position] = terrain
+    return dropped
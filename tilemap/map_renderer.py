@@ -0,0 +1,170 @@
+from PIL import Image
+from sprite.sprite import DEFAULT_RESAMPLE, expand_image, get_resample_filter, transform_image
+from tilemap.chunk import Chunk, CHUNK_SIZE
+from tilemap.transform import transform_size
+
+
+class MapRenderer:
+    def __init__(self, resample=DEFAULT_RESAMPLE, max_cached: int = 4096):
+        """
+        Renders tile maps to images without a window. Scaled sprites are kept in a cache keyed by pixel hash, size
+        and transform, so one renderer can go through many maps that share a tileset and scale each sprite once.
+
+        :param resample: The resampling filter the sprites are scaled with
+        :param max_cached: The number of scaled sprites to keep
+        """
+        self.resample = get_resample_filter(resample)
+        self.max_cached = max_cached
+        self._cache = {}    # (pixel hash, size, transform) -> RGBA image
+        self.hits = 0
+        self.misses = 0
+
+    def get_scaled(self, sprite, size, transform: int = 0):
+        """
+        Get a sprite scaled to a size, in RGBA. Animated sprites show their first frame.
+
+        :param sprite: The sprite
+        :param size: The size (width, height), once transformed
+        :param transform: The flips and rotation, see tilemap.transform
+        :return: The image
+        """
+        key = sprite.pixel_hash or sprite.content_hash or id(sprite), size, transform
+        image = self._cache.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        if transform:
+            image = transform_image(self.get_scaled(sprite, transform_size(size, transform)), transform)
+        else:
+            image = expand_image(sprite._original).resize(size, self.resample)
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+        if len(self._cache) >= self.max_cached:
+            self._cache.clear()
+        self._cache[key] = image
+        return image
+
+    @staticmethod
+    def get_bounds(tile_map):
+        """
+        Get the cells covered by the visible layers, including the tiles sticking out of their anchor cell
+
+        :param tile_map: The tile map
+        :return: (x0, y0, x1, y1) with x1 and y1 exclusive, None if there are no tiles
+        """
+        bounds = None
+        for layer in tile_map.layers:
+            if not layer.visible:
+                continue
+            for (x, y), _, span in layer.tiles():
+                if bounds is None:
+                    bounds = [x, y, x + span[0], y + span[1]]
+                else:
+                    bounds = [min(bounds[0], x), min(bounds[1], y),
+                              max(bounds[2], x + span[0]), max(bounds[3], y + span[1])]
+        return None if bounds is None else tuple(bounds)
+
+    def render_map(self, tile_map, grid_size: int, bounds=None):
+        """
+        Renders the visible layers of a map into one image, cropped to the tiles
+
+        :param tile_map: The tile map
+        :param grid_size: The size of a cell in pixels
+        :param bounds: The cells covered by the tiles if they are already known, see get_bounds
+        :return: (image or None if the map is empty, number of tiles drawn)
+        """
+        if bounds is None:
+            bounds = self.get_bounds(tile_map)
+        if bounds is None:
+            return None, 0
+
+        image = Image.new("RGBA", ((bounds[2] - bounds[0]) * grid_size, (bounds[3] - bounds[1]) * grid_size))
+        return image, self._draw(tile_map, grid_size, image, bounds[:2])
+
+    def render_chunks(self, tile_map, grid_size: int):
+        """
+        Renders the visible layers of a map into one image per chunk, for tiled viewers. Chunks are rendered one
+        at a time, every layer of a chunk before the next chunk, so only one image is held however big the map is.
+        Tiles sticking out of their chunk are drawn in every chunk they cover.
+
+        :param tile_map: The tile map
+        :param grid_size: The size of a cell in pixels
+        :return: A generator of (chunk position, image, number of tiles anchored in the chunk)
+        """
+        layers = [layer for layer in tile_map.layers if layer.visible]
+        positions = set()
+        for layer in layers:
+            for position, chunk in layer.chunks.items():
+                positions.add(position)
+                for index, span in chunk.spans.items():
+                    local = Chunk.local(index)
+                    cell = position[0] * CHUNK_SIZE + local[0], position[1] * CHUNK_SIZE + local[1]
+                    positions.update((cx, cy)
+                                     for cx in range(position[0], (cell[0] + span[0] - 1) // CHUNK_SIZE + 1)
+                                     for cy in range(position[1], (cell[1] + span[1] - 1) // CHUNK_SIZE + 1))
+
+        side = CHUNK_SIZE * grid_size
+        for position in sorted(positions):
+            image = Image.new("RGBA", (side, side))
+            origin = position[0] * CHUNK_SIZE, position[1] * CHUNK_SIZE
+            count = 0
+            for layer in layers:
+                # Tiles reaching into the chunk are anchored in it or in the chunks above and to the left of it
+                reach_x = (layer.max_span[0] + CHUNK_SIZE - 2) // CHUNK_SIZE
+                reach_y = (layer.max_span[1] + CHUNK_SIZE - 2) // CHUNK_SIZE
+                for cx in range(position[0] - reach_x, position[0] + 1):
+                    for cy in range(position[1] - reach_y, position[1] + 1):
+                        chunk = layer.chunks.get((cx, cy))
+                        if chunk is None:
+                            continue
+                        if (cx, cy) == position:
+                            tiles = chunk.tiles()
+                            count += chunk.count
+                        else:
+                            tiles = [(Chunk.local(index), chunk.cells[index], span)
+                                     for index, span in chunk.spans.items()]
+                        for local, asset, span in tiles:
+                            cell = cx * CHUNK_SIZE + local[0], cy * CHUNK_SIZE + local[1]
+                            if cell[0] + span[0] > origin[0] and cell[1] + span[1] > origin[1]:
+                                self._draw_tile(tile_map, layer, image, origin, cell, asset, span, grid_size)
+            yield position, image, count
+
+    def _draw(self, tile_map, grid_size, image, origin):
+        """
+        Draws the tiles of the visible layers, bottom layer first
+
+        :param tile_map: The tile map
+        :param grid_size: The size of a cell in pixels
+        :param image: The image to draw on
+        :param origin: The cell at the top left corner of the image
+        :return: The number of tiles drawn
+        """
+        count = 0
+        for layer in tile_map.layers:
+            if not layer.visible:
+                continue
+            for cell, asset, span in layer.tiles():
+                self._draw_tile(tile_map, layer, image, origin, cell, asset, span, grid_size)
+                count += 1
+        return count
+
+    def _draw_tile(self, tile_map, layer, image, origin, cell, asset, span, grid_size):
+        """
+        Draws a tile, cutting off the part outside the image
+
+        :param tile_map: The tile map
+        :param layer: The layer of the tile
+        :param image: The image to draw on
+        :param origin: The cell at the top left corner of the image
+        :param cell: The cell the tile is anchored at
+        :param asset: The asset id
+        :param span: The size of the tile in cells
+        :param grid_size: The size of a cell in pixels
+        """
+        scaled = self.get_scaled(tile_map.get_asset(asset), (span[0] * grid_size, span[1] * grid_size),
+                                 layer.get_transform(cell))
+        x, y = (cell[0] - origin[0]) * grid_size, (cell[1] - origin[1]) * grid_size
+        # alpha_composite doesn't take negative offsets, so the part outside the image is cut off
+        image.alpha_composite(scaled, (max(0, x), max(0, y)), (max(0, -x), max(0, -y)))
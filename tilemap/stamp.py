@@ -0,0 +1,134 @@
+GHOST_ALPHA = 100   # Opacity of the ghost of a stamp, like the ghost of a single sprite
+
+
+class Stamp:
+    def __init__(self, name: str, tiles):
+        """
+        A group of tiles, over one or more layers, that is placed as a whole. Stamps only hold asset ids, so they
+        belong to the map the assets are registered in.
+
+        :param name: The name shown to the user
+        :param tiles: A list of (layer id, cell, asset, span, transform), cells relative to the top left corner
+        """
+        self.name = name
+        self.tiles = [(lid, tuple(cell), asset, tuple(span), transform)
+                      for lid, cell, asset, span, transform in tiles]
+        # Size in cells (width, height), tiles bigger than a cell included
+        self.size = (max((cell[0] + span[0] for _, cell, _, span, _ in self.tiles), default=0),
+                     max((cell[1] + span[1] for _, cell, _, span, _ in self.tiles), default=0))
+        self._images = {}   # Grid size -> composited image, see get_image
+
+    @classmethod
+    def from_tiles(cls, name: str, tiles):
+        """
+        Creates a stamp from tiles at their position in the map
+
+        :param name: The name shown to the user
+        :param tiles: A list of (layer id, cell, asset, span, transform), cells in map coordinates
+        :return: The stamp, with the cells moved so that the top left tile is at (0, 0)
+        """
+        tiles = list(tiles)
+        origin = min(cell[0] for _, cell, _, _, _ in tiles), min(cell[1] for _, cell, _, _, _ in tiles)
+        return cls(name, [(lid, (cell[0] - origin[0], cell[1] - origin[1]), asset, span, transform)
+                          for lid, cell, asset, span, transform in tiles])
+
+    def remap(self, remap: dict):
+        """
+        Points the tiles of the stamp to new asset ids, see TileMap.deduplicate_assets and TileMap.remove_assets
+
+        :param remap: A dict of old asset id -> new asset id
+        """
+        self.tiles = [(lid, cell, remap.get(asset, asset), span, transform)
+                      for lid, cell, asset, span, transform in self.tiles]
+
+    def get_layer_tiles(self, origin):
+        """
+        Get the tiles of the stamp placed at a cell, grouped by layer
+
+        :param origin: The cell the top left corner of the stamp goes to (x, y)
+        :return: A dict of layer id -> list of (cell, asset, span, transform), ready for Layer.set_tiles
+        """
+        layers = {}
+        for lid, cell, asset, span, transform in self.tiles:
+            layers.setdefault(lid, []).append(((origin[0] + cell[0], origin[1] + cell[1]), asset, span, transform))
+        return layers
+
+    # ---------------------------------------------- IMAGES ---------------------------------------------- #
+    def get_image(self, tile_map, grid_size: int):
+        """
+        Get the tiles of the stamp drawn into one image, layers in the order of the map. Tiles of layers that
+        aren't in the map anymore are drawn on top. Only the image of the last grid size is kept.
+
+        :param tile_map: The tile map the stamp belongs to
+        :param grid_size: The size of a cell in pixels
+        :return: The RGBA image
+        """
+        image = self._images.get(grid_size)
+        if image is not None:
+            return image
+
+        # Imported here so that maps with stamps can be loaded and saved without PIL
+        from PIL import Image
+        order = {layer.lid: index for index, layer in enumerate(tile_map.layers)}
+        image = Image.new("RGBA", (max(1, self.size[0] * grid_size), max(1, self.size[1] * grid_size)))
+        for _, cell, asset, span, transform in sorted(self.tiles, key=lambda tile: order.get(tile[0], len(order))):
+            scaled = tile_map.get_asset(asset).get_scaled((span[0] * grid_size, span[1] * grid_size),
+                                                          transform=transform)
+            if scaled.mode != "RGBA":
+                scaled = scaled.convert("RGBA")
+            image.alpha_composite(scaled, (cell[0] * grid_size, cell[1] * grid_size))
+
+        self._images = {grid_size: image}
+        return image
+
+    def clear_images(self):
+        """
+        Drops the composited image, for when a sprite of the stamp changed
+        """
+        self._images = {}
+
+    def get_ghost_image(self, tile_map, grid_size: int):
+        """
+        Get the image of the stamp with reduced alpha, shown where it would be placed
+
+        :param tile_map: The tile map the stamp belongs to
+        :param grid_size: The size of a cell in pixels
+        :return: The RGBA image
+        """
+        ghost = self.get_image(tile_map, grid_size).copy()
+        # Scaled instead of replaced, so that the gaps between the tiles stay transparent
+        ghost.putalpha(ghost.getchannel("A").point(lambda alpha: alpha * GHOST_ALPHA // 255))
+        return ghost
+
+    def get_preview(self, tile_map, grid_size: int = 32):
+        """
+        Get the sprite shown for the stamp in menus. The tiles are only drawn once the sprite is.
+
+        :param tile_map: The tile map the stamp belongs to
+        :param grid_size: The size of a cell in pixels
+        :return: The sprite
+        """
+        from sprite.sprite import Sprite
+        return Sprite(loader=lambda: self.get_image(tile_map, grid_size))
+
+    # ------------------------------------------- SERIALIZING -------------------------------------------- #
+    def to_dict(self) -> dict:
+        """
+        Describes the stamp for the manifest of a saved map
+
+        :return: The description
+        """
+        return {"name": self.name,
+                "tiles": [[lid, cell[0], cell[1], asset, span[0], span[1], transform]
+                          for lid, cell, asset, span, transform in self.tiles]}
+
+    @classmethod
+    def from_dict(cls, entry: dict):
+        """
+        Creates a stamp from its description in a manifest
+
+        :param entry: The description, see to_dict
+        :return: The stamp
+        """
+        return cls(entry["name"], [(lid, (x, y), asset, (width, height), transform)
+                                   for lid, x, y, asset, width, height, transform in entry["tiles"]])
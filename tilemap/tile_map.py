@@ -0,0 +1,317 @@
+from tilemap.layer import Layer
+
+
+class TileMap:
+    def __init__(self):
+        """
+        The tile map. Holds the layers, ordered from bottom to top, and the assets that the tiles refer to.
+        Tiles only store asset ids, the sprites themselves are kept once in the asset list.
+        """
+        self.layers = []
+        self.assets = []        # Asset id -> Sprite
+        self._asset_ids = {}    # id(Sprite) -> asset id
+        self._pixel_ids = {}    # Pixel hash -> asset id
+        self._aliases = set()   # Ids of merged duplicates, see deduplicate_assets
+        self.terrains = []      # Terrain id - 1 -> TerrainSet, terrain id 0 means no terrain
+        self.stamps = []        # Stamps of the map, see tilemap.stamp
+        self._next_lid = 0
+        self._active = None
+        # Called as listener(op, *args) on every change: ("tile", layer, cell, asset, span, transform),
+        # ("tiles", layer, [(cell, asset, span, transform)]), ("remove", layer, cell), ("terrain", layer, cell, tid),
+        # ("layer", layer), ("asset", asset id) when an asset is added or its pixels changed, ("terrain_set",
+        # terrain id), ("stamp", stamp index) and ("remap", {old asset id: new asset id})
+        self.listeners = []
+
+    def _notify(self, op: str, *args):
+        """
+        Tells the listeners about a change
+
+        :param op: The kind of change
+        :param args: The details of the change
+        """
+        for listener in self.listeners:
+            listener(op, *args)
+
+    # ---------------------------------------------- LAYERS ---------------------------------------------- #
+    def add_layer(self, name: str, index: int = None, lid: int = None, **kwargs) -> Layer:
+        """
+        Creates a layer
+
+        :param name: The name of the layer
+        :param index: Where to insert the layer, on top if None
+        :param lid: The id of the layer, only given when loading a saved map. A new id is used if None.
+        :param kwargs: Flags passed to the layer (visible, locked, static)
+        :return: The new layer
+        """
+        if lid is None:
+            lid = self._next_lid
+        layer = Layer(lid, name, **kwargs)
+        layer.on_change = self._notify
+        self._next_lid = max(self._next_lid, lid + 1)
+
+        if index is None:
+            self.layers.append(layer)
+        else:
+            self.layers.insert(index, layer)
+
+        if self._active is None:
+            self._active = layer
+        self._notify("layer", layer)
+        return layer
+
+    def remove_layer(self, layer: Layer):
+        """
+        Removes a layer and its tiles
+
+        :param layer: The layer to remove
+        """
+        self.layers.remove(layer)
+        if self._active is layer:
+            self._active = self.layers[-1] if self.layers else None
+        self._notify("layer", layer)
+
+    def move_layer(self, layer: Layer, index: int):
+        """
+        Moves a layer in the draw order
+
+        :param layer: The layer to move
+        :param index: The new index, 0 being the bottom
+        """
+        self.layers.remove(layer)
+        self.layers.insert(max(0, min(index, len(self.layers))), layer)
+        self._notify("layer", layer)
+
+    def layer_changed(self, layer: Layer):
+        """
+        Tells the listeners that the name or the flags of a layer changed
+
+        :param layer: The layer
+        """
+        self._notify("layer", layer)
+
+    def get_layer(self, lid: int):
+        """
+        Get a layer by id
+
+        :param lid: The id of the layer
+        :return: The layer, None if there is no such layer
+        """
+        for layer in self.layers:
+            if layer.lid == lid:
+                return layer
+        return None
+
+    def get_active_layer(self):
+        """
+        Get the layer that edits go to
+
+        :return: The active layer
+        """
+        return self._active
+
+    def set_active_layer(self, layer: Layer):
+        """
+        Set the layer that edits go to
+
+        :param layer: The layer
+        """
+        if layer in self.layers:
+            self._active = layer
+
+    def layers_above(self, layer: Layer):
+        """
+        Get the layers drawn above a layer
+
+        :param layer: The layer
+        :return: A list of layers, from the lowest to the highest
+        """
+        return self.layers[self.layers.index(layer) + 1:]
+
+    # ---------------------------------------------- ASSETS ---------------------------------------------- #
+    def get_asset_id(self, sprite):
+        """
+        Get the asset id of a sprite, without adding it to the map
+
+        :param sprite: The sprite
+        :return: The asset id, None if the sprite isn't in the map
+        """
+        aid = self._asset_ids.get(id(sprite))
+        if aid is None and sprite.pixel_hash is not None:
+            # A different sprite object with the same pixels, see SpriteStore
+            aid = self._pixel_ids.get(sprite.pixel_hash)
+        return aid
+
+    def register_asset(self, sprite) -> int:
+        """
+        Get the asset id of a sprite, adding it to the map if it isn't there yet
+
+        :param sprite: The sprite
+        :return: The asset id
+        """
+        aid = self.get_asset_id(sprite)
+        if aid is None:
+            aid = len(self.assets)
+            self.assets.append(sprite)
+            # Only sprites the map keeps are looked up by id, the id of a sprite that was dropped can be reused
+            self._asset_ids[id(sprite)] = aid
+            if sprite.pixel_hash is not None:
+                self._pixel_ids[sprite.pixel_hash] = aid
+            self._notify("asset", aid)
+        return aid
+
+    def restore_asset(self, sprite) -> int:
+        """
+        Appends an asset loaded from a saved map. Unlike register_asset, a sprite that is already in the map gets
+        a new id that aliases the first one, so that the saved ids stay valid.
+
+        :param sprite: The sprite
+        :return: The asset id
+        """
+        aid = len(self.assets)
+        self.assets.append(sprite)
+        first = self._asset_ids.setdefault(id(sprite), aid)
+        if sprite.pixel_hash is not None:
+            first = self._pixel_ids.setdefault(sprite.pixel_hash, first)
+        if first != aid:
+            self._aliases.add(aid)
+        return aid
+
+    def get_asset(self, aid: int):
+        """
+        Get the sprite of an asset
+
+        :param aid: The asset id
+        :return: The sprite
+        """
+        return self.assets[aid]
+
+    def asset_changed(self, aid: int):
+        """
+        Tells the listeners that the pixels of an asset changed, after its sprite was reloaded
+
+        :param aid: The asset id
+        """
+        for key in [key for key, current in self._pixel_ids.items() if current == aid]:
+            del self._pixel_ids[key]
+        sprite = self.assets[aid]
+        if sprite.pixel_hash is not None:
+            self._pixel_ids.setdefault(sprite.pixel_hash, aid)
+        self._notify("asset", aid)
+
+    def deduplicate_assets(self, store) -> dict:
+        """
+        Merges assets with the same pixels into one, pointing the tiles of the duplicates to the asset that was
+        registered first. The duplicate ids are kept as aliases of the merged asset, so ids never shift.
+
+        :param store: The sprite store, used to hash the assets and to count the memory saved
+        :return: A dict of duplicate asset id -> merged asset id
+        """
+        remap = {}
+        for aid, sprite in enumerate(self.assets):
+            if aid in self._aliases:
+                continue
+            key = store.hash_sprite(sprite)
+            first = self._pixel_ids.setdefault(key, aid)
+            if first != aid:
+                remap[aid] = first
+
+        if not remap:
+            return remap
+
+        counts = dict.fromkeys(remap, 0)
+        for layer in self.layers:
+            for chunk in layer.chunks.values():
+                changed = False
+                for index, asset in enumerate(chunk.cells):
+                    if asset in remap:
+                        chunk.cells[index] = remap[asset]
+                        counts[asset] += 1
+                        changed = True
+                if changed:
+                    chunk.version += 1
+
+        # The duplicate sprites are dropped, registering them again finds the merged asset by pixel hash
+        for key in [key for key, aid in self._asset_ids.items() if aid in remap]:
+            del self._asset_ids[key]
+        for aid, first in remap.items():
+            store.record_duplicate(self.assets[aid], counts[aid])
+            self.assets[aid] = self.assets[first]
+            self._aliases.add(aid)
+        for stamp in self.stamps:
+            stamp.remap(remap)
+        self._notify("remap", remap)
+        return remap
+
+    def remove_assets(self, aids) -> dict:
+        """
+        Removes assets that no tile uses. The ids of the assets after them shift down, and the tiles and stamps
+        are pointed to the new ids.
+
+        :param aids: The ids of the assets to remove, they must not have any tiles
+        :return: A dict of old asset id -> new asset id, for the assets whose id changed
+        """
+        removed = set(aids)
+        if not removed:
+            return {}
+
+        kept = [aid for aid in range(len(self.assets)) if aid not in removed]
+        remap = {aid: new for new, aid in enumerate(kept) if aid != new}
+        sprites = [self.assets[aid] for aid in kept]
+        # Registered again from scratch, which also works out the aliases of merged duplicates again
+        self.assets, self._asset_ids, self._pixel_ids, self._aliases = [], {}, {}, set()
+        for sprite in sprites:
+            self.restore_asset(sprite)
+
+        if remap:
+            for layer in self.layers:
+                for chunk in layer.chunks.values():
+                    changed = False
+                    for index, asset in enumerate(chunk.cells):
+                        if asset in remap:
+                            chunk.cells[index] = remap[asset]
+                            changed = True
+                    if changed:
+                        chunk.version += 1
+            for stamp in self.stamps:
+                stamp.remap(remap)
+        self._notify("remap", remap)
+        return remap
+
+    # --------------------------------------------- TERRAINS --------------------------------------------- #
+    def register_terrain(self, terrain_set) -> int:
+        """
+        Get the terrain id of a terrain set, adding it to the map if it isn't there yet
+
+        :param terrain_set: The terrain set
+        :return: The terrain id, starting at 1
+        """
+        for i, current in enumerate(self.terrains):
+            if current is terrain_set:
+                return i + 1
+
+        if len(self.terrains) >= 255:
+            raise ValueError("A map can't have more than 255 terrains")
+        self.terrains.append(terrain_set)
+        self._notify("terrain_set", len(self.terrains))
+        return len(self.terrains)
+
+    def get_terrain_set(self, tid: int):
+        """
+        Get a terrain set by id
+
+        :param tid: The terrain id
+        :return: The terrain set
+        """
+        return self.terrains[tid - 1]
+
+    # ---------------------------------------------- STAMPS ---------------------------------------------- #
+    def add_stamp(self, stamp) -> int:
+        """
+        Adds a stamp to the map. The assets of its tiles have to be registered already.
+
+        :param stamp: The stamp
+        :return: The index of the stamp
+        """
+        self.stamps.append(stamp)
+        self._notify("stamp", len(self.stamps) - 1)
+        return len(self.stamps) - 1
@@ -0,0 +1,146 @@
+from tilemap.history import get_state, set_state
+
+
+class Transaction:
+    def __init__(self, tile_map, name: str = "Script", on_commit=None):
+        """
+        A batch of edits made by a script. The edits go straight to the map, but nothing is drawn until the batch
+        ends, so the view is redrawn once however many tiles changed. Use it as a context manager: the edits are
+        committed when the block ends and undone if it raises.
+
+            with canvas.transaction("Fill") as edit:
+                for x in range(100):
+                    edit.set_tile((x, 0), asset)
+
+        The terrain painted under the edited squares is left as is.
+
+        :param tile_map: The tile map
+        :param name: What the batch does, shown in the undo history
+        :param on_commit: Called with the transaction once it is committed
+        """
+        self.tile_map = tile_map
+        self.name = name
+        self._on_commit = on_commit
+        self._before = {}   # (layer id, cell) -> state before the first edit of the cell, see history.get_state
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.closed:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _get_layer(self, layer):
+        """
+        Get the layer an edit goes to
+
+        :param layer: The layer, its id, or None for the active layer
+        :return: The layer
+        """
+        if self.closed:
+            raise RuntimeError("The transaction is already closed")
+        if layer is None:
+            layer = self.tile_map.get_active_layer()
+        elif isinstance(layer, int):
+            found = self.tile_map.get_layer(layer)
+            if found is None:
+                raise ValueError("No layer with id {}".format(layer))
+            layer = found
+        if layer.locked:
+            raise ValueError("Layer {} is locked".format(layer.name))
+        return layer
+
+    def _remember(self, layer, cell):
+        """
+        Saves the state of a cell before its first edit
+
+        :param layer: The layer
+        :param cell: The cell position (x, y)
+        """
+        key = (layer.lid, cell)
+        if key not in self._before:
+            self._before[key] = get_state(layer, cell)
+
+    # ---------------------------------------------- EDITS ----------------------------------------------- #
+    def get_tile(self, cell, layer=None):
+        """
+        Get the tile anchored at a cell, edits of the transaction included
+
+        :param cell: The cell position (x, y)
+        :param layer: The layer, its id, or None for the active layer
+        :return: (asset, span, transform), None if there is no tile
+        """
+        return get_state(self._get_layer(layer), tuple(cell))
+
+    def set_tile(self, cell, asset, span=(1, 1), transform: int = 0, layer=None):
+        """
+        Anchor a tile at a cell, replacing the tile that was there
+
+        :param cell: The cell position (x, y)
+        :param asset: The asset id, or a sprite, which is added to the map if needed
+        :param span: The size of the tile in cells (width, height), once transformed
+        :param transform: The flips and rotation of the sprite, see tilemap.transform
+        :param layer: The layer, its id, or None for the active layer
+        """
+        layer = self._get_layer(layer)
+        cell = tuple(cell)
+        if not isinstance(asset, int):
+            asset = self.tile_map.register_asset(asset)
+        self._remember(layer, cell)
+        layer.set_tile(cell, asset, tuple(span), transform)
+
+    def remove_tile(self, cell, layer=None):
+        """
+        Remove the tile anchored at a cell
+
+        :param cell: The cell position (x, y)
+        :param layer: The layer, its id, or None for the active layer
+        """
+        layer = self._get_layer(layer)
+        cell = tuple(cell)
+        self._remember(layer, cell)
+        layer.remove_tile(cell)
+
+    # --------------------------------------------- CLOSING ---------------------------------------------- #
+    def get_changes(self):
+        """
+        Get the cells the transaction changed. Cells edited back to how they were aren't included.
+
+        :return: A list of (layer id, cell, state before, state after), see history.get_state
+        """
+        changes = []
+        for (lid, cell), before in self._before.items():
+            layer = self.tile_map.get_layer(lid)
+            after = None if layer is None else get_state(layer, cell)
+            if layer is not None and after != before:
+                changes.append((lid, cell, before, after))
+        return changes
+
+    def commit(self):
+        """
+        Ends the transaction and keeps its edits
+        """
+        if self.closed:
+            raise RuntimeError("The transaction is already closed")
+        self.closed = True
+        if self._on_commit is not None:
+            self._on_commit(self)
+
+    def rollback(self):
+        """
+        Ends the transaction and puts the edited cells back to how they were. Nothing needs to be redrawn, since
+        nothing was drawn.
+        """
+        if self.closed:
+            raise RuntimeError("The transaction is already closed")
+        self.closed = True
+        for (lid, cell), before in reversed(list(self._before.items())):
+            layer = self.tile_map.get_layer(lid)
+            if layer is not None:
+                set_state(layer, cell, before)
@@ -0,0 +1,55 @@
+# The 8 symmetries of a square, kept per tile as 3 bits. The sprite is transposed first, then flipped.
+IDENTITY = 0
+FLIP_X = 1      # Mirrored left to right
+FLIP_Y = 2      # Mirrored top to bottom
+TRANSPOSE = 4   # Mirrored along the diagonal from the top left corner, which swaps the width and the height
+
+ROTATE_90 = TRANSPOSE | FLIP_X      # Clockwise
+ROTATE_180 = FLIP_X | FLIP_Y
+ROTATE_270 = TRANSPOSE | FLIP_Y     # Counterclockwise
+
+TRANSFORMS = range(8)
+
+
+def _matrix(transform: int):
+    """
+    Get the matrix of a transform, acting on positions relative to the center of the sprite
+
+    :param transform: The transform
+    :return: (a, b, c, d) for x' = a * x + b * y and y' = c * x + d * y
+    """
+    a, b, c, d = (0, 1, 1, 0) if transform & TRANSPOSE else (1, 0, 0, 1)
+    if transform & FLIP_X:
+        a, b = -a, -b
+    if transform & FLIP_Y:
+        c, d = -c, -d
+    return a, b, c, d
+
+
+_MATRICES = {_matrix(transform): transform for transform in TRANSFORMS}
+# first -> second -> the transform doing first, then second
+_COMPOSED = [[_MATRICES[(a2 * a1 + b2 * c1, a2 * b1 + b2 * d1, c2 * a1 + d2 * c1, c2 * b1 + d2 * d1)]
+              for a2, b2, c2, d2 in map(_matrix, TRANSFORMS)]
+             for a1, b1, c1, d1 in map(_matrix, TRANSFORMS)]
+
+
+def compose(first: int, second: int) -> int:
+    """
+    Combines two transforms
+
+    :param first: The transform applied first
+    :param second: The transform applied after it
+    :return: The transform doing both
+    """
+    return _COMPOSED[first][second]
+
+
+def transform_size(size, transform: int):
+    """
+    Get the size of something once transformed
+
+    :param size: The size (width, height), in pixels or in cells
+    :param transform: The transform
+    :return: The transformed size (width, height)
+    """
+    return (size[1], size[0]) if transform & TRANSPOSE else tuple(size)